@@ -0,0 +1,148 @@
+"""
+Mede separadamente cada etapa de uma requisição no servidor: a decodificação, `_converte_dicionario`,
+`vec.transform`, `model.predict`, a montagem do resultado e a codificação da resposta, para lotes de 1 a 10000
+produções.
+
+Uso:
+
+    $ python benchmark/caminho_quente.py [--lotes 1 10 100 1000 10000] [--repeticoes 20] [--numpy]
+                                         [--formato json] [--modelo MODELO --vetorizador VETORIZADOR]
+
+Sem `--modelo` e `--vetorizador`, um modelo pequeno é treinado com as funções de `treino` sobre dados sintéticos
+(com semente fixa) e guardado em `--artefatos`, sendo reutilizado nas próximas execuções. O vetorizador usa a mesma
+configuração de `treino._bag_of_words`, mas com as stopwords em inglês do sklearn, para não depender do nltk.
+Com `--numpy`, são usadas as versões exportadas (`.npz`) do modelo e do vetorizador. `--formato` escolhe a
+codificação das requisições e respostas, como no servidor.
+
+Para cada lote é mostrada a mediana das repetições, em milissegundos.
+"""
+import argparse
+import json
+import sys
+from os import path, makedirs
+from statistics import median
+from time import perf_counter
+
+sys.path.insert(0, path.join(path.dirname(path.abspath(__file__)), '..', 'nima_predict'))
+
+from dados_sinteticos import gerar_dataframe, gerar_requisicao  # noqa: E402
+from rede_neural import carregar_modelo, carregar_vectorizer  # noqa: E402
+from rede_neural.utilizacao import _converte_dicionario, _preparar_texto, _montar_resultado  # noqa: E402
+from codificacao import Formato, NOMES_FORMATOS, obter_formato  # noqa: E402
+
+ETAPAS = ('decodifica', 'converte', 'transform', 'predict', 'resultado', 'codifica')
+
+
+def treinar_artefatos(diretorio: str, quantidade: int, semente: int = 123):
+    """Treina o modelo e o vetorizador de referência, e os exporta para NumPy"""
+    import joblib
+    from sklearn.feature_extraction.text import CountVectorizer
+    from rede_neural import treino, exportar_numpy, exportar_vetorizador
+
+    makedirs(diretorio, exist_ok=True)
+
+    df = gerar_dataframe(quantidade, semente)
+    df["sentence"] = ""
+    treino._preprocessamento_dados_para_sentenca(df)
+    sentencas_treino, sentencas_teste, res_treino, res_teste = treino._separar_treino_teste(df)
+
+    vec = CountVectorizer(strip_accents='unicode', lowercase=True, stop_words='english').fit(sentencas_treino)
+    joblib.dump(vec, path.join(diretorio, 'vetorizador.pkl'))
+
+    model = treino._gerar_rede_neural(
+        x_treino=vec.transform(sentencas_treino),
+        x_teste=vec.transform(sentencas_teste),
+        res_treino=res_treino,
+        res_teste=res_teste
+    )
+    treino._salva_rede_neural(model, path.join(diretorio, 'modelo.h5'))
+
+    exportar_numpy(model, path.join(diretorio, 'modelo.npz'))
+    exportar_vetorizador(vec, path.join(diretorio, 'vetorizador.npz'), textos=list(sentencas_teste))
+
+
+def caminhos_artefatos(args) -> tuple:
+    if args.modelo and args.vetorizador:
+        return args.modelo, args.vetorizador
+
+    extensao_modelo, extensao_vec = ('npz', 'npz') if args.numpy else ('h5', 'pkl')
+    modelo = path.join(args.artefatos, f'modelo.{extensao_modelo}')
+    vetorizador = path.join(args.artefatos, f'vetorizador.{extensao_vec}')
+
+    if not (path.isfile(modelo) and path.isfile(vetorizador)):
+        print(f"Treinando o modelo de referência em {args.artefatos}")
+        treinar_artefatos(args.artefatos, args.quantidade_treino)
+
+    return modelo, vetorizador
+
+
+def medir_lote(model, vec, formato: Formato, requisicao: bytes) -> dict:
+    """Executa uma requisição, etapa por etapa, como em `server.responder`. :return: o tempo (s) de cada etapa"""
+    tempos = {}
+
+    t = perf_counter()
+    requisicao = formato.decodificar(requisicao)
+    tempos['decodifica'] = perf_counter() - t
+
+    t = perf_counter()
+    dados_convertidos = _converte_dicionario(requisicao)
+    tempos['converte'] = perf_counter() - t
+
+    t = perf_counter()
+    sentencas = _preparar_texto(list(dados_convertidos.values()), vec)
+    tempos['transform'] = perf_counter() - t
+
+    t = perf_counter()
+    resultados = model.predict(x=sentencas, use_multiprocessing=True)
+    tempos['predict'] = perf_counter() - t
+
+    t = perf_counter()
+    res = _montar_resultado(requisicao.keys(), resultados.ravel())
+    tempos['resultado'] = perf_counter() - t
+
+    t = perf_counter()
+    formato.codificar(res)
+    tempos['codifica'] = perf_counter() - t
+
+    return tempos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modelo', type=str, default=None)
+    parser.add_argument('--vetorizador', type=str, default=None)
+    parser.add_argument('--numpy', action='store_true', help='usa o modelo e o vetorizador exportados (.npz)')
+    parser.add_argument('--formato', choices=NOMES_FORMATOS, default='json')
+    parser.add_argument('--artefatos', type=str,
+                        default=path.join(path.dirname(path.abspath(__file__)), 'artefatos'))
+    parser.add_argument('--quantidade-treino', type=int, default=5000)
+    parser.add_argument('--lotes', type=int, nargs='+', default=[1, 10, 100, 1000, 10000])
+    parser.add_argument('--repeticoes', type=int, default=20)
+    args = parser.parse_args()
+
+    path_modelo, path_vec = caminhos_artefatos(args)
+    model = carregar_modelo(path_modelo)
+    vec = carregar_vectorizer(path_vec)
+    formato = obter_formato(args.formato)
+    print(f"Modelo: {path_modelo}   vetorizador: {path_vec}   formato: {formato.nome}")
+
+    # requisições com produções diferentes das usadas no treino
+    df = gerar_dataframe(max(args.lotes), semente=456)
+    codificar_requisicao = formato.codificar if formato.nome == 'msgpack' else lambda r: json.dumps(r).encode('utf-8')
+    medir_lote(model, vec, formato, codificar_requisicao(gerar_requisicao(df.iloc[:1])))     # aquecimento
+
+    print(f"{'lote':>6} " + ' '.join(f"{etapa:>10}" for etapa in ETAPAS) + f" {'total':>10} {'µs/produção':>12}")
+    for lote in args.lotes:
+        requisicao = codificar_requisicao(gerar_requisicao(df.iloc[:lote]))
+        # lotes grandes demoram mais, então são repetidos menos vezes
+        repeticoes = max(3, min(args.repeticoes, 20000 // lote))
+        medidas = [medir_lote(model, vec, formato, requisicao) for _ in range(repeticoes)]
+
+        medianas = {etapa: median(m[etapa] for m in medidas) * 1000 for etapa in ETAPAS}
+        total = median(sum(m.values()) for m in medidas) * 1000
+        print(f"{lote:>6} " + ' '.join(f"{medianas[etapa]:>10.3f}" for etapa in ETAPAS)
+              + f" {total:>10.3f} {total * 1000 / lote:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
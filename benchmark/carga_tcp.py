@@ -0,0 +1,173 @@
+"""
+Gerador de carga para o servidor de tempo real (`main_tempo_real.py`), baseado em `exemplo/main.py`.
+
+Várias conexões enviam requisições ao mesmo tempo, e ao final são mostradas a latência (p50, p95, p99 e máxima) e
+a vazão, em requisições e produções por segundo.
+
+Uso:
+
+    $ python benchmark/carga_tcp.py [--host 127.0.0.1] [--porta 9999] [--clientes 8] [--duracao 10]
+                                    [--producoes 10] [--dados exemplo/data.json] [--enquadramento nenhum]
+                                    [--formato json]
+
+Com `--enquadramento nenhum` (padrão), cada requisição usa uma conexão nova, como em `exemplo/main.py`, o que
+funciona com o modo padrão do servidor. Com `linha` ou `tamanho`, cada cliente mantém uma conexão persistente,
+para o servidor com `--modo async` e o mesmo enquadramento. `--formato` deve ser o mesmo do servidor.
+
+Sem `--dados`, as requisições são geradas a partir de dados sintéticos, com `--producoes` produções cada. São
+geradas `--variacoes` requisições diferentes, para que o cache do servidor (se ativado) não responda todas.
+"""
+import argparse
+import json
+import socket
+import struct
+import sys
+from os import path
+from threading import Thread
+from time import perf_counter
+
+import numpy as np
+
+sys.path.insert(0, path.join(path.dirname(path.abspath(__file__)), '..', 'nima_predict'))
+
+from dados_sinteticos import gerar_dataframe, gerar_requisicao  # noqa: E402
+from codificacao import NOMES_FORMATOS, decodificar_float32, obter_formato  # noqa: E402
+
+_PREFIXO = struct.Struct('!I')
+
+
+def _receber_tudo(sock: socket.socket) -> bytes:
+    partes = []
+    while parte := sock.recv(65536):
+        partes.append(parte)
+    return b''.join(partes)
+
+
+def _receber_exatamente(arquivo, tamanho: int) -> bytes:
+    dados = arquivo.read(tamanho)
+    if len(dados) != tamanho:
+        raise ConnectionError("Conexão fechada pelo servidor")
+    return dados
+
+
+class Cliente(Thread):
+    """Envia requisições em sequência até `fim`, guardando a latência de cada uma"""
+
+    def __init__(self, endereco, requisicoes, enquadramento: str, fim: float, deslocamento: int, decodificar):
+        super().__init__(daemon=True)
+        self.decodificar = decodificar
+        self.endereco = endereco
+        self.requisicoes = requisicoes
+        self.enquadramento = enquadramento
+        self.fim = fim
+        self.deslocamento = deslocamento
+        self.latencias = []
+        self.erros = 0
+
+    def _requisicao(self, i: int) -> bytes:
+        return self.requisicoes[(self.deslocamento + i) % len(self.requisicoes)]
+
+    def run(self):
+        if self.enquadramento == 'nenhum':
+            self._uma_por_conexao()
+        else:
+            self._persistente()
+
+    def _uma_por_conexao(self):
+        i = 0
+        while perf_counter() < self.fim:
+            t = perf_counter()
+            try:
+                with socket.create_connection(self.endereco) as sock:
+                    sock.sendall(self._requisicao(i))
+                    self.decodificar(_receber_tudo(sock))
+                self.latencias.append(perf_counter() - t)
+            except (OSError, ValueError):
+                self.erros += 1
+            i += 1
+
+    def _persistente(self):
+        with socket.create_connection(self.endereco) as sock:
+            arquivo = sock.makefile('rb')
+            i = 0
+            while perf_counter() < self.fim:
+                dados = self._requisicao(i)
+                t = perf_counter()
+                try:
+                    if self.enquadramento == 'tamanho':
+                        sock.sendall(_PREFIXO.pack(len(dados)) + dados)
+                        tamanho = _PREFIXO.unpack(_receber_exatamente(arquivo, _PREFIXO.size))[0]
+                        resposta = _receber_exatamente(arquivo, tamanho)
+                    else:
+                        sock.sendall(dados + b'\n')
+                        resposta = arquivo.readline()
+                    self.decodificar(resposta)
+                    self.latencias.append(perf_counter() - t)
+                except ValueError:
+                    self.erros += 1
+                except OSError:
+                    self.erros += 1
+                    return
+                i += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', type=str, default='127.0.0.1')
+    parser.add_argument('--porta', type=int, default=9999)
+    parser.add_argument('--clientes', type=int, default=8)
+    parser.add_argument('--duracao', type=float, default=10.0, help='segundos')
+    parser.add_argument('--producoes', type=int, default=10, help='produções por requisição')
+    parser.add_argument('--variacoes', type=int, default=100)
+    parser.add_argument('--dados', type=str, default=None, help='JSON enviado em todas as requisições')
+    parser.add_argument('--enquadramento', choices=['nenhum', 'linha', 'tamanho'], default='nenhum')
+    parser.add_argument('--formato', choices=NOMES_FORMATOS, default='json')
+    args = parser.parse_args()
+
+    formato = obter_formato(args.formato)
+    decodificar = decodificar_float32 if formato.nome == 'float32' else formato.decodificar
+
+    if args.dados:
+        with open(args.dados, 'r', encoding='utf-8') as f:
+            requisicoes = [json.dumps(json.load(f))]
+        producoes = len(json.loads(requisicoes[0]))
+    else:
+        df = gerar_dataframe(args.producoes * args.variacoes, semente=789)
+        requisicoes = [
+            json.dumps(gerar_requisicao(df.iloc[i:i + args.producoes]))
+            for i in range(0, len(df), args.producoes)
+        ]
+        producoes = args.producoes
+    requisicoes = [r.encode('utf-8') for r in requisicoes]
+    if formato.nome == 'msgpack':
+        requisicoes = [formato.codificar(json.loads(r)) for r in requisicoes]
+
+    fim = perf_counter() + args.duracao
+    clientes = [
+        Cliente((args.host, args.porta), requisicoes, args.enquadramento, fim, i * len(requisicoes) // args.clientes,
+                decodificar)
+        for i in range(args.clientes)
+    ]
+    inicio = perf_counter()
+    for cliente in clientes:
+        cliente.start()
+    for cliente in clientes:
+        cliente.join()
+    decorrido = perf_counter() - inicio
+
+    latencias = np.array([latencia for cliente in clientes for latencia in cliente.latencias]) * 1000
+    erros = sum(cliente.erros for cliente in clientes)
+
+    print(f"Clientes: {args.clientes}   produções por requisição: {producoes}   duração: {decorrido:.1f} s")
+    print(f"Requisições: {len(latencias)}   erros: {erros}")
+    if len(latencias) == 0:
+        return
+
+    p50, p95, p99 = np.percentile(latencias, [50, 95, 99])
+    print(f"Latência (ms): p50 {p50:.2f}   p95 {p95:.2f}   p99 {p99:.2f}   máxima {latencias.max():.2f}")
+    print(f"Vazão: {len(latencias) / decorrido:.1f} requisições/s   "
+          f"{len(latencias) * producoes / decorrido:.1f} produções/s")
+
+
+if __name__ == '__main__':
+    main()
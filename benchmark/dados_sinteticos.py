@@ -0,0 +1,53 @@
+"""
+Gera conjuntos de dados sintéticos na mesma estrutura descrita no README:
+
+    | ident | nome | tipo | conteudo | res |
+
+Usado somente pelos benchmarks.
+"""
+import random
+
+import pandas as pd
+
+PALAVRAS_MEIO_AMBIENTE = (
+    "árvore rio petróleo desmatamento poluição floresta clima água ecologia biodiversidade solo "
+    "sustentabilidade bacia hidrográfica resíduos emissões carbono fauna flora manguezal reciclagem"
+).split()
+
+PALAVRAS_GERAIS = (
+    "justiça geometria álgebra direito história música economia política teatro literatura ensaios "
+    "modelagem computação filosofia linguagem educação sociedade mercado cálculo arquitetura saúde"
+).split()
+
+PALAVRAS_COMUNS = "estudo análise sobre uma produção acadêmica modelo teoria de da do em para com".split()
+
+TIPOS = ["Livro", "Artigo", "Thesis", "Chapter", "Course"]
+
+
+def _texto(rng: random.Random, palavras: list, tamanho: int) -> str:
+    return " ".join(rng.choice(palavras) for _ in range(tamanho))
+
+
+def gerar_dataframe(quantidade: int, semente: int = 123) -> pd.DataFrame:
+    """
+    Gera `quantidade` produções. Cerca de 40% são relacionadas a meio ambiente, e as disciplinas
+    (tipo `Course`) possuem uma ementa em `conteudo`.
+    """
+    rng = random.Random(semente)
+    linhas = []
+    for i in range(quantidade):
+        res = rng.random() < 0.4
+        palavras = (PALAVRAS_MEIO_AMBIENTE if res else PALAVRAS_GERAIS) + PALAVRAS_COMUNS
+        tipo = rng.choice(TIPOS)
+        conteudo = _texto(rng, palavras, rng.randint(15, 60)) if tipo == "Course" else "-"
+        linhas.append((f"{i:08x}", _texto(rng, palavras, rng.randint(3, 12)), tipo, conteudo, res))
+
+    return pd.DataFrame(linhas, columns=["ident", "nome", "tipo", "conteudo", "res"])
+
+
+def gerar_requisicao(df: pd.DataFrame) -> dict:
+    """Converte o DataFrame em uma requisição para o servidor, na forma 3 do README"""
+    return {
+        linha.ident: {"nome": linha.nome, "conteudo": linha.conteudo if linha.tipo == "Course" else ""}
+        for linha in df.itertuples()
+    }
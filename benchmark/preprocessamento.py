@@ -0,0 +1,67 @@
+"""
+Compara a montagem da coluna `sentence` de `treino._preprocessamento_dados_para_sentenca` com a
+implementação anterior, que percorria o DataFrame linha a linha.
+
+Uso:
+
+    $ python benchmark/preprocessamento.py [--quantidades 10000 100000 1000000] [--maximo-linha-a-linha 100000]
+
+A implementação linha a linha é muito lenta, então só é executada até `--maximo-linha-a-linha` linhas.
+"""
+import argparse
+import sys
+from os import path
+from time import perf_counter
+
+sys.path.insert(0, path.join(path.dirname(path.abspath(__file__)), '..', 'nima_predict'))
+
+from pandas import DataFrame  # noqa: E402
+
+from dados_sinteticos import gerar_dataframe  # noqa: E402
+from rede_neural.treino import _preprocessamento_dados_para_sentenca  # noqa: E402
+
+
+def _preprocessamento_linha_a_linha(df: DataFrame):
+    """Implementação anterior, mantida somente para comparação"""
+    def eh_valido(e: str) -> bool: return "ementa" not in e.lower() and len(e) > 10
+
+    for index in df.index:
+        nome = df.loc[index, 'nome']
+        conteudo = df.loc[index, 'conteudo']
+        tipo = df.loc[index, 'tipo']
+        sentenca = f'{nome} {conteudo if (tipo == "Course" and eh_valido(conteudo)) else ""}'
+        df.loc[index, 'sentence'] = sentenca
+
+
+def medir(funcao, df: DataFrame) -> float:
+    t = perf_counter()
+    funcao(df)
+    return perf_counter() - t
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--quantidades', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--maximo-linha-a-linha', type=int, default=100_000)
+    args = parser.parse_args()
+
+    print(f"{'linhas':>10} {'vetorizado (s)':>15} {'linha a linha (s)':>18} {'iguais':>7}")
+    for quantidade in args.quantidades:
+        df = gerar_dataframe(quantidade)
+        df["sentence"] = ""
+
+        vetorizado = df.copy()
+        tempo_vetorizado = medir(_preprocessamento_dados_para_sentenca, vetorizado)
+
+        if quantidade <= args.maximo_linha_a_linha:
+            tempo_antigo = medir(_preprocessamento_linha_a_linha, df)
+            # a implementação anterior deixava um espaço no final quando não havia conteudo,
+            # o que não muda os tokens gerados pelo vetorizador
+            iguais = (df["sentence"].str.rstrip() == vetorizado["sentence"]).all()
+            print(f"{quantidade:>10} {tempo_vetorizado:>15.3f} {tempo_antigo:>18.3f} {str(iguais):>7}")
+        else:
+            print(f"{quantidade:>10} {tempo_vetorizado:>15.3f} {'-':>18} {'-':>7}")
+
+
+if __name__ == '__main__':
+    main()
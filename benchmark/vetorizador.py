@@ -0,0 +1,68 @@
+"""
+Compara a vetorização do `CountVectorizer` (sklearn) com a do `VetorizadorRapido`.
+
+Uso:
+
+    $ python benchmark/vetorizador.py [--vetorizador VECTORIZER.pkl] [--dados DADOS.csv] [--quantidade N]
+
+Sem `--vetorizador`, um `CountVectorizer` é treinado sobre os próprios dados, com a mesma configuração de
+`treino._bag_of_words` (mas com as stopwords em inglês do sklearn, para não depender do nltk).
+Sem `--dados`, são usados dados sintéticos na estrutura do README.
+"""
+import argparse
+import sys
+from os import path
+from time import perf_counter
+
+sys.path.insert(0, path.join(path.dirname(path.abspath(__file__)), '..', 'nima_predict'))
+
+import pandas as pd  # noqa: E402
+from sklearn.feature_extraction.text import CountVectorizer  # noqa: E402
+
+from dados_sinteticos import gerar_dataframe  # noqa: E402
+from rede_neural import carregar_vectorizer, VetorizadorRapido  # noqa: E402
+from rede_neural.treino import _preprocessamento_dados_para_sentenca  # noqa: E402
+
+
+def medir(funcao, textos, repeticoes: int) -> float:
+    """:return: a melhor taxa, em textos por segundo"""
+    melhor = float('inf')
+    for _ in range(repeticoes):
+        t = perf_counter()
+        funcao(textos)
+        melhor = min(melhor, perf_counter() - t)
+    return len(textos) / melhor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--vetorizador', type=str, default=None)
+    parser.add_argument('--dados', type=str, default=None)
+    parser.add_argument('--quantidade', type=int, default=20000)
+    parser.add_argument('--repeticoes', type=int, default=3)
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.dados) if args.dados else gerar_dataframe(args.quantidade)
+    df["sentence"] = ""
+    _preprocessamento_dados_para_sentenca(df)
+    textos = list(df["sentence"].values)
+
+    if args.vetorizador:
+        vec = carregar_vectorizer(args.vetorizador)
+    else:
+        vec = CountVectorizer(strip_accents='unicode', lowercase=True, stop_words='english').fit(textos)
+
+    rapido = VetorizadorRapido.de_count_vectorizer(vec)
+
+    diferencas = (vec.transform(textos) != rapido.transform(textos)).nnz
+    print(f"Textos: {len(textos)}   vocabulário: {len(vec.vocabulary_)}   diferenças: {diferencas}")
+
+    taxa_sklearn = medir(vec.transform, textos, args.repeticoes)
+    taxa_rapido = medir(rapido.transform, textos, args.repeticoes)
+
+    print(f"CountVectorizer.transform:   {taxa_sklearn:12.0f} textos/s")
+    print(f"VetorizadorRapido.transform: {taxa_rapido:12.0f} textos/s   ({taxa_rapido / taxa_sklearn:.2f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+import math
+from collections import deque
+from contextlib import contextmanager
+from threading import Condition
+from time import perf_counter
+
+# motivos de rejeição, usados como rótulo em `instrumentacao.REJEICOES`
+MOTIVOS = ('fila', 'prazo', 'tamanho')
+
+
+class Rejeitada(Exception):
+    """
+    A requisição não foi classificada pelo controle de admissão. `motivo` é um dos `MOTIVOS`:
+
+        'fila': o servidor está no limite e a fila de espera está cheia
+        'prazo': o prazo da requisição acabou antes da inferência
+        'tamanho': a requisição tem mais produções do que o servidor aceita de uma vez
+    """
+
+    def __init__(self, motivo: str):
+        super().__init__(motivo)
+        self.motivo = motivo
+
+
+def ler_prazo_ms(texto: str) -> float:
+    """
+    Lê um prazo em ms (por exemplo, do cabeçalho `X-Prazo-Ms`)
+
+    :raise ValueError: se não for um número finito e não negativo. `nan` e `inf` não são aceitos, pois
+        não podem ser usados como tempo de espera (`Lock.acquire`, `Condition.wait`)
+    """
+    prazo_ms = float(texto)
+    if not math.isfinite(prazo_ms) or prazo_ms < 0:
+        raise ValueError(f'prazo inválido: {texto}')
+    return prazo_ms
+
+
+def calcular_prazo(prazo_ms: float | None, inicio: float | None = None) -> float | None:
+    """O instante (em `perf_counter`) em que acaba o prazo de `prazo_ms` contado desde `inicio`, ou None"""
+    if prazo_ms is None:
+        return None
+    return (perf_counter() if inicio is None else inicio) + prazo_ms / 1000
+
+
+def expirado(prazo: float | None) -> bool:
+    return prazo is not None and perf_counter() >= prazo
+
+
+class ControleAdmissao:
+    """
+    Limita a quantidade de produções sendo classificadas ao mesmo tempo (`max_producoes`), somando todas as
+    requisições em andamento.
+
+    Uma requisição que não cabe no limite espera em uma fila de no máximo `max_fila` requisições, até que
+    outras terminem ou que o seu prazo acabe. Com a fila cheia, é rejeitada imediatamente, então a latência
+    continua limitada mesmo com o servidor sobrecarregado.
+
+    A fila é atendida na ordem de chegada: somente a primeira requisição da fila pode ser admitida, então
+    uma requisição grande não é passada para trás indefinidamente pelas pequenas. As requisições que chegam
+    com outras ja esperando entram no fim da fila, mesmo que caibam no limite.
+    """
+
+    def __init__(self, max_producoes: int, max_fila: int = 64):
+        self.max_producoes = max_producoes
+        self.max_fila = max_fila
+        self.em_andamento = 0
+        self._fila = deque()        # uma senha para cada requisição esperando, na ordem de chegada
+        self._condicao = Condition()
+
+    @property
+    def na_fila(self) -> int:
+        return len(self._fila)
+
+    @contextmanager
+    def admitir(self, quantidade: int, prazo: float | None = None):
+        """
+        Reserva `quantidade` produções durante o bloco, esperando na fila se necessário.
+
+        :raise Rejeitada: se a requisição for grande demais, a fila estiver cheia ou o prazo acabar na fila
+        """
+        self._entrar(quantidade, prazo)
+        try:
+            yield
+        finally:
+            with self._condicao:
+                self.em_andamento -= quantidade
+                self._condicao.notify_all()
+
+    def _entrar(self, quantidade: int, prazo: float | None):
+        if quantidade > self.max_producoes:
+            raise Rejeitada('tamanho')
+
+        with self._condicao:
+            if not self._fila and self.em_andamento + quantidade <= self.max_producoes:
+                self.em_andamento += quantidade
+                return
+
+            if len(self._fila) >= self.max_fila:
+                raise Rejeitada('fila')
+
+            senha = object()
+            self._fila.append(senha)
+            try:
+                while self._fila[0] is not senha or self.em_andamento + quantidade > self.max_producoes:
+                    restante = None if prazo is None else prazo - perf_counter()
+                    if restante is not None and restante <= 0:
+                        raise Rejeitada('prazo')
+                    self._condicao.wait(restante)
+            finally:
+                self._fila.remove(senha)
+                # admitida ou desistindo, a próxima da fila pode caber agora
+                self._condicao.notify_all()
+            self.em_andamento += quantidade
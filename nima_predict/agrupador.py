@@ -0,0 +1,180 @@
+from collections import OrderedDict
+from concurrent.futures import Future
+from queue import Queue, Empty
+from threading import Thread
+from time import perf_counter
+from typing import Dict, List
+
+
+from admissao import Rejeitada, expirado
+from instrumentacao import ERROS, LATENCIA, LOTE
+from rede_neural.cache import CachePredicoes
+from rede_neural.carregamento import Modelo, Vetorizador
+from rede_neural.utilizacao import _predizer
+
+
+class Pedido:
+    """
+    Uma requisição esperando na fila do `Agrupador`.
+
+    O resultado é entregue em `futuro`, como um dicionario { 'ident': resultado, ... }.
+    Depois de resolvido, `tempo_fila_ms` e `tempo_inferencia_ms` contém as latências da requisição.
+
+    Somente os `textos` cujo resultado não estava no cache entram no lote. Se o `prazo` (em `perf_counter`)
+    acabar antes do lote ser classificado, a requisição sai do lote, e o futuro recebe `Rejeitada('prazo')`.
+    """
+
+    def __init__(self, dados: OrderedDict, cache: CachePredicoes | None = None, prazo: float | None = None):
+        self.prazo = prazo
+        self.chaves: List[str] = list(dados.keys())
+        todos_textos: List[str] = list(dados.values())
+        self.futuro: Future = Future()
+
+        # resultados ja conhecidos pelo cache, e a posição dos que faltam
+        self.resultados: List[float | None] = cache.obter(todos_textos) if cache is not None \
+            else [None] * len(todos_textos)
+        self.faltando: List[int] = [i for i, r in enumerate(self.resultados) if r is None]
+        self.textos: List[str] = [todos_textos[i] for i in self.faltando]
+
+        self.tempo_entrada = perf_counter()
+        self.tempo_fila_ms = 0.0
+        self.tempo_inferencia_ms = 0.0
+        self.tamanho_lote = 0
+
+
+class Agrupador:
+    """
+    Agrupa as requisições de diversas conexões em um único `predict`.
+
+    As requisições entram em uma fila, e uma thread junta elas em um lote até que ele tenha
+    `lote_max` produções, ou até que `espera_max_ms` milisegundos tenham passado desde a
+    primeira requisição do lote. Todas as produções do lote são vetorizadas em uma única matriz
+    esparsa e classificadas de uma vez, e os resultados são devolvidos para cada requisição.
+
+    Uma requisição nunca é dividida entre lotes, então um lote pode passar de `lote_max` se a
+    última requisição for grande.
+
+    O modelo e o vetorizador podem ser trocados com `trocar`; o lote que ja está sendo classificado
+    termina com o par antigo.
+    """
+
+    def __init__(
+            self,
+            model: Modelo,
+            vec: Vetorizador,
+            lote_max: int = 256,
+            espera_max_ms: float = 5.0,
+            cache: CachePredicoes | None = None
+    ):
+        self.modelos = (model, vec)
+        self.cache = cache
+        self.lote_max = lote_max
+        self.espera_max = espera_max_ms / 1000
+
+        self.reiniciar()
+
+    def reiniciar(self):
+        """
+        Cria a fila e a thread do agrupador. Deve ser chamado novamente em um processo criado por
+        `os.fork`, pois a thread do processo original não existe no processo novo.
+        """
+        self._fila: Queue = Queue()
+        self._thread = Thread(target=self._loop, name='agrupador', daemon=True)
+        self._thread.start()
+
+    def trocar(self, model: Modelo, vec: Vetorizador):
+        """Passa a usar outro modelo e vetorizador a partir do próximo lote"""
+        self.modelos = (model, vec)
+
+    def submeter(self, dados: OrderedDict, prazo: float | None = None) -> Pedido:
+        """Coloca os dados (ja convertidos por `_converte_dicionario`) na fila"""
+        pedido = Pedido(dados, self.cache, prazo)
+        if not pedido.textos:   # vazio, ou todos os resultados estavam no cache
+            pedido.futuro.set_result(dict(zip(pedido.chaves, pedido.resultados)))
+        else:
+            self._fila.put(pedido)
+        return pedido
+
+    def classificar(self, dados: OrderedDict, prazo: float | None = None) -> Dict[str, float]:
+        """Igual a `submeter`, porém espera o resultado"""
+        return self.submeter(dados, prazo).futuro.result()
+
+    def fechar(self):
+        self._fila.put(None)
+        self._thread.join()
+
+    def _loop(self):
+        while (primeiro := self._fila.get()) is not None:
+            lote = [primeiro]
+            quantidade = len(primeiro.textos)
+            limite = primeiro.tempo_entrada + self.espera_max
+            parar = False
+
+            # juntando mais requisições até encher o lote ou acabar o tempo
+            while quantidade < self.lote_max:
+                restante = limite - perf_counter()
+                if restante <= 0:
+                    break
+                try:
+                    pedido = self._fila.get(timeout=restante)
+                except Empty:
+                    break
+                if pedido is None:
+                    parar = True
+                    break
+                lote.append(pedido)
+                quantidade += len(pedido.textos)
+
+            self._executar(lote, quantidade)
+            if parar:
+                return
+
+    def _executar(self, lote: List[Pedido], quantidade: int):
+        # as requisições cujo prazo acabou na fila são descartadas antes da inferência
+        if any(expirado(pedido.prazo) for pedido in lote):
+            for pedido in lote:
+                if expirado(pedido.prazo):
+                    pedido.futuro.set_exception(Rejeitada('prazo'))
+            lote = [pedido for pedido in lote if not pedido.futuro.done()]
+            quantidade = sum(len(pedido.textos) for pedido in lote)
+            if not lote:
+                return
+
+        textos = [texto for pedido in lote for texto in pedido.textos]
+        # a versão é lida antes do modelo: `server.trocar_modelos` troca o modelo antes de invalidar o cache, então
+        # os resultados de um modelo antigo nunca são guardados com a versão de um modelo novo
+        versao = self.cache.versao if self.cache is not None else None
+        model, vec = self.modelos      # o par inteiro é trocado de uma vez
+
+        tempo_inicial = perf_counter()
+        tempos = {}
+        try:
+            resultados = _predizer(model, vec, textos, tempos)
+        except Exception as e:
+            ERROS.incrementar(valor_rotulo='modelo')
+            for pedido in lote:
+                pedido.futuro.set_exception(e)
+            return
+        tempo_final = perf_counter()
+
+        LOTE.observar(quantidade)
+        for etapa, segundos in tempos.items():
+            LATENCIA.observar(segundos, etapa)
+
+        # devolvendo para cada requisição a sua fatia dos resultados
+        inicio = 0
+        for pedido in lote:
+            fim = inicio + len(pedido.textos)
+            pedido.tempo_fila_ms = (tempo_inicial - pedido.tempo_entrada) * 1000
+            LATENCIA.observar(tempo_inicial - pedido.tempo_entrada, 'fila')
+            pedido.tempo_inferencia_ms = (tempo_final - tempo_inicial) * 1000
+            pedido.tamanho_lote = quantidade
+
+            novos = resultados[inicio:fim].tolist()
+            if self.cache is not None:
+                self.cache.guardar(pedido.textos, novos, versao)
+            for i, resultado in zip(pedido.faltando, novos):
+                pedido.resultados[i] = resultado
+
+            pedido.futuro.set_result(dict(zip(pedido.chaves, pedido.resultados)))
+            inicio = fim
@@ -0,0 +1,223 @@
+import csv
+import json
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import get_context
+from os import path
+from time import perf_counter
+from typing import TYPE_CHECKING, Callable, Deque, Iterator, List, Tuple
+
+import numpy as np
+from termcolor import cprint
+
+if TYPE_CHECKING:
+    from pandas import DataFrame
+
+# formatos de arquivo aceitos, pela extensão
+FORMATOS_ARQUIVO = ('csv', 'jsonl', 'parquet')
+
+# colunas lidas da entrada, no formato descrito no README. `tipo` e `conteudo` podem faltar
+COLUNAS = ('ident', 'nome', 'tipo', 'conteudo')
+
+# modelo e vetorizador de cada processo do pool, carregados uma única vez por `_iniciar_processo`
+_modelo = None
+_vectorizer = None
+
+
+def formato_arquivo(filename: str) -> str:
+    """
+    O formato de um arquivo, pela sua extensão (`.json` e `.ndjson` são tratados como `jsonl`)
+
+    :raise ValueError: se a extensão não for de nenhum dos `FORMATOS_ARQUIVO`
+    """
+    extensao = path.splitext(filename)[1].lower().lstrip('.')
+    extensao = {'json': 'jsonl', 'ndjson': 'jsonl'}.get(extensao, extensao)
+    if extensao not in FORMATOS_ARQUIVO:
+        raise ValueError(f"formato de arquivo desconhecido: '{filename}'. Use {', '.join(FORMATOS_ARQUIVO)}")
+    return extensao
+
+
+def ler_blocos(filename: str, tamanho_bloco: int, formato: str | None = None) -> Iterator['DataFrame']:
+    """
+    Lê o arquivo em blocos de até `tamanho_bloco` linhas, sem nunca carregá-lo inteiro em memória.
+    Todos os valores são lidos como texto, para que identificadores numéricos não sejam alterados.
+
+    O Parquet depende do `pyarrow`, que só é importado se for usado.
+    """
+    import pandas as pd
+
+    formato = formato or formato_arquivo(filename)
+
+    if formato == 'csv':
+        yield from pd.read_csv(filename, header=0, sep=',', dtype=str, keep_default_na=False,
+                               chunksize=tamanho_bloco)
+    elif formato == 'jsonl':
+        for df in pd.read_json(filename, lines=True, dtype=False, chunksize=tamanho_bloco):
+            yield df.fillna('').astype(str)
+    else:
+        import pyarrow.parquet as pq
+
+        arquivo = pq.ParquetFile(filename)
+        colunas = [c for c in COLUNAS if c in arquivo.schema_arrow.names]
+        for lote in arquivo.iter_batches(batch_size=tamanho_bloco, columns=colunas):
+            yield lote.to_pandas().fillna('').astype(str)
+
+
+def preparar_bloco(df: 'DataFrame') -> Tuple[List[str], List[str]]:
+    """
+    Monta o texto de cada produção do bloco com as mesmas regras do treino (`sentenca.montar_sentencas`)
+
+    :return: os identificadores e os textos, na ordem do arquivo
+    :raise ValueError: se faltar a coluna `ident` ou a coluna `nome`
+    """
+    from rede_neural.sentenca import montar_sentencas
+
+    faltando = [c for c in ('ident', 'nome') if c not in df.columns]
+    if faltando:
+        raise ValueError(f"coluna(s) faltando no arquivo: {', '.join(faltando)}")
+
+    for coluna in ('tipo', 'conteudo'):
+        if coluna not in df.columns:
+            df[coluna] = ''
+
+    return df['ident'].tolist(), montar_sentencas(df).tolist()
+
+
+def _iniciar_processo(path_modelo: str, path_vec: str):
+    """Carrega o modelo e o vetorizador em cada processo do pool. Os pesos `.npz` são mapeados em memória"""
+    global _modelo, _vectorizer
+    from rede_neural import carregar_modelo, carregar_vectorizer
+
+    _modelo = carregar_modelo(path_modelo, mapear_memoria=True)
+    _vectorizer = carregar_vectorizer(path_vec)
+
+
+def _classificar_textos(textos: List[str]) -> np.ndarray:
+    """
+    Classifica os textos de um bloco com `rede_neural.classificar`. As chaves são as posições dos textos,
+    então identificadores repetidos não se misturam.
+    """
+    from rede_neural import classificar
+
+    resultados = classificar(model=_modelo, vec=_vectorizer, dados=dict(enumerate(textos)))
+    return np.fromiter(resultados.values(), dtype=np.float32, count=len(textos))
+
+
+class EscritorArquivo:
+    """Grava os pares (ident, resultado) em CSV, JSONL ou Parquet, bloco a bloco"""
+
+    def __init__(self, filename: str, formato: str | None = None):
+        self.formato = formato or formato_arquivo(filename)
+        self.filename = filename
+        self._parquet = None
+
+        if self.formato != 'parquet':
+            self._arquivo = open(filename, 'w', newline='', encoding='utf-8')
+            if self.formato == 'csv':
+                self._csv = csv.writer(self._arquivo)
+                self._csv.writerow(('ident', 'resultado'))
+
+    def escrever(self, idents: List[str], resultados: np.ndarray):
+        valores = resultados.tolist()
+        if self.formato == 'csv':
+            self._csv.writerows(zip(idents, valores))
+        elif self.formato == 'jsonl':
+            self._arquivo.writelines(
+                json.dumps({'ident': i, 'resultado': r}, ensure_ascii=False) + '\n' for i, r in zip(idents, valores)
+            )
+        else:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            tabela = pa.table({
+                'ident': pa.array(idents, pa.string()),
+                'resultado': pa.array(resultados, pa.float32())
+            })
+            if self._parquet is None:
+                self._parquet = pq.ParquetWriter(self.filename, tabela.schema)
+            self._parquet.write_table(tabela)
+
+    def fechar(self):
+        if self.formato == 'parquet':
+            if self._parquet is not None:
+                self._parquet.close()
+        else:
+            self._arquivo.close()
+
+
+def classificar_arquivo(
+        path_modelo: str,
+        path_vec: str,
+        entrada: str,
+        saida: str,
+        tamanho_bloco: int = 10000,
+        processos: int = 0,
+        ao_classificar: Callable[[int, int, float], None] | None = None
+) -> Tuple[int, float]:
+    """
+    Classifica todas as produções do arquivo `entrada` e grava os resultados em `saida`, na mesma ordem.
+
+    O arquivo é lido em blocos de `tamanho_bloco` linhas. Com `processos` > 0, os blocos são classificados
+    em um pool de processos, cada um com o seu modelo e vetorizador, enquanto o processo principal lê os
+    próximos blocos e grava os resultados. No máximo `2 * processos` blocos ficam em andamento, então a
+    memória não depende do tamanho do arquivo. Com `processos` = 0, tudo é feito neste processo.
+
+    :param ao_classificar: chamada a cada bloco gravado, com o número do bloco, a quantidade de produções
+        gravadas até agora e o tempo decorrido (s)
+
+    :return: a quantidade de produções classificadas, e o tempo total (s)
+    """
+    escritor = EscritorArquivo(saida)
+    quantidade = 0
+    inicio = perf_counter()
+
+    def gravar(numero: int, idents: List[str], resultados: np.ndarray):
+        nonlocal quantidade
+        escritor.escrever(idents, resultados)
+        quantidade += len(idents)
+        if ao_classificar is not None:
+            ao_classificar(numero, quantidade, perf_counter() - inicio)
+
+    blocos = (preparar_bloco(df) for df in ler_blocos(entrada, tamanho_bloco))
+    try:
+        if processos <= 0:
+            _iniciar_processo(path_modelo, path_vec)
+            for numero, (idents, textos) in enumerate(blocos, start=1):
+                gravar(numero, idents, _classificar_textos(textos))
+            return quantidade, perf_counter() - inicio
+
+        # os pesos são extraídos para o mapeamento uma única vez, antes de todos os processos carregarem o modelo
+        if path_modelo.endswith('.npz'):
+            from rede_neural.motor_numpy import ModeloNumpy
+            ModeloNumpy.preparar_mapeado(path_modelo)
+
+        # 'spawn': cada processo carrega o modelo do zero, sem herdar o estado do TensorFlow do processo principal
+        with ProcessPoolExecutor(
+                max_workers=processos,
+                mp_context=get_context('spawn'),
+                initializer=_iniciar_processo,
+                initargs=(path_modelo, path_vec)
+        ) as pool:
+            pendentes: Deque[Tuple[List[str], Future]] = deque()
+
+            def gravar_primeiro():
+                idents_prontos, futuro = pendentes.popleft()
+                gravar(numero - len(pendentes), idents_prontos, futuro.result())
+
+            for numero, (idents, textos) in enumerate(blocos, start=1):
+                pendentes.append((idents, pool.submit(_classificar_textos, textos)))
+                # os resultados são gravados na ordem de leitura, mesmo que um bloco posterior termine antes
+                while len(pendentes) >= 2 * processos or (pendentes and pendentes[0][1].done()):
+                    gravar_primeiro()
+
+            while pendentes:
+                gravar_primeiro()
+    finally:
+        escritor.fechar()
+
+    return quantidade, perf_counter() - inicio
+
+
+def mostrar_progresso(numero: int, quantidade: int, segundos: float):
+    cprint(f'  Bloco {numero} gravado [{quantidade} produções, {segundos:.1f} s, '
+           f'{quantidade / max(segundos, 1e-9):.0f} produções/s]', 'blue')
@@ -1,14 +1,25 @@
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from queue import Full, Queue
+from threading import Event
 from os import environ
+from time import perf_counter
 from termcolor import colored, cprint
 from franz.openrdf.exceptions import ServerException
 from franz.openrdf.sail.allegrographserver import RepositoryConnection, AllegroGraphServer
 
 # para typing
-from typing import List, Dict
+from typing import List, Dict, Iterable, Iterator, Set, Tuple
 from franz.openrdf.repository import Repository
+from franz.openrdf.rio.rdfformat import RDFFormat
 from franz.openrdf.query.queryresult import ListBindingSet
 from franz.miniclient.request import RequestError
 
+from rede_neural.sentenca import TIPO_DISCIPLINA, montar_sentenca
+
+from .fluxo import agrupar
+from .paginacao import Progresso, Retomada, iterar_paginas
+
 
 def cinput(texto, cor):
     print(colored(texto, cor), end='')
@@ -22,26 +33,17 @@ def checa_variavel_ambiente():
             exit(-1)
 
 
-def conectar() -> RepositoryConnection:
+def conectar_repositorios() -> List[Tuple[str, RepositoryConnection]]:
     """
-    Tenta conectar no servidor AllegroGraph.
-
-    Essa função precisa que as seguintes variaveis de ambiente existam:
-
-        * AGRAPH_HOST
-        * AGRAPH_PORT
-        * AGRAPH_USER
-        * AGRAPH_PASSWORD
-
-    Ela irá perguntar os repositórios para criar uma federação diretamente ao usuário, por meio
-    de `input`.
+    Igual a `conectar()`, porém não cria a federação: retorna a conexão com cada repositório,
+    junto com o seu nome, na ordem em que foram digitados.
     """
 
     checa_variavel_ambiente()
 
     server = AllegroGraphServer()
-    catalogo = server.openCatalog(None)                  # catalogo root
-    lista_conexoes: List[RepositoryConnection] = list()  # repositorios
+    catalogo = server.openCatalog(None)                               # catalogo root
+    lista_conexoes: List[Tuple[str, RepositoryConnection]] = list()  # repositorios
 
     while (r := cinput("Digite o nome do repositório, ou [ENTER] para finalizar: ", 'blue')) != '':
         try:
@@ -54,14 +56,34 @@ def conectar() -> RepositoryConnection:
             size = repo.size()
             cprint(f'Repositório contendo {size} tuplas', 'green')
 
-            lista_conexoes.append(repo)
+            lista_conexoes.append((r.strip(), repo))
 
         except ServerException:  # quando nao encontra o repositorio
             cprint(f'Repositorio {r} nao encontrado. Tente novamente', 'yellow')
             continue
 
+    return lista_conexoes
+
+
+def conectar() -> RepositoryConnection:
+    """
+    Tenta conectar no servidor AllegroGraph.
+
+    Essa função precisa que as seguintes variaveis de ambiente existam:
+
+        * AGRAPH_HOST
+        * AGRAPH_PORT
+        * AGRAPH_USER
+        * AGRAPH_PASSWORD
+
+    Ela irá perguntar os repositórios para criar uma federação diretamente ao usuário, por meio
+    de `input`.
+    """
+
+    lista_conexoes = [repo for _, repo in conectar_repositorios()]
+
     # criando feredação e retornando
-    return server.openFederated(repositories=lista_conexoes)
+    return AllegroGraphServer().openFederated(repositories=lista_conexoes)
 
 
 def conectar_repositorio(repositorio: str) -> RepositoryConnection:
@@ -81,6 +103,88 @@ def conectar_repositorio(repositorio: str) -> RepositoryConnection:
     ).getConnection()
 
 
+def _par_producao(binding_set: ListBindingSet) -> Tuple[str, str]:
+    ident: str = binding_set.getValue('ident').toNTriples()
+    nome: str = binding_set.getValue('nome').toPython()
+    return ident, nome
+
+
+def _par_disciplina(binding_set: ListBindingSet) -> Tuple[str, str]:
+    ident: str = binding_set.getValue('ident').toNTriples()
+    nome: str = binding_set.getValue('nome').toPython()
+    ementa: str = binding_set.getValue('ementa').toPython()
+
+    # juntando a ementa com o nome da disciplina, se ela contém algo importante
+    return ident, montar_sentenca(nome, ementa, TIPO_DISCIPLINA)
+
+
+def _sem_repeticoes(pares: Iterable[Tuple[str, str]], vistos: Set[str]) -> Iterator[Tuple[str, str]]:
+    """Descarta os pares cujo `ident` ja está em `vistos`, e adiciona os demais em `vistos`"""
+    for ident, texto in pares:
+        if ident not in vistos:
+            vistos.add(ident)
+            yield ident, texto
+
+
+def iterar_producoes(fed: RepositoryConnection) -> Iterator[Tuple[str, str]]:
+    """
+    Itera sobre todas as produções no Allegro, na forma:
+
+    ("Node", "texto_para_ser_usado_na_classificacao")
+
+    As produções são geradas conforme os resultados das queries chegam, sem serem acumuladas em memória;
+    somente os identificadores ja gerados são guardados, para que cada produção apareça uma única vez
+    (uma produção com vários títulos ou tipos, ou que também seja uma disciplina, vem em várias linhas).
+    Vale a primeira linha de cada produção, e as disciplinas vêm primeiro, então o texto com a ementa
+    tem precedência.
+
+    :param fed: Conexão com a federação
+    :return: iterador de pares na forma acima
+    """
+
+    # coletando as disciplinas
+    # e depois as producoes (exceto disciplinas)
+    # producao é quando um objeto tem um título, e é do tipo bibo:Thesis, Article, Book ou Chapter
+    vistos: Set[str] = set()
+    for query, converter in CONSULTAS.values():
+        with fed.executeTupleQuery(query) as repository_result:                 # fazendo a query
+            # iterando sobre os resultados
+            yield from _sem_repeticoes((converter(binding_set) for binding_set in repository_result), vistos)
+
+
+def iterar_producoes_paginado(
+        fed: RepositoryConnection,
+        tamanho_pagina: int = 10000,
+        paralelo: int = 1,
+        retomada: Retomada | None = None
+) -> Iterator[Tuple[Tuple[str, int], List[Tuple[str, str]]]]:
+    """
+    Igual a `iterar_producoes`, porém cada query é executada em páginas (LIMIT/OFFSET), com até `paralelo`
+    páginas sendo requisitadas ao mesmo tempo.
+
+    Se `retomada` for passada, cada query começa a partir da primeira página ainda não concluída.
+    As produções repetidas são descartadas como em `iterar_producoes`, exceto as que ja apareceram nas
+    páginas concluídas em uma execução anterior.
+
+    :return: iterador de pares ((nome da query, número da página), lista de pares (ident, texto))
+    """
+
+    vistos: Set[str] = set()
+    for nome, (query, converter) in CONSULTAS.items():
+        inicio = retomada.proxima(nome) if retomada is not None else 0
+        if inicio > 0:
+            cprint(f'Retomando [{nome}] a partir da página {inicio}', 'yellow')
+
+        for pagina, pares in iterar_paginas(
+                fed, query, converter,
+                tamanho_pagina=tamanho_pagina,
+                paralelo=paralelo,
+                inicio=inicio,
+                progresso=Progresso(nome)
+        ):
+            yield (nome, pagina), list(_sem_repeticoes(pares, vistos))
+
+
 def obter_dicionario_completo(fed: RepositoryConnection) -> Dict[str, str]:
     """
     Obtem um dicionario contendo todas as produções no Allegro, na forma:
@@ -91,30 +195,84 @@ def obter_dicionario_completo(fed: RepositoryConnection) -> Dict[str, str]:
     :return: dicionario na forma acima
     """
 
-    ret: Dict[str, str] = dict()
+    return dict(iterar_producoes(fed))
 
-    # coletando producoes (exceto disciplinas)
-    # producao é quando um objeto tem um título, e é do tipo bibo:Thesis, Article, Book ou Chapter
-    with fed.executeTupleQuery(QUERY_PRODUCOES) as repository_result:       # fazendo a query
-        for binding_set in repository_result:  # type: ListBindingSet       # iterando sobre os resultados
-            ident: str = binding_set.getValue('ident').toNTriples()
-            nome: str = binding_set.getValue('nome').toPython()
-            ret[ident] = nome
-
-    # coletando disciplinas
-    with fed.executeTupleQuery(QUERY_DISCIPLINAS) as repository_result:
-        for binding_set in repository_result:   # type: ListBindingSet
-            ident: str = binding_set.getValue('ident').toNTriples()
-            nome: str = binding_set.getValue('nome').toPython()
-            ementa: str = binding_set.getValue('ementa').toPython()
-
-            # verificando se a ementa contem algo importante para juntar com o nome da disciplina
-            if "ementa" not in ementa.lower() and len(ementa) > 10:
-                ret[ident] = f'{nome} {ementa}'
-            else:
-                ret[ident] = nome
 
-    return ret
+def iterar_producoes_paralelo(
+        conexoes: List[Tuple[str, RepositoryConnection]],
+        max_workers: int | None = None,
+        tamanho_grupo: int = 1000
+) -> Iterator[Tuple[str, str]]:
+    """
+    Igual a `iterar_producoes`, porém executa as queries em cada repositório separadamente, em paralelo,
+    em vez de usar uma federação.
+
+    Os pares de todos os repositórios são gerados conforme chegam, em grupos de `tamanho_grupo` que passam
+    por uma fila limitada, então a memória não depende da quantidade de produções. Se a mesma produção
+    (`ident`) aparecer em mais de um repositório, ela é gerada uma única vez, com o texto do repositório
+    que a entregou primeiro.
+
+    :param conexoes: pares (nome, conexão), como retornado por `conectar_repositorios`
+    :param max_workers: quantidade de threads. Por padrão, uma por repositório
+    :return: iterador de pares na forma ("Node", "texto_para_ser_usado_na_classificacao")
+    """
+
+    fila: Queue = Queue(maxsize=2 * max(1, len(conexoes)))
+    parar = Event()
+
+    def coletar(nome: str, repo: RepositoryConnection):
+        t = perf_counter()
+        quantidade = 0
+        try:
+            for grupo in agrupar(iterar_producoes(repo), tamanho_grupo):
+                # espera espaço na fila, mas desiste se quem consome parou
+                while not parar.is_set():
+                    try:
+                        fila.put(grupo, timeout=0.1)
+                        break
+                    except Full:
+                        continue
+                if parar.is_set():
+                    return
+                quantidade += len(grupo)
+            cprint(f'  [{nome}] {quantidade} produções em {perf_counter() - t:.2f} s', 'green')
+        finally:
+            fila.put(None)      # fim deste repositório. Quem consome sempre esvazia a fila até receber todos os fins
+
+    t = perf_counter()
+    vistos: Set[str] = set()
+    with ThreadPoolExecutor(max_workers=max_workers or max(1, len(conexoes)), thread_name_prefix='repo') as executor:
+        futuros = [executor.submit(coletar, nome, repo) for nome, repo in conexoes]
+        try:
+            terminados = 0
+            while terminados < len(futuros):
+                if (grupo := fila.get()) is None:
+                    terminados += 1
+                    continue
+                yield from _sem_repeticoes(grupo, vistos)
+        finally:
+            parar.set()
+            while terminados < len(futuros):        # libera os repositórios que ainda estão coletando
+                if fila.get() is None:
+                    terminados += 1
+
+        for futuro in futuros:      # repassa os erros da coleta
+            futuro.result()
+
+    cprint(f'Total: {len(vistos)} produções distintas em {perf_counter() - t:.2f} s', 'green')
+
+
+def obter_dicionario_paralelo(
+        conexoes: List[Tuple[str, RepositoryConnection]],
+        max_workers: int | None = None
+) -> Dict[str, str]:
+    """
+    Igual a `iterar_producoes_paralelo`, porém junta todas as produções em um dicionario
+
+    :return: dicionario na forma { "Node": "texto_para_ser_usado_na_classificacao", ... }
+    """
+
+    return dict(iterar_producoes_paralelo(conexoes, max_workers))
 
 
 def obter_cad_puc_namespace(repo: RepositoryConnection) -> str | None:
@@ -132,10 +290,80 @@ def obter_cad_puc_namespace(repo: RepositoryConnection) -> str | None:
         return None
 
 
+# tipo dos resultados armazenados, o mesmo usado por `repo.createLiteral` para um float
+_XSD_DOUBLE = '<http://www.w3.org/2001/XMLSchema#double>'
+
+# formas léxicas de xsd:double para os valores que o `repr` do Python escreve como 'nan', 'inf' e '-inf'
+_DOUBLES_ESPECIAIS = {'nan': 'NaN', 'inf': 'INF', '-inf': '-INF'}
+
+
+def _literal_double(valor: float) -> str:
+    texto = repr(float(valor))
+    return _DOUBLES_ESPECIAIS.get(texto, texto)
+
+
+def _validar_iris(nodes: List[str]):
+    """
+    Os nodes usados em VALUES precisam ser IRIs: um nó em branco (`_:b...`) na query é um nó novo, e não
+    o nó do repositório com o mesmo rótulo
+
+    :raise ValueError: se algum node não for uma IRI em N-Triples
+    """
+    invalidos = [node for node in nodes if not node.startswith('<')]
+    if invalidos:
+        raise ValueError(f'{len(invalidos)} nodes não são IRIs (ex.: {invalidos[0]})')
+
+
+def serializar_ntriples(
+        pares: Iterable[Tuple[str, float]],
+        predicado: str,
+        contexto: str | None = None
+) -> str:
+    """
+    Serializa os pares ("Node", valor) como N-Triples, uma linha por produção, na forma:
+
+        ```<Producao#id> <cad-puc:RelacionadoMeioAmbiente> "NUMERO"^^xsd:double .```
+
+    Os nodes ja estão em formato N-Triples (veja `_par_producao`), assim como `predicado`.
+    Se `contexto` (também em N-Triples) for definido, gera N-Quads, com as triplas nesse grafo.
+    Valores não finitos são escritos como `NaN`, `INF` e `-INF`, como exige o xsd:double.
+    """
+    final = f' {contexto} .\n' if contexto is not None else ' .\n'
+    buffer = StringIO()
+    for node, valor in pares:
+        buffer.write(f'{node} {predicado} "{_literal_double(valor)}"^^{_XSD_DOUBLE}{final}')
+    return buffer.getvalue()
+
+
+def _contar_valores(repo: RepositoryConnection, nodes: List[str], predicado: str) -> int:
+    """Quantidade de triplas `predicado` dos `nodes`, sem percorrer o repositório inteiro como `size()`"""
+    _validar_iris(nodes)
+    query = f'''
+        SELECT (COUNT(*) AS ?quantidade)
+        WHERE {{ VALUES ?ident {{ {' '.join(nodes)} }} ?ident {predicado} ?valor . }}
+    '''
+    with repo.executeTupleQuery(query) as repository_result:
+        for binding_set in repository_result:
+            return int(binding_set.getValue('quantidade').toPython())
+    return 0
+
+
+def _remover_valores(repo: RepositoryConnection, nodes: List[str], predicado: str):
+    """Remove os valores de `predicado` ja armazenados para os `nodes`, em uma única atualização"""
+    _validar_iris(nodes)
+    repo.executeUpdate(f'''
+        DELETE {{ ?ident {predicado} ?valor }}
+        WHERE {{ VALUES ?ident {{ {' '.join(nodes)} }} ?ident {predicado} ?valor . }}
+    ''')
+
+
 def guardar_dicionario(
         repo: RepositoryConnection,
         dicionario: Dict[str, float],
-        cad_puc_namespace=None
+        cad_puc_namespace=None,
+        substituir: bool = False,
+        tamanho_bloco: int = 10000,
+        contexto: str | None = None
 ):
     """
     Armazena quais produções são relacionadas à meio ambiente no Allegro.
@@ -146,6 +374,15 @@ def guardar_dicionario(
 
     Onde `NUMERO` é um número de 0 a 1, que diz o quão relacionado com meio ambiente.
 
+    As triplas são serializadas diretamente em N-Triples (sem criar um `Statement` para cada uma) e
+    enviadas em blocos de `tamanho_bloco`, cada um em uma única requisição e em uma transação própria.
+    Depois de enviar cada bloco, a quantidade de triplas dos nodes do bloco é conferida; se não for a
+    esperada, o bloco é desfeito.
+
+    Produções identificadas por nós em branco (`_:b...`) não são armazenadas: cada inserção criaria um nó
+    novo, sem ligação com a produção, e elas não podem ser conferidas nem substituídas. As queries de
+    `CONSULTAS` ja não as retornam.
+
     :param repo: Conexão com repositório a serem guardadas as triplas
 
     :param dicionario: Dicionario contendo as produções à serem inseridas. Deve ser no formato:
@@ -154,7 +391,14 @@ def guardar_dicionario(
     :param cad_puc_namespace: Namespace para ser usado como `cad_puc`.
     Se não for definido, será usado "http://www.nima.puc-rio.br/cad-puc/"
 
-    :return:
+    :param substituir: Se verdadeiro, os valores de `RelacionadoMeioAmbiente` que ja existiam para as produções
+    são removidos, então cada produção fica com um único valor
+
+    :param tamanho_bloco: Quantidade de triplas enviadas em cada requisição
+
+    :param contexto: Grafo (em N-Triples) onde as triplas serão guardadas. Por padrão, o grafo padrão
+
+    :return: a quantidade de triplas armazenadas
     """
     default_cad_puc_namespace = "http://www.nima.puc-rio.br/cad-puc/"
 
@@ -162,42 +406,49 @@ def guardar_dicionario(
         cprint(f'Namespace "cad-puc" nao definido, usando default: {default_cad_puc_namespace}', 'yellow')
         cad_puc_namespace = default_cad_puc_namespace
 
-    predicado = repo.createURI(
-        namespace=cad_puc_namespace,
-        localname='RelacionadoMeioAmbiente'
-    )
-
-    # criando lista de triplas/statements a serem inseridas
-    lista_triplas = [
-        repo.createStatement(
-            subject=node,
-            predicate=predicado,
-            object=repo.createLiteral(value=valor)
-        )
-        for node, valor in dicionario.items()
-    ]
-
-    # configurando batch size para serem 10 commits
-    batch_size = len(lista_triplas) // 10
-    cprint(f'Batch size: {batch_size}', 'blue')
-    repo.add_commit_size = batch_size
-
-    # adicionando no repositorio
+    predicado = f'<{cad_puc_namespace}RelacionadoMeioAmbiente>'
+    formato = RDFFormat.NQUADS if contexto is not None else RDFFormat.NTRIPLES
+    tamanho_bloco = max(tamanho_bloco, 1)
+
+    pares = [(node, valor) for node, valor in dicionario.items() if node.startswith('<')]
+    if len(pares) < len(dicionario):
+        cprint(f'{len(dicionario) - len(pares)} produções identificadas por nós em branco serão ignoradas',
+               'yellow')
+
+    armazenadas = 0
     with repo.session():
-        q = repo.size()
-        repo.addTriples(triples_or_quads=lista_triplas)
+        for i, bloco in enumerate(agrupar(pares, tamanho_bloco)):
+            nodes = [node for node, _ in bloco]
+            t = perf_counter()
+
+            if substituir:
+                _remover_valores(repo, nodes, predicado)
+                esperado = len(nodes)
+            else:
+                esperado = _contar_valores(repo, nodes, predicado) + len(nodes)
 
-        if repo.size() - q == len(lista_triplas):
-            cprint('Operação efetuada com sucesso', 'green')
-        else:
-            cprint("Quantidade final não é a esperada. Efetuando rollback", 'red')
-            repo.rollback()
+            repo.addData(serializar_ntriples(bloco, predicado, contexto), rdf_format=formato)
 
-    return
+            quantidade = _contar_valores(repo, nodes, predicado)
+            if quantidade != esperado:
+                cprint(f"  Bloco {i + 1}: {quantidade} triplas, esperadas {esperado}. Efetuando rollback", 'red')
+                repo.rollback()
+                continue
+
+            repo.commit()
+            armazenadas += len(bloco)
+            cprint(f'  Bloco {i + 1} armazenado [{len(bloco)} triplas, {perf_counter() - t:.2f} s]', 'blue')
+
+    if armazenadas == len(dicionario):
+        cprint('Operação efetuada com sucesso', 'green')
+    else:
+        cprint(f'{len(dicionario) - armazenadas} triplas não foram armazenadas', 'red')
+
+    return armazenadas
 
 
 QUERY_PRODUCOES = """
-    SELECT ?ident ?nome
+    SELECT DISTINCT ?ident ?nome
     WHERE {
         ?ident 
             dc:title ?nome ;
@@ -208,16 +459,26 @@ QUERY_PRODUCOES = """
             <http://purl.org/ontology/bibo/Book>,
             <http://purl.org/ontology/bibo/Chapter>
         ) ) .    
+        filter (isIRI(?ident)) .
     }
 """
 
 
 QUERY_DISCIPLINAS = """
     PREFIX ccso: <https://w3id.org/ccso/ccso#>
-    SELECT ?ident ?nome ?ementa
+    SELECT DISTINCT ?ident ?nome ?ementa
     WHERE {
         ?ident
             ccso:csName ?nome ;
             ccso:KnowledgeBody ?ementa .
+        filter (isIRI(?ident)) .
     }
-"""
\ No newline at end of file
+"""
+
+
+# queries usadas para coletar as produções, e a conversão de cada resultado para (ident, texto).
+# As disciplinas vêm primeiro, para que o seu texto prevaleça sobre o da mesma produção sem a ementa
+CONSULTAS = {
+    'disciplinas': (QUERY_DISCIPLINAS, _par_disciplina),
+    'producoes': (QUERY_PRODUCOES, _par_producao),
+}
@@ -0,0 +1,161 @@
+from itertools import islice
+from queue import Full, Queue
+from threading import Event, Thread
+from time import perf_counter
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple
+from termcolor import cprint
+
+# marca o fim de uma fila
+_FIM = object()
+
+
+def agrupar(pares: Iterable[Tuple[str, str]], tamanho: int) -> Iterator[List[Tuple[str, str]]]:
+    """Agrupa os pares (ident, texto) em listas de até `tamanho` elementos"""
+    iterador = iter(pares)
+    while lote := list(islice(iterador, tamanho)):
+        yield lote
+
+
+def em_segundo_plano(iteravel: Iterable, tamanho_fila: int = 2) -> Iterator:
+    """
+    Consome `iteravel` em outra thread, guardando no máximo `tamanho_fila` elementos adiantados.
+
+    Exceções levantadas pelo iterável são repassadas para quem está consumindo. Se quem consome parar antes
+    do fim (por uma exceção, ou fechando o gerador), a thread para de consumir `iteravel` e termina, em vez
+    de ficar esperando espaço na fila para sempre.
+    """
+    fila: Queue = Queue(maxsize=tamanho_fila)
+    erros: List[BaseException] = []
+    parar = Event()
+
+    def colocar(item) -> bool:
+        """Espera espaço na fila, mas desiste se quem consome parou. :return: se o item foi colocado"""
+        while not parar.is_set():
+            try:
+                fila.put(item, timeout=0.1)
+                return True
+            except Full:
+                continue
+        return False
+
+    def produzir():
+        try:
+            for item in iteravel:
+                if not colocar(item):
+                    return
+        except BaseException as e:
+            erros.append(e)
+        finally:
+            colocar(_FIM)
+
+    Thread(target=produzir, name='produtor', daemon=True).start()
+
+    try:
+        while (item := fila.get()) is not _FIM:
+            yield item
+    finally:
+        parar.set()
+
+    if erros:
+        raise erros[0]
+
+
+class Escritor(Thread):
+    """
+    Thread que recebe os resultados de cada lote e os armazena com `guardar`, enquanto
+    os próximos lotes são coletados e classificados.
+    """
+
+    def __init__(
+            self,
+            guardar: Callable[[Dict[str, float]], bool | None],
+            ao_guardar: Callable[[Any], None] | None = None,
+            tamanho_fila: int = 2
+    ):
+        super().__init__(name='escritor', daemon=True)
+        self.guardar = guardar
+        self.ao_guardar = ao_guardar
+        self.fila: Queue = Queue(maxsize=tamanho_fila)
+        self.erro: BaseException | None = None
+        self.quantidade = 0         # produções dos lotes armazenados por completo
+        self.incompleto = False     # algum lote não foi armazenado por completo
+
+    def run(self):
+        while (item := self.fila.get()) is not _FIM:
+            if self.erro is not None:       # ja falhou, somente esvazia a fila
+                continue
+            marca, resultados = item
+            try:
+                if not resultados or self.guardar(resultados) is not False:
+                    self.quantidade += len(resultados)
+                else:
+                    self.incompleto = True
+                # as marcas indicam até onde tudo foi armazenado, então param no primeiro lote incompleto
+                if not self.incompleto and self.ao_guardar is not None:
+                    self.ao_guardar(marca)
+            except BaseException as e:
+                self.erro = e
+
+    def escrever(self, marca: Any, resultados: Dict[str, float]):
+        if self.erro is not None:
+            raise self.erro
+        self.fila.put((marca, resultados))
+
+    def finalizar(self):
+        self.fila.put(_FIM)
+        self.join()
+        if self.erro is not None:
+            raise self.erro
+
+
+def classificar_lotes_em_fluxo(
+        lotes: Iterable[Tuple[Any, List[Tuple[str, str]]]],
+        classificar_lote: Callable[[Dict[str, str]], Dict[str, float]],
+        guardar: Callable[[Dict[str, float]], bool | None],
+        ao_guardar: Callable[[Any], None] | None = None
+) -> int:
+    """
+    Classifica e armazena as produções lote a lote, sem nunca ter todas elas em memória.
+
+    São três etapas, executadas ao mesmo tempo: a coleta dos lotes, em uma thread; a classificação de
+    cada lote com `classificar_lote`, nesta thread; e o armazenamento de cada lote classificado com
+    `guardar`, em outra thread. Como as filas entre as etapas são limitadas, a memória usada depende
+    somente do tamanho dos lotes.
+
+    :param lotes: pares (marca, lista de (ident, texto)). A marca identifica o lote, como o número da página
+
+    :param guardar: armazena um lote classificado. Deve retornar False se parte do lote não foi armazenada
+
+    :param ao_guardar: chamada com a marca de cada lote, na ordem, depois que ele foi armazenado. Depois de um
+        lote em que `guardar` retornou False, não é mais chamada, então uma retomada começa a partir desse lote
+
+    :return: a quantidade de produções armazenadas, somente dos lotes armazenados por completo
+    """
+
+    escritor = Escritor(guardar, ao_guardar)
+    escritor.start()
+
+    t = perf_counter()
+    try:
+        for i, (marca, lote) in enumerate(em_segundo_plano(lotes)):
+            escritor.escrever(marca, classificar_lote(dict(lote)) if lote else {})
+            cprint(f'  Lote {i + 1} classificado [{len(lote)} produções, {perf_counter() - t:.1f} s]', 'blue')
+    finally:
+        escritor.finalizar()
+
+    return escritor.quantidade
+
+
+def classificar_em_fluxo(
+        pares: Iterable[Tuple[str, str]],
+        classificar_lote: Callable[[Dict[str, str]], Dict[str, float]],
+        guardar: Callable[[Dict[str, float]], None],
+        tamanho_lote: int = 10000
+) -> int:
+    """
+    Igual a `classificar_lotes_em_fluxo`, porém agrupa os pares (ident, texto) em lotes de `tamanho_lote`.
+
+    :return: a quantidade de produções armazenadas
+    """
+
+    return classificar_lotes_em_fluxo(enumerate(agrupar(pares, tamanho_lote)), classificar_lote, guardar)
@@ -0,0 +1,96 @@
+import hashlib
+import sqlite3
+from threading import Lock
+from typing import Dict, Iterable, Iterator, Tuple
+
+from .fluxo import agrupar
+
+
+def calcular_hash(texto: str) -> bytes:
+    """Impressão digital do texto usado na classificação de uma produção"""
+    return hashlib.blake2b(texto.encode('utf-8'), digest_size=16).digest()
+
+
+def versao_arquivos(*filenames: str) -> str:
+    """
+    Calcula a versão do modelo a partir do conteúdo dos arquivos (modelo e vetorizador).
+    Qualquer mudança em algum deles gera uma versão diferente.
+    """
+    h = hashlib.sha256()
+    for filename in filenames:
+        with open(filename, 'rb') as f:
+            while bloco := f.read(1 << 20):
+                h.update(bloco)
+    return h.hexdigest()
+
+
+class RegistroImpressoes:
+    """
+    Armazena localmente (em um arquivo SQLite) a impressão digital de cada produção ja classificada,
+    junto com a versão do modelo que a classificou.
+
+    Usado pelo modo incremental de `main_completo.py`: somente as produções novas, ou cujo texto mudou,
+    são classificadas novamente. Se a versão do modelo mudar, o registro é esvaziado, e todas as produções
+    são classificadas de novo.
+    """
+
+    def __init__(self, filename: str, versao: str):
+        self._conexao = sqlite3.connect(filename, check_same_thread=False)
+        self._lock = Lock()
+        self._pendentes: Dict[str, bytes] = dict()
+
+        with self._lock, self._conexao:
+            self._conexao.execute(
+                'CREATE TABLE IF NOT EXISTS impressoes (ident TEXT PRIMARY KEY, hash BLOB NOT NULL)'
+            )
+            self._conexao.execute(
+                'CREATE TABLE IF NOT EXISTS meta (chave TEXT PRIMARY KEY, valor TEXT NOT NULL)'
+            )
+            linha = self._conexao.execute("SELECT valor FROM meta WHERE chave = 'versao'").fetchone()
+
+        # modelo diferente do usado na última execução: tudo precisa ser classificado de novo
+        self.reconstrucao = linha is None or linha[0] != versao
+        if self.reconstrucao:
+            self.limpar(versao)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conexao.execute('SELECT COUNT(*) FROM impressoes').fetchone()[0]
+
+    def limpar(self, versao: str):
+        """Esvazia o registro, forçando a reclassificação de todas as produções"""
+        with self._lock, self._conexao:
+            self._conexao.execute('DELETE FROM impressoes')
+            self._conexao.execute("INSERT OR REPLACE INTO meta VALUES ('versao', ?)", (versao,))
+        self.reconstrucao = True
+
+    def filtrar(self, pares: Iterable[Tuple[str, str]], tamanho_consulta: int = 500) -> Iterator[Tuple[str, str]]:
+        """
+        Deixa passar somente os pares (ident, texto) que ainda não foram classificados com este texto.
+
+        As impressões das produções que passaram ficam pendentes até serem confirmadas por `confirmar`,
+        depois que o resultado delas for armazenado.
+        """
+        for lote in agrupar(pares, tamanho_consulta):
+            idents = [ident for ident, _ in lote]
+            with self._lock:
+                conhecidos = dict(self._conexao.execute(
+                    f'SELECT ident, hash FROM impressoes WHERE ident IN ({",".join("?" * len(idents))})',
+                    idents
+                ))
+
+            for ident, texto in lote:
+                h = calcular_hash(texto)
+                if conhecidos.get(ident) != h:
+                    self._pendentes[ident] = h
+                    yield ident, texto
+
+    def confirmar(self, resultados: Iterable[str]):
+        """Registra as impressões das produções cujos resultados ja foram armazenados"""
+        linhas = [(ident, h) for ident in resultados if (h := self._pendentes.pop(ident, None)) is not None]
+        with self._lock, self._conexao:
+            self._conexao.executemany('INSERT OR REPLACE INTO impressoes VALUES (?, ?)', linhas)
+
+    def fechar(self):
+        with self._lock:
+            self._conexao.close()
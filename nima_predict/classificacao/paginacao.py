@@ -0,0 +1,128 @@
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+from os import path, remove, replace
+from threading import Lock
+from time import perf_counter
+from typing import Callable, Dict, Iterator, List, Tuple
+from termcolor import cprint
+
+
+def variaveis_projetadas(query: str) -> List[str]:
+    """As variáveis do SELECT da query, na ordem (por exemplo ['?ident', '?nome'])"""
+    projecao = re.search(r'SELECT\s+(?:DISTINCT\s+|REDUCED\s+)?(.*?)\s*WHERE', query, re.IGNORECASE | re.DOTALL)
+    if projecao is None or '*' in projecao.group(1):
+        raise ValueError("a query precisa listar as variáveis do SELECT para ser paginada")
+    return re.findall(r'\?\w+', projecao.group(1))
+
+
+def paginar(query: str, tamanho_pagina: int, pagina: int) -> str:
+    """
+    Adiciona a paginação (LIMIT/OFFSET) em uma query SELECT.
+
+    Os resultados são ordenados por todas as variáveis do SELECT, para que as páginas sejam estáveis entre
+    as requisições. Ordenar somente por `?ident` não basta: várias linhas podem ter o mesmo `?ident` (um título
+    ou tipo em cada uma), e a ordem entre elas pode mudar, pulando ou repetindo linhas entre as páginas.
+    """
+    ordem = ' '.join(variaveis_projetadas(query))
+    return f'{query.rstrip()}\nORDER BY {ordem}\nLIMIT {tamanho_pagina}\nOFFSET {pagina * tamanho_pagina}\n'
+
+
+class Retomada:
+    """
+    Guarda em um arquivo JSON a próxima página a ser coletada de cada query, para que uma
+    extração interrompida possa continuar de onde parou.
+
+    Uma página só deve ser marcada depois que todos os seus resultados foram armazenados.
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self._lock = Lock()
+        self.proximas: Dict[str, int] = dict()
+
+        if path.isfile(filename):
+            with open(filename, 'r', encoding='utf-8') as f:
+                self.proximas = json.load(f)
+
+    def proxima(self, nome: str) -> int:
+        return self.proximas.get(nome, 0)
+
+    def marcar(self, nome: str, pagina: int):
+        """Marca que a página `pagina` da query `nome` (e todas as anteriores) foi concluída"""
+        with self._lock:
+            self.proximas[nome] = max(self.proximas.get(nome, 0), pagina + 1)
+
+            # escrevendo em um arquivo temporário, para nunca deixar o arquivo pela metade
+            temporario = self.filename + '.tmp'
+            with open(temporario, 'w', encoding='utf-8') as f:
+                json.dump(self.proximas, f)
+            replace(temporario, self.filename)
+
+    def concluir(self):
+        """Remove o arquivo ao final de uma extração completa, para que a próxima comece do início"""
+        with self._lock:
+            self.proximas.clear()
+            if path.isfile(self.filename):
+                remove(self.filename)
+
+
+class Progresso:
+    """Imprime o progresso da extração de uma query, em linhas por segundo"""
+
+    def __init__(self, nome: str):
+        self.nome = nome
+        self.linhas = 0
+        self.inicio = perf_counter()
+
+    def pagina(self, pagina: int, linhas: int):
+        self.linhas += linhas
+        decorrido = perf_counter() - self.inicio
+        taxa = self.linhas / decorrido if decorrido > 0 else 0.0
+        cprint(f'  [{self.nome}] página {pagina}: {linhas} linhas '
+               f'(total {self.linhas}, {taxa:.0f} linhas/s)', 'blue')
+
+
+def iterar_paginas(
+        fed,
+        query: str,
+        converter: Callable,
+        tamanho_pagina: int = 10000,
+        paralelo: int = 1,
+        inicio: int = 0,
+        progresso: Progresso | None = None
+) -> Iterator[Tuple[int, List]]:
+    """
+    Executa a query em páginas de `tamanho_pagina` linhas, começando pela página `inicio`.
+
+    Até `paralelo` páginas são requisitadas ao mesmo tempo (somente use mais de uma se o servidor
+    permitir consultas concorrentes na mesma conexão). As páginas são geradas em ordem, e a extração
+    termina na primeira página com menos de `tamanho_pagina` linhas.
+
+    :param converter: função que converte cada `binding_set` do resultado
+
+    :return: iterador de pares (número da página, lista de linhas convertidas)
+    """
+
+    def coletar(pagina: int) -> List:
+        with fed.executeTupleQuery(paginar(query, tamanho_pagina, pagina)) as repository_result:
+            return [converter(binding_set) for binding_set in repository_result]
+
+    with ThreadPoolExecutor(max_workers=paralelo, thread_name_prefix='pagina') as executor:
+        pendentes = [executor.submit(coletar, pagina) for pagina in range(inicio, inicio + paralelo)]
+        pagina = inicio
+
+        while pendentes:
+            linhas = pendentes.pop(0).result()
+            if progresso is not None:
+                progresso.pagina(pagina, len(linhas))
+
+            if len(linhas) < tamanho_pagina:    # última página: descarta as requisições adiantadas
+                for futuro in pendentes:
+                    futuro.cancel()
+                yield pagina, linhas
+                return
+
+            pendentes.append(executor.submit(coletar, pagina + paralelo))
+            yield pagina, linhas
+            pagina += 1
@@ -0,0 +1,120 @@
+import json
+import struct
+from typing import Callable, Dict
+
+import numpy as np
+
+# bibliotecas opcionais: sem elas, o JSON usa a biblioteca padrão e o MessagePack fica indisponível
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# prefixo de 4 bytes (little endian) com a quantidade de resultados, no formato 'float32'
+_QUANTIDADE = struct.Struct('<I')
+
+# quantidade que marca uma resposta de erro no formato 'float32', para não ser confundida com zero resultados
+ERRO_FLOAT32 = 0xFFFFFFFF
+
+
+class Formato:
+    """
+    Como uma requisição é decodificada e como a resposta é codificada.
+
+    `decodificar` recebe os bytes da requisição e levanta `ValueError` se eles forem inválidos (qualquer
+    erro da biblioteca é convertido para `ValueError`).
+    `codificar` recebe o dicionario { 'ident': resultado, ... }, na ordem da requisição.
+    `erro` é a resposta para uma requisição inválida ou rejeitada. Por padrão, a codificação de `{}`.
+    `binario` indica se a resposta pode conter qualquer byte (inclusive '\\n').
+    """
+
+    def __init__(
+            self,
+            nome: str,
+            decodificar: Callable[[bytes], object],
+            codificar: Callable[[Dict[str, float]], bytes],
+            tipo_conteudo: str,
+            binario: bool = False,
+            erro: bytes | None = None
+    ):
+        self.nome = nome
+        self.decodificar = decodificar
+        self.codificar = codificar
+        self.tipo_conteudo = tipo_conteudo
+        self.binario = binario
+        self.erro = erro if erro is not None else codificar({})
+
+
+def _decodificar_json(data: bytes):
+    try:
+        if orjson is not None:
+            return orjson.loads(data)
+        return json.loads(data.decode('utf-8'))
+    except RecursionError as e:     # objetos aninhados demais, no `json` da biblioteca padrão
+        raise ValueError('JSON aninhado demais') from e
+
+
+def _codificar_json(res: dict) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(res)
+    return json.dumps(res).encode('utf-8')
+
+
+def _decodificar_msgpack(data: bytes):
+    try:
+        return msgpack.unpackb(data)
+    except ValueError:      # `ExtraData`, `FormatError`, `StackError`, `UnicodeDecodeError`
+        raise
+    except (msgpack.UnpackException, TypeError) as e:   # `OutOfData`; `TypeError` com uma chave que é lista
+        raise ValueError(str(e) or type(e).__name__) from e
+
+
+def _codificar_msgpack(res: dict) -> bytes:
+    return msgpack.packb(res)
+
+
+def _codificar_float32(res: Dict[str, float]) -> bytes:
+    """A quantidade de resultados seguida dos resultados em float32, na mesma ordem das produções da requisição"""
+    resultados = np.fromiter(res.values(), dtype='<f4', count=len(res))
+    return _QUANTIDADE.pack(len(res)) + resultados.tobytes()
+
+
+def decodificar_float32(data: bytes) -> np.ndarray:
+    """
+    Lê uma resposta no formato 'float32', para uso dos clientes
+
+    :raise ValueError: se for uma resposta de erro (veja `ERRO_FLOAT32`)
+    """
+    quantidade = _QUANTIDADE.unpack_from(data)[0]
+    if quantidade == ERRO_FLOAT32:
+        raise ValueError('o servidor não classificou a requisição')
+    return np.frombuffer(data, dtype='<f4', count=quantidade, offset=_QUANTIDADE.size)
+
+
+JSON = Formato('json', _decodificar_json, _codificar_json, 'application/json')
+
+FORMATOS: Dict[str, Formato] = {
+    'json': JSON,
+    # a requisição continua em JSON; somente a resposta é binária
+    'float32': Formato('float32', _decodificar_json, _codificar_float32, 'application/octet-stream', binario=True,
+                       erro=_QUANTIDADE.pack(ERRO_FLOAT32)),
+}
+if msgpack is not None:
+    FORMATOS['msgpack'] = Formato('msgpack', _decodificar_msgpack, _codificar_msgpack, 'application/msgpack',
+                                  binario=True)
+
+NOMES_FORMATOS = ('json', 'msgpack', 'float32')
+
+
+def obter_formato(nome: str) -> Formato:
+    """:raise ValueError: se o formato não existir, ou depender de uma biblioteca não instalada"""
+    if nome not in FORMATOS:
+        if nome in NOMES_FORMATOS:
+            raise ValueError(f"formato '{nome}' indisponível, instale a biblioteca '{nome}'")
+        raise ValueError(f"formato desconhecido: {nome}")
+    return FORMATOS[nome]
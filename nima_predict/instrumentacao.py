@@ -0,0 +1,201 @@
+import logging
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from time import monotonic, perf_counter
+from typing import Callable, Dict, List, Sequence, Tuple
+
+# métricas registradas, na ordem em que aparecem no endpoint
+_registro: List = []
+
+# limites (em segundos) dos histogramas de latência
+LIMITES_LATENCIA = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# limites (em produções) do histograma do tamanho dos lotes
+LIMITES_LOTE = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096, 16384)
+
+
+def _formatar_rotulo(rotulo: str | None, valor: str | None, extra: str = '') -> str:
+    partes = [f'{rotulo}="{valor}"'] if rotulo is not None and valor is not None else []
+    if extra:
+        partes.append(extra)
+    return '{' + ','.join(partes) + '}' if partes else ''
+
+
+class Contador:
+    """Contador que só aumenta, opcionalmente separado pelos valores de um `rotulo`"""
+
+    def __init__(self, nome: str, ajuda: str, rotulo: str | None = None):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulo = rotulo
+        self._valores: Dict[str | None, float] = {}
+        self._lock = Lock()
+        _registro.append(self)
+
+    def incrementar(self, quantidade: float = 1, valor_rotulo: str | None = None):
+        with self._lock:
+            self._valores[valor_rotulo] = self._valores.get(valor_rotulo, 0) + quantidade
+
+    def exportar(self) -> List[str]:
+        linhas = [f'# HELP {self.nome} {self.ajuda}', f'# TYPE {self.nome} counter']
+        with self._lock:
+            for valor_rotulo, valor in self._valores.items():
+                linhas.append(f'{self.nome}{_formatar_rotulo(self.rotulo, valor_rotulo)} {valor}')
+        return linhas
+
+
+class Histograma:
+    """Distribuição de valores (latências, tamanhos) em faixas acumuladas, como no Prometheus"""
+
+    def __init__(self, nome: str, ajuda: str, limites: Sequence[float], rotulo: str | None = None):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.limites = tuple(limites)
+        self.rotulo = rotulo
+        self._valores: Dict[str | None, Tuple[List[int], List[float]]] = {}     # -> (faixas, [soma, quantidade])
+        self._lock = Lock()
+        _registro.append(self)
+
+    def observar(self, valor: float, valor_rotulo: str | None = None):
+        with self._lock:
+            faixas, totais = self._valores.setdefault(valor_rotulo, ([0] * len(self.limites), [0.0, 0]))
+            for i, limite in enumerate(self.limites):
+                if valor <= limite:
+                    faixas[i] += 1
+                    break
+            totais[0] += valor
+            totais[1] += 1
+
+    def exportar(self) -> List[str]:
+        linhas = [f'# HELP {self.nome} {self.ajuda}', f'# TYPE {self.nome} histogram']
+        with self._lock:
+            for valor_rotulo, (faixas, (soma, quantidade)) in self._valores.items():
+                acumulado = 0
+                for limite, faixa in zip(self.limites, faixas):
+                    acumulado += faixa
+                    rotulos = _formatar_rotulo(self.rotulo, valor_rotulo, f'le="{limite}"')
+                    linhas.append(f'{self.nome}_bucket{rotulos} {acumulado}')
+                rotulos = _formatar_rotulo(self.rotulo, valor_rotulo, 'le="+Inf"')
+                linhas.append(f'{self.nome}_bucket{rotulos} {quantidade}')
+                linhas.append(f'{self.nome}_sum{_formatar_rotulo(self.rotulo, valor_rotulo)} {soma}')
+                linhas.append(f'{self.nome}_count{_formatar_rotulo(self.rotulo, valor_rotulo)} {quantidade}')
+        return linhas
+
+
+class Indicador:
+    """
+    Valor lido somente quando as métricas são exportadas, por `funcao` (que retorna None se não houver valor).
+    Use `tipo='counter'` para valores que só aumentam, contados em outro lugar.
+    """
+
+    def __init__(self, nome: str, ajuda: str, funcao: Callable[[], float | None], tipo: str = 'gauge'):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.funcao = funcao
+        self.tipo = tipo
+        _registro.append(self)
+
+    def exportar(self) -> List[str]:
+        valor = self.funcao()
+        if valor is None:
+            return []
+        return [f'# HELP {self.nome} {self.ajuda}', f'# TYPE {self.nome} {self.tipo}', f'{self.nome} {valor}']
+
+
+def exportar_metricas() -> str:
+    """Todas as métricas, no formato de texto do Prometheus"""
+    return '\n'.join(linha for metrica in _registro for linha in metrica.exportar()) + '\n'
+
+
+# métricas do servidor
+REQUISICOES = Contador('nima_requisicoes_total', 'Requisições recebidas')
+PRODUCOES = Contador('nima_producoes_total', 'Produções classificadas')
+ERROS = Contador('nima_erros_total', 'Erros, por tipo', rotulo='tipo')
+LATENCIA = Histograma('nima_etapa_segundos', 'Latência de cada etapa de uma requisição', LIMITES_LATENCIA,
+                      rotulo='etapa')
+LOTE = Histograma('nima_lote_producoes', 'Quantidade de produções em cada predição', LIMITES_LOTE)
+REJEICOES = Contador('nima_rejeicoes_total', 'Requisições rejeitadas pelo controle de admissão, por motivo',
+                     rotulo='motivo')
+
+
+@contextmanager
+def cronometrar(etapa: str):
+    """Observa em `LATENCIA` o tempo do bloco, na etapa indicada"""
+    inicio = perf_counter()
+    try:
+        yield
+    finally:
+        LATENCIA.observar(perf_counter() - inicio, etapa)
+
+
+class _TratadorMetricas(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+
+        corpo = exportar_metricas().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, *args):
+        pass
+
+
+def servir_metricas(porta: int, host: str = '127.0.0.1') -> ThreadingHTTPServer:
+    """Expõe as métricas em http://host:porta/metrics, em uma thread separada"""
+    servidor = ThreadingHTTPServer((host, porta), _TratadorMetricas)
+    servidor.daemon_threads = True
+    Thread(target=servidor.serve_forever, name='metricas', daemon=True).start()
+    return servidor
+
+
+class LimiteTaxa(logging.Filter):
+    """
+    Deixa passar no máximo `maximo` mensagens por segundo. As mensagens descartadas são contadas,
+    e a quantidade é adicionada à próxima mensagem que passar.
+    """
+
+    def __init__(self, maximo: int):
+        super().__init__()
+        self.maximo = maximo
+        self._segundo = 0
+        self._quantidade = 0
+        self._descartadas = 0
+        self._lock = Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.maximo <= 0:
+            return True
+
+        with self._lock:
+            segundo = int(monotonic())
+            if segundo != self._segundo:
+                self._segundo, self._quantidade = segundo, 0
+
+            if self._quantidade >= self.maximo:
+                self._descartadas += 1
+                return False
+
+            self._quantidade += 1
+            if self._descartadas:
+                record.msg = f'{record.msg} [{self._descartadas} mensagens omitidas]'
+                self._descartadas = 0
+        return True
+
+
+def configurar_log(nivel: str = 'INFO', maximo_por_segundo: int = 10):
+    """Configura o log do servidor (`logging.getLogger('nima')`), limitado a `maximo_por_segundo` mensagens"""
+    tratador = logging.StreamHandler()
+    tratador.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+    tratador.addFilter(LimiteTaxa(maximo_por_segundo))
+
+    log = logging.getLogger('nima')
+    log.handlers[:] = [tratador]
+    log.setLevel(nivel)
+    log.propagate = False
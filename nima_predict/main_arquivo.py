@@ -0,0 +1,57 @@
+import argparse
+import os
+from os import path
+from termcolor import colored, cprint
+import colorama
+
+from classificacao.arquivos import FORMATOS_ARQUIVO, classificar_arquivo, formato_arquivo, mostrar_progresso
+
+colorama.init()
+
+description = "Classifica as produções de um arquivo (CSV, JSONL ou Parquet) e grava os resultados em outro arquivo"
+
+parser = argparse.ArgumentParser(description=description)
+parser.add_argument('modelo', metavar='MODELO', type=str, help="path/para/modelo (.h ou .npz)")
+parser.add_argument('vectorizer', metavar='VECTORIZER', type=str, help='path/para/vectorizer (.pkl ou .npz)')
+parser.add_argument('entrada', metavar='ENTRADA', type=str,
+                    help=f"arquivo com as colunas ident, nome, tipo e conteudo ({', '.join(FORMATOS_ARQUIVO)})")
+parser.add_argument('saida', metavar='SAIDA', type=str,
+                    help='arquivo de resultados, com as colunas ident e resultado, no formato da extensão')
+parser.add_argument('--bloco', type=int, default=10000,
+                    help='produções lidas e classificadas de cada vez. Padrão: 10000')
+parser.add_argument('--processos', type=int, default=os.cpu_count(),
+                    help='processos classificando os blocos em paralelo. 0 classifica no processo principal. '
+                         f'Padrão: {os.cpu_count()}')
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    for arquivo in (args.modelo, args.vectorizer, args.entrada):
+        if not path.isfile(arquivo):
+            print(colored("Arquivo não encontrado: ", 'red'), arquivo)
+            exit(-1)
+
+    try:
+        formato_arquivo(args.entrada)
+        formato_arquivo(args.saida)
+    except ValueError as e:
+        parser.error(str(e))
+
+    cprint(f'Classificando {args.entrada} em blocos de {args.bloco} produções, com {args.processos} processos',
+           'blue')
+    try:
+        quantidade, segundos = classificar_arquivo(
+            path_modelo=args.modelo,
+            path_vec=args.vectorizer,
+            entrada=args.entrada,
+            saida=args.saida,
+            tamanho_bloco=args.bloco,
+            processos=args.processos,
+            ao_classificar=mostrar_progresso
+        )
+    except Exception as e:
+        print(colored(f"Erro classificando o arquivo: {e}", 'red'))
+        exit(-1)
+
+    cprint(f'Finalizado [{quantidade} produções, {segundos:.1f} s, '
+           f'{quantidade / max(segundos, 1e-9):.0f} produções/s] em {args.saida}', 'blue')
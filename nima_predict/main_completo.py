@@ -5,10 +5,16 @@ from termcolor import colored, cprint
 from franz.openrdf.sail.allegrographserver import RepositoryConnection
 
 from classificacao import conexao
+from classificacao.fluxo import classificar_em_fluxo, classificar_lotes_em_fluxo
+from classificacao.paginacao import Retomada
+from classificacao.impressoes import RegistroImpressoes, versao_arquivos
 from rede_neural import carregar_modelo, carregar_vectorizer, classificar
 
 colorama.init()
 
+# quantidade de produções classificadas e armazenadas de cada vez
+TAMANHO_LOTE_PADRAO = 10000
+
 
 def cinput(texto, cor):
     print(colored(texto, cor), end='')
@@ -28,27 +34,55 @@ if __name__ == "__main__":
         print(colored('Arquivo não encontrado. Abortando', 'red'))
         raise FileNotFoundError
 
+    r = cinput(f'Digite o tamanho de cada lote [{TAMANHO_LOTE_PADRAO}]: ', 'blue')
+    tamanho_lote = int(r) if r.strip() else TAMANHO_LOTE_PADRAO
+
+    por_repositorio = cinput('Coletar de cada repositório em paralelo, sem federação? [s/N] ',
+                             'blue').strip().lower() == 's'
+
+    # paginação das queries (somente na coleta pela federação)
+    retomada = None
+    if not por_repositorio:
+        r = cinput('Digite quantas páginas requisitar ao mesmo tempo, ou [ENTER] para não paginar as queries: ',
+                   'blue')
+        paginas_paralelas = int(r) if r.strip() else 0
+        if paginas_paralelas > 0:
+            r = cinput('Digite o arquivo de retomada [retomada.json]: ', 'blue')
+            retomada = Retomada(r.strip() or 'retomada.json')
+
+    # modo incremental
+    registro = None
+    r = cinput('Digite o arquivo de impressões para o modo incremental, ou [ENTER] para classificar tudo: ', 'blue')
+    if r.strip():
+        versao = versao_arquivos(path_para_modelo, path_para_vectorizer)
+        registro = RegistroImpressoes(r.strip(), versao)
+        if registro.reconstrucao:
+            cprint('Modelo diferente da última execução, todas as produções serão classificadas', 'yellow')
+        elif cinput(f'{len(registro)} produções ja classificadas. Forçar reclassificação completa? [s/N] ',
+                    'blue').strip().lower() == 's':
+            registro.limpar(versao)
+
+    # sem substituir, uma produção classificada novamente fica com mais de um valor. No modo incremental,
+    # todas as produções classificadas ja tinham um valor (alteradas ou reclassificadas), então sempre substitui
+    if registro is not None:
+        substituir = True
+    else:
+        substituir = cinput('Substituir os valores ja armazenados de cada produção? [S/n] ',
+                            'blue').strip().lower() != 'n'
+
     conexao.checa_variavel_ambiente()
     cprint('Pré configuração finalizada\n', 'blue')
 
     # conectando com o banco
-    repo: RepositoryConnection = conexao.conectar()
-
-    # carregando producoes
-    cprint('Carregando todas as produções', 'blue')
-    dicionario_completo = conexao.obter_dicionario_completo(repo)
-    cprint(f"Finalizado [{len(dicionario_completo)} produções]")
-
-    # fazendo a predição
-    cprint('Executando o modelo de rede neural sobre as produções', 'blue')
-    t = time()
-    dicionario_final = classificar(
-        model=carregar_modelo(path_para_modelo),
-        vec=carregar_vectorizer(path_para_vectorizer),
-        dados=dicionario_completo
-    )
-
-    cprint(f'Finalizado [{time() - t} s]', 'blue')
+    conexoes = []
+    if por_repositorio:
+        conexoes = conexao.conectar_repositorios()
+        if not conexoes:
+            print(colored('Nenhum repositório informado. Abortando', 'red'))
+            exit(-1)
+        repo: RepositoryConnection = conexoes[0][1]
+    else:
+        repo: RepositoryConnection = conexao.conectar()
 
     # fazendo a segunda conexão
     r = cinput('Digite o nome do repositorio para armazenar os resultados: ', 'cyan')
@@ -58,14 +92,86 @@ if __name__ == "__main__":
     )
     cprint(f'Conectado com sucesso ao repositório [size: {repo2.size()}]', 'blue')
 
-    # salvando
-    cprint(f'Executando as inserções', 'blue')
-    conexao.guardar_dicionario(
-        repo=repo2,
-        dicionario=dicionario_final,
-        cad_puc_namespace=conexao.obter_cad_puc_namespace(repo)
-    )
+    modelo = carregar_modelo(path_para_modelo)
+    vectorizer = carregar_vectorizer(path_para_vectorizer)
+    cad_puc_namespace = conexao.obter_cad_puc_namespace(repo)
+
+    # coletando, classificando e salvando as produções, lote a lote
+    lotes_incompletos = []
+
+    def guardar(resultados) -> bool:
+        armazenadas = conexao.guardar_dicionario(
+            repo=repo2,
+            dicionario=resultados,
+            cad_puc_namespace=cad_puc_namespace,
+            substituir=substituir
+        )
+        # um bloco desfeito deve ser classificado de novo na próxima execução: a página não é marcada na
+        # retomada, e as produções não são confirmadas no registro
+        completo = armazenadas == len(resultados)
+        if registro is not None and completo:
+            registro.confirmar(resultados)
+        if not completo:
+            lotes_incompletos.append(len(resultados) - armazenadas)
+        return completo
+
+    def classificar_lote(dados):
+        return classificar(model=modelo, vec=vectorizer, dados=dados)
+
+    if registro is not None:
+        cprint('Classificando e armazenando somente as produções novas ou alteradas', 'blue')
+    else:
+        cprint('Classificando e armazenando todas as produções', 'blue')
+
+    t = time()
+    if por_repositorio:
+        # as queries de cada repositório são executadas em paralelo, e os resultados são classificados
+        # conforme chegam
+        pares = conexao.iterar_producoes_paralelo(conexoes)
+        if registro is not None:
+            pares = registro.filtrar(pares)
+
+        quantidade = classificar_em_fluxo(
+            pares=pares,
+            classificar_lote=classificar_lote,
+            guardar=guardar,
+            tamanho_lote=tamanho_lote
+        )
+    elif retomada is not None:
+        # cada página é um lote, e é marcada na retomada depois de armazenada
+        lotes = conexao.iterar_producoes_paginado(repo, tamanho_lote, paginas_paralelas, retomada)
+        if registro is not None:
+            lotes = ((marca, list(registro.filtrar(pares))) for marca, pares in lotes)
+
+        quantidade = classificar_lotes_em_fluxo(
+            lotes=lotes,
+            classificar_lote=classificar_lote,
+            guardar=guardar,
+            ao_guardar=lambda marca: retomada.marcar(*marca)
+        )
+        if lotes_incompletos:
+            cprint(f'{len(lotes_incompletos)} lotes não foram armazenados por completo. Execute novamente com o '
+                   f'mesmo arquivo de retomada', 'yellow')
+        else:
+            retomada.concluir()
+    else:
+        pares = conexao.iterar_producoes(repo)
+        if registro is not None:
+            pares = registro.filtrar(pares)
+
+        quantidade = classificar_em_fluxo(
+            pares=pares,
+            classificar_lote=classificar_lote,
+            guardar=guardar,
+            tamanho_lote=tamanho_lote
+        )
+
+    cprint(f'Finalizado [{quantidade} produções, {time() - t} s]', 'blue')
     cprint('Finalizando', 'blue')
 
+    for _, r in conexoes[1:]:
+        r.close()
     repo.close()
     repo2.close()
+    if registro is not None:
+        registro.fechar()
@@ -1,4 +1,8 @@
+from time import perf_counter
+inicio = perf_counter()
+
 import argparse
+import math
 from os import path
 from termcolor import colored
 import colorama
@@ -12,9 +16,70 @@ parser = argparse.ArgumentParser(description=description)
 parser.add_argument('modelo', metavar='MODELO.h', type=str, help="path/para/modelo.h")
 parser.add_argument('vectorizer', metavar='VECTORIZER.pkl', type=str, help='path/para/vectorizer.pkl')
 parser.add_argument('porta', metavar='PORTA', type=int, nargs='?', help='porta do servidor. Padrão: 9999', default=9999)
+parser.add_argument('--lote-max', type=int, default=256,
+                    help='máximo de produções classificadas juntas em um lote. 0 desativa o agrupamento. Padrão: 256')
+parser.add_argument('--espera-max', type=float, default=5.0,
+                    help='tempo máximo (ms) esperando por mais requisições para o lote. Padrão: 5')
+parser.add_argument('--cache', type=int, default=0,
+                    help='quantidade máxima de resultados guardados em cache. 0 desativa o cache. Padrão: 0')
+parser.add_argument('--cache-ttl', type=float, default=None,
+                    help='validade (s) de cada resultado no cache. Padrão: sem validade')
+parser.add_argument('--modo', choices=['tcp', 'async'], default='tcp',
+                    help="'tcp': uma requisição por conexão. 'async': conexões persistentes com asyncio. Padrão: tcp")
+parser.add_argument('--enquadramento', choices=['linha', 'tamanho'], default='linha',
+                    help="no modo async, separa as requisições por '\\n' ('linha') ou por um prefixo de 4 bytes "
+                         "com o tamanho ('tamanho'). Padrão: linha")
+parser.add_argument('--formato', choices=['json', 'msgpack', 'float32'], default='json',
+                    help="codificação das requisições e respostas TCP. 'msgpack': MessagePack nos dois sentidos. "
+                         "'float32': requisição em JSON e resposta com a quantidade (uint32) seguida dos resultados "
+                         "(float32, little endian) na ordem da requisição. Os formatos binários não funcionam com "
+                         "--enquadramento linha. Padrão: json")
+parser.add_argument('--processos', type=int, default=0,
+                    help='no modo tcp, quantidade de processos atendendo o mesmo socket. Precisa de um modelo .npz, '
+                         'cujos pesos são mapeados em memória e compartilhados. Padrão: 0 (um único processo)')
+parser.add_argument('--trabalhadores', type=int, default=8,
+                    help='no modo async, quantidade de threads executando a classificação. Padrão: 8')
+parser.add_argument('--recarregar', type=float, default=None, metavar='SEGUNDOS',
+                    help='verifica a cada SEGUNDOS se os arquivos do modelo mudaram, e os recarrega sem reiniciar o '
+                         'servidor. O sinal SIGHUP sempre pede uma recarga. Padrão: somente pelo sinal')
+parser.add_argument('--http', type=int, default=0, metavar='PORTA',
+                    help='também atende requisições HTTP/1.1 (POST /classificar) na PORTA, com conexões '
+                         'persistentes e gzip. Padrão: 0 (desativado)')
+parser.add_argument('--max-producoes', type=int, default=0, metavar='N',
+                    help='máximo de produções sendo classificadas ao mesmo tempo (somando as requisições). Acima '
+                         'disso, as requisições esperam na fila; requisições maiores que N são rejeitadas. '
+                         'Padrão: 0 (sem limite)')
+parser.add_argument('--max-fila', type=int, default=64, metavar='N',
+                    help='com --max-producoes, máximo de requisições esperando. Com a fila cheia, as novas '
+                         'requisições são rejeitadas imediatamente. Padrão: 64')
+parser.add_argument('--prazo', type=float, default=None, metavar='MS',
+                    help='prazo (ms) de cada requisição, desde a chegada. Se acabar antes da inferência, a '
+                         'requisição é descartada. Padrão: sem prazo')
+parser.add_argument('--tempo-limite', type=float, default=None, metavar='SEGUNDOS',
+                    help='tempo máximo esperando o cliente em cada leitura ou escrita no socket. Padrão: sem limite '
+                         '(60 s no HTTP)')
+
+parser.add_argument('--metricas', type=int, default=0, metavar='PORTA',
+                    help='expõe as métricas (formato Prometheus) em http://127.0.0.1:PORTA/metrics. '
+                         'Padrão: 0 (desativado)')
+parser.add_argument('--log', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'], default='INFO',
+                    help='nível das mensagens de cada requisição. Padrão: INFO')
+parser.add_argument('--log-limite', type=int, default=10,
+                    help='máximo de mensagens por segundo; as demais são omitidas. 0 para não limitar. Padrão: 10')
 
 args = parser.parse_args()
 
+if args.formato != 'json' and args.modo == 'async' and args.enquadramento == 'linha':
+    parser.error(f"o formato '{args.formato}' é binário, use --enquadramento tamanho")
+
+if args.processos < 0:
+    parser.error("--processos não pode ser negativo")
+if args.processos > 0 and args.modo == 'async':
+    parser.error("--processos só existe no modo tcp; no modo async, use --trabalhadores")
+
+if args.prazo is not None and (not math.isfinite(args.prazo) or args.prazo < 0):
+    parser.error("--prazo deve ser um número (ms) finito e não negativo")
+
 # verificando os arquivos
 path_modelo = args.modelo
 path_vec = args.vectorizer
@@ -27,20 +92,107 @@ if not path.isfile(path_vec):
     print(colored("Arquivo não encontrado: ", 'red'), path_vec)
     exit(-1)
 
-from server import configurar, server_loop
+# tempo de cada etapa da inicialização, para acompanhar regressões
+etapas = []
+marca = inicio
+
+
+def marcar(etapa: str):
+    """Registra o tempo gasto desde a etapa anterior"""
+    global marca
+    agora = perf_counter()
+    etapas.append((etapa, agora - marca))
+    marca = agora
+
+
+# TensorFlow, Keras e sklearn só são importados ao carregar um modelo ou vetorizador que precise deles
+from server import configurar, server_loop, trocar_modelos, print_blue
 from rede_neural import carregar_modelo, carregar_vectorizer
+from classificacao.impressoes import versao_arquivos
+from recarga import Recarregador, validar
+from instrumentacao import configurar_log, servir_metricas
+marcar("importações")
+
+configurar_log(args.log, args.log_limite)
 
 
 # configurando os modelos
 try:
+    modelo = carregar_modelo(path_modelo, mapear_memoria=args.processos > 0)
+    marcar("carregando modelo")
+
+    vectorizer = carregar_vectorizer(path_vec)
+    marcar("carregando vetorizador")
+
+    # a primeira predição é lenta (o Keras monta o grafo), então é feita antes de abrir o socket
+    validar(modelo, vectorizer)
+    marcar("aquecimento")
+
+    versao = versao_arquivos(path_modelo, path_vec)
     configurar(
-        m=carregar_modelo(path_modelo),
-        v=carregar_vectorizer(path_vec),
-        porta_server=args.porta
+        m=modelo,
+        v=vectorizer,
+        porta_server=args.porta,
+        lote_max=args.lote_max,
+        espera_max_ms=args.espera_max,
+        tamanho_cache=args.cache,
+        ttl_cache=args.cache_ttl,
+        versao=versao,
+        nome_formato=args.formato,
+        max_producoes=args.max_producoes,
+        max_fila=args.max_fila,
+        prazo_requisicao_ms=args.prazo,
+        tempo_limite_socket=args.tempo_limite
     )
 except Exception as e:
     print(colored(f"Erro configurando servidor: {e}"), 'red')
     exit(-1)
 
+marcar("configuração")
+
+print_blue("Inicialização:")
+for etapa, segundos in etapas:
+    print(colored(f"  {etapa:<24}", 'blue'), colored(f"{segundos * 1000:8.1f} ms", 'yellow'))
+print(colored(f"  {'total':<24}", 'blue'), colored(f"{(marca - inicio) * 1000:8.1f} ms", 'yellow'))
+
+# recarga do modelo sem reiniciar o servidor
+recarregador = Recarregador(
+    path_modelo,
+    path_vec,
+    ao_carregar=trocar_modelos,
+    versao=versao,
+    mapear_memoria=args.processos > 0,
+    intervalo=args.recarregar
+)
+
+# métricas
+if args.metricas > 0:
+    if args.processos > 0:
+        print(colored("Métricas não disponíveis com --processos, pois cada processo tem as suas", 'red'))
+    else:
+        servir_metricas(args.metricas)
+        print(colored(f"Métricas em http://127.0.0.1:{args.metricas}/metrics", 'blue'))
+
+# interface HTTP, no mesmo processo (ou nos mesmos processos) do servidor TCP
+http = None
+if args.http > 0:
+    from server_http import criar_servidor_http, iniciar_em_segundo_plano
+    http = criar_servidor_http(args.http)
+    if args.processos > 0 and args.modo == 'tcp':
+        print_blue(f"Servidor HTTP ouvindo em {http.server_address}")
+    else:
+        iniciar_em_segundo_plano(http)
+
 # iniciando loop
-server_loop()
+if args.modo == 'async':
+    from server_async import server_loop_async
+    recarregador.instalar_sinal()
+    recarregador.iniciar()
+    server_loop_async(enquadramento=args.enquadramento, trabalhadores=args.trabalhadores)
+elif args.processos > 0:
+    from server_prefork import server_loop_prefork
+    server_loop_prefork(processos=args.processos, recarregador=recarregador, http=http)
+else:
+    recarregador.instalar_sinal()
+    recarregador.iniciar()
+    server_loop()
@@ -0,0 +1,182 @@
+import os
+import signal
+from threading import Event, Lock, Thread
+from time import monotonic, perf_counter, sleep
+from typing import Callable, Tuple
+
+import numpy as np
+
+from rede_neural import ModeloNumpy, carregar_modelo, carregar_vectorizer
+from rede_neural.carregamento import Modelo, Vetorizador
+from rede_neural.utilizacao import _predizer
+from classificacao.impressoes import versao_arquivos
+from server import print_blue, print_red, print_green
+
+# textos usados para aquecer e testar um modelo recém carregado
+TEXTOS_TESTE = [
+    "Impactos ambientais do desmatamento na bacia amazônica",
+    "Análise de algoritmos de ordenação em memória externa",
+    "Environmental assessment of water quality in urban rivers",
+    "",
+]
+
+
+def _dimensao_entrada(model: Modelo) -> int | None:
+    if isinstance(model, ModeloNumpy):
+        return model.input_dim
+    forma = getattr(model, 'input_shape', None)
+    return forma[-1] if forma else None
+
+
+def validar(model: Modelo, vec: Vetorizador):
+    """
+    Verifica se o modelo e o vetorizador funcionam juntos, executando uma predição de teste.
+    A predição também aquece o modelo, para que a primeira requisição não pague esse custo.
+
+    :raise ValueError: se o par não for compatível, ou se a predição não estiver entre 0 e 1
+    """
+    dimensao = _dimensao_entrada(model)
+    colunas = vec.n_features if hasattr(vec, 'n_features') else len(vec.vocabulary_)
+    if dimensao is not None and dimensao != colunas:
+        raise ValueError(f"O modelo espera {dimensao} entradas, mas o vetorizador gera {colunas}")
+
+    for textos in (TEXTOS_TESTE[:1], TEXTOS_TESTE):
+        res = _predizer(model, vec, textos)
+        if res.shape != (len(textos),) or not np.all((res >= 0) & (res <= 1)):
+            raise ValueError(f"Predição de teste inválida: {res!r}")
+
+
+def carregar_par(path_modelo: str, path_vec: str, mapear_memoria: bool = False) -> Tuple[Modelo, Vetorizador, str]:
+    """
+    Carrega e valida (com `validar`) o modelo e o vetorizador.
+
+    :return: o modelo, o vetorizador e a versão dos arquivos
+    """
+    versao = versao_arquivos(path_modelo, path_vec)
+    model = carregar_modelo(path_modelo, mapear_memoria=mapear_memoria)
+    vec = carregar_vectorizer(path_vec)
+    validar(model, vec)
+    return model, vec, versao
+
+
+class Recarregador:
+    """
+    Recarrega o modelo e o vetorizador sem reiniciar o servidor.
+
+    Uma thread espera por um pedido de recarga (`solicitar`, chamado por exemplo pelo sinal SIGHUP), ou,
+    se `intervalo` for definido, verifica a cada `intervalo` segundos se os arquivos mudaram. O novo par
+    é carregado e validado nessa thread, enquanto o servidor continua usando o par antigo, e somente se
+    estiver tudo certo é entregue para `ao_carregar(modelo, vetorizador, versao)`, que faz a troca.
+
+    Se a carga falhar, o par antigo continua sendo usado.
+
+    Sem a thread, `verificar` faz o mesmo trabalho, chamado periodicamente por quem não pode ter outras
+    threads (o processo pai de `server_prefork`, que cria processos com `os.fork`).
+    """
+
+    def __init__(
+            self,
+            path_modelo: str,
+            path_vec: str,
+            ao_carregar: Callable[[Modelo, Vetorizador, str], None],
+            versao: str = '',
+            mapear_memoria: bool = False,
+            intervalo: float | None = None
+    ):
+        self.path_modelo = path_modelo
+        self.path_vec = path_vec
+        self.ao_carregar = ao_carregar
+        self.versao = versao
+        self.mapear_memoria = mapear_memoria
+        self.intervalo = intervalo
+
+        self._pedido = Event()
+        self._lock = Lock()
+        self._assinatura = self._assinar()
+        self._pendente = None           # assinatura nova, esperando os arquivos pararem de mudar
+        self._proxima_verificacao = 0.0
+
+    def _assinar(self) -> Tuple | None:
+        """Data de modificação e tamanho dos arquivos, para detectar mudanças sem lê-los"""
+        try:
+            return tuple((s.st_mtime_ns, s.st_size) for s in map(os.stat, (self.path_modelo, self.path_vec)))
+        except FileNotFoundError:   # sendo substituído
+            return None
+
+    def iniciar(self):
+        Thread(target=self._loop, name='recarregador', daemon=True).start()
+
+    def solicitar(self):
+        """Pede uma recarga. Pode ser chamado de um tratador de sinal"""
+        self._pedido.set()
+
+    def instalar_sinal(self):
+        """Faz o sinal SIGHUP pedir uma recarga (somente em linux e mac)"""
+        if hasattr(signal, 'SIGHUP'):
+            signal.signal(signal.SIGHUP, lambda *_: self.solicitar())
+
+    def _arquivos_mudaram(self) -> bool:
+        assinatura = self._assinar()
+        if assinatura is None or assinatura == self._assinatura:
+            self._pendente = None
+            return False
+        if assinatura != self._pendente:      # talvez ainda esteja sendo escrito, confirma na próxima vez
+            self._pendente = assinatura
+            return False
+        return True
+
+    def _recarregar_agora(self) -> bool:
+        self._pendente = None
+        self._assinatura = self._assinar()
+        return self.recarregar()
+
+    def _loop(self):
+        while True:
+            if self._pedido.wait(timeout=self.intervalo):
+                self._pedido.clear()
+            elif not self._arquivos_mudaram():
+                continue
+            self._recarregar_agora()
+
+    def verificar(self, espera: float) -> bool:
+        """
+        Igual a uma volta da thread de `iniciar`, nesta thread: espera `espera` segundos, e recarrega se houve
+        um pedido, ou se os arquivos mudaram (verificados no máximo a cada `intervalo` segundos).
+
+        :return: verdadeiro se o par foi trocado
+        """
+        sleep(espera)       # sem esperar pelo `Event`, que o tratador do sinal também usa
+        if self._pedido.is_set():
+            self._pedido.clear()
+        elif self.intervalo is None or monotonic() < self._proxima_verificacao:
+            return False
+        else:
+            self._proxima_verificacao = monotonic() + self.intervalo
+            if not self._arquivos_mudaram():
+                return False
+        return self._recarregar_agora()
+
+    def recarregar(self) -> bool:
+        """
+        Carrega, valida e entrega o novo par para `ao_carregar`.
+
+        :return: verdadeiro se o par foi trocado
+        """
+        with self._lock:
+            print_blue("Recarregando modelo e vetorizador")
+            tempo_inicial = perf_counter()
+            try:
+                model, vec, versao = carregar_par(self.path_modelo, self.path_vec, self.mapear_memoria)
+            except Exception as e:
+                print_red(f"Erro recarregando, mantendo o modelo atual: {e!r}")
+                return False
+
+            if versao == self.versao:
+                print_blue("Arquivos não mudaram, mantendo o modelo atual")
+                return False
+
+            self.ao_carregar(model, vec, versao)
+            self.versao = versao
+            print_green(f"Modelo recarregado em {(perf_counter() - tempo_inicial) * 1000:.0f} ms "
+                        f"(versão {versao[:12]})")
+            return True
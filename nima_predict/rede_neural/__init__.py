@@ -1,5 +1,15 @@
 from .treino import main as treinar
+from .busca import main as buscar
+from .treino_incremental import main as treinar_em_blocos
 from .utilizacao import classificar
 from .carregamento import carregar_modelo, carregar_vectorizer
+from .exportacao import main as exportar, exportar_numpy, exportar_vetorizador
+from .compactacao import main as compactar
+from .motor_numpy import ModeloNumpy
+from .vetorizador_rapido import VetorizadorHash, VetorizadorRapido
 
-__all__ = ["treinar", "classificar", "carregar_modelo", "carregar_vectorizer"]
+__all__ = [
+    "treinar", "buscar", "treinar_em_blocos", "classificar", "carregar_modelo", "carregar_vectorizer",
+    "exportar", "exportar_numpy", "exportar_vetorizador", "compactar", "ModeloNumpy", "VetorizadorRapido",
+    "VetorizadorHash"
+]
@@ -0,0 +1,161 @@
+import hashlib
+import os
+import tempfile
+from typing import Iterable, Set
+
+import numpy as np
+
+from .vetorizador_rapido import VetorizadorRapido
+
+# muda sempre que o formato ou o processamento dos artefatos mudar, invalidando o cache anterior
+VERSAO_ARTEFATOS = 1
+
+# arquivo com a chave do último conjunto de stopwords gerado, usado quando o corpus do nltk não está disponível
+_STOPWORDS_ATUAL = 'stopwords-atual.txt'
+
+
+def diretorio_cache() -> str:
+    """Diretório dos artefatos: a variável de ambiente `NIMA_CACHE`, ou `~/.cache/nima_predict`"""
+    diretorio = os.environ.get('NIMA_CACHE') or os.path.join(os.path.expanduser('~'), '.cache', 'nima_predict')
+    os.makedirs(diretorio, exist_ok=True)
+    return diretorio
+
+
+def _chave(*partes: Iterable[bytes]) -> str:
+    """Hash (sha256, abreviado) do conteúdo das `partes` e da versão dos artefatos"""
+    h = hashlib.sha256(f'versao={VERSAO_ARTEFATOS}'.encode('utf-8'))
+    for parte in partes:
+        for bloco in parte:
+            h.update(len(bloco).to_bytes(8, 'little'))
+            h.update(bloco)
+    return h.hexdigest()[:24]
+
+
+def _gravar_atomico(filename: str, salvar):
+    """Chama `salvar(arquivo_temporario)` e troca o arquivo de uma vez, para nunca deixar um artefato pela metade"""
+    descritor, temporario = tempfile.mkstemp(prefix='.tmp-', suffix='.npz', dir=os.path.dirname(filename))
+    os.close(descritor)
+    try:
+        salvar(temporario)
+        os.replace(temporario, filename)
+    finally:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+
+
+def _ler_corpus_stopwords() -> dict | None:
+    """
+    Os arquivos de stopwords (inglês e português) do nltk, se ja estiverem instalados. Nunca acessa a rede.
+
+    :return: { 'english': bytes, 'portuguese': bytes }, ou None
+    """
+    import nltk
+
+    try:
+        diretorio = nltk.data.find('corpora/stopwords')
+    except LookupError:
+        return None
+
+    conteudo = {}
+    for idioma in ('english', 'portuguese'):
+        with open(os.path.join(str(diretorio), idioma), 'rb') as f:
+            conteudo[idioma] = f.read()
+    return conteudo
+
+
+def _processar_stopwords(conteudo: dict) -> Set[str]:
+    """Junta as stopwords em inglês e as em português, sem acentos"""
+    from unidecode import unidecode
+
+    palavras_ingles = set(conteudo['english'].decode('utf-8').split())
+    palavras_portugues = set(conteudo['portuguese'].decode('utf-8').split())
+
+    palavras_portugues_niveladas = {unidecode(x) for x in palavras_portugues}
+
+    return palavras_ingles.union(palavras_portugues_niveladas)
+
+
+def obter_stopwords(baixar: bool = True) -> Set[str]:
+    """
+    O conjunto de stopwords usado no treino, guardado em cache em `diretorio_cache()`.
+
+    Se o corpus do nltk estiver instalado, a chave é o hash dos seus arquivos, e o conjunto só é processado
+    novamente quando eles mudam. Sem o corpus, é usado o último conjunto gerado, então basta copiar o
+    diretório do cache para as máquinas sem acesso à rede. Somente se nenhum dos dois existir, e `baixar`
+    for verdadeiro, o corpus é baixado pelo nltk.
+
+    :raise RuntimeError: se não houver nem o corpus, nem o cache, e não for possível baixar o corpus
+    """
+    diretorio = diretorio_cache()
+    conteudo = _ler_corpus_stopwords()
+
+    if conteudo is None:
+        atual = os.path.join(diretorio, _STOPWORDS_ATUAL)
+        if os.path.isfile(atual):
+            with open(atual, 'r', encoding='utf-8') as f:
+                filename = os.path.join(diretorio, f'stopwords-{f.read().strip()}.npz')
+            if os.path.isfile(filename):
+                with np.load(filename, allow_pickle=False) as arquivo:
+                    return {str(p) for p in arquivo['palavras']}
+
+        if baixar:
+            import nltk
+            nltk.download('stopwords', quiet=True)
+            conteudo = _ler_corpus_stopwords()
+        if conteudo is None:
+            raise RuntimeError(f"Stopwords indisponíveis: instale o corpus 'stopwords' do nltk, ou copie o cache "
+                               f"para {diretorio}")
+
+    chave = _chave(conteudo[idioma] for idioma in sorted(conteudo))
+    filename = os.path.join(diretorio, f'stopwords-{chave}.npz')
+    if os.path.isfile(filename):
+        with np.load(filename, allow_pickle=False) as arquivo:
+            palavras = {str(p) for p in arquivo['palavras']}
+    else:
+        palavras = _processar_stopwords(conteudo)
+        _gravar_atomico(filename, lambda f: np.savez_compressed(f, palavras=np.array(sorted(palavras))))
+
+    with open(os.path.join(diretorio, _STOPWORDS_ATUAL), 'w', encoding='utf-8') as f:
+        f.write(chave)
+    return palavras
+
+
+def chave_vocabulario(vectorizer, sentencas: Iterable[str]) -> str:
+    """Hash das sentenças de treino e da configuração do `CountVectorizer` (inclusive das stopwords)"""
+    parametros = vectorizer.get_params()
+    stopwords = parametros.pop('stop_words')
+    if isinstance(stopwords, (list, set, frozenset, tuple)):
+        stopwords = sorted(stopwords)
+
+    configuracao = repr(sorted(parametros.items())) + repr(stopwords)
+    return _chave(
+        [configuracao.encode('utf-8')],
+        (str(s).encode('utf-8') for s in sentencas)
+    )
+
+
+def caminho_vocabulario(chave: str) -> str:
+    return os.path.join(diretorio_cache(), f'vocabulario-{chave}.npz')
+
+
+def ajustar_vetorizador(vectorizer, sentencas) -> str:
+    """
+    Igual a `vectorizer.fit(sentencas)`, porém o vocabulário é guardado em cache (no formato do
+    `VetorizadorRapido`), e reutilizado se as sentenças e a configuração forem as mesmas.
+
+    :return: o arquivo do vocabulário no cache, que também pode ser usado diretamente como `VetorizadorRapido`
+    """
+    sentencas = list(sentencas)
+    chave = chave_vocabulario(vectorizer, sentencas)
+    filename = caminho_vocabulario(chave)
+
+    if os.path.isfile(filename):
+        vectorizer.vocabulary_ = dict(VetorizadorRapido.carregar(filename).vocabulario)
+        vectorizer.fixed_vocabulary_ = False
+        print(f"  Vocabulário reutilizado do cache ({len(vectorizer.vocabulary_)} palavras)")
+        return filename
+
+    vectorizer.fit(sentencas)
+    rapido = VetorizadorRapido.de_count_vectorizer(vectorizer)
+    _gravar_atomico(filename, rapido.salvar)
+    return filename
@@ -0,0 +1,292 @@
+import csv
+import itertools
+import os
+import random
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from statistics import mean, median, pstdev
+from time import perf_counter
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+# opções do `CountVectorizer` variadas na busca. As demais são as mesmas de `treino._bag_of_words`
+OPCOES_VETORIZADOR = ('stopwords', 'binary', 'min_df')
+
+# espaço de busca padrão. Cada candidato é uma combinação de um valor de cada chave
+ESPACO_PADRAO: Dict[str, list] = {
+    'camadas': [(50, 70, 20), (50,), (100, 50), (20,)],
+    'epocas': [10, 30],
+    'batch_size': [50, 200],
+    'stopwords': [True],
+    'binary': [False, True],
+    'min_df': [1, 2],
+}
+
+# matrizes ja carregadas por cada processo do pool, para não ler o mesmo arquivo a cada tentativa
+_matrizes_carregadas: Dict[str, Tuple] = {}
+
+
+def gerar_candidatos(espaco: Dict[str, list], quantidade: int | None = None, semente: int = 123) -> List[Dict]:
+    """
+    Todas as combinações do `espaco` (busca em grade) ou, se `quantidade` for definida, uma amostra
+    aleatória de até `quantidade` combinações distintas.
+    """
+    chaves = list(espaco)
+    candidatos = [dict(zip(chaves, valores)) for valores in itertools.product(*(espaco[c] for c in chaves))]
+    if quantidade is not None and quantidade < len(candidatos):
+        candidatos = random.Random(semente).sample(candidatos, quantidade)
+    return candidatos
+
+
+def _configuracao_vetorizador(candidato: Dict) -> Tuple:
+    """Identifica as opções do vetorizador de um candidato. Candidatos com a mesma configuração usam as mesmas matrizes"""
+    return tuple((opcao, candidato[opcao]) for opcao in OPCOES_VETORIZADOR if opcao in candidato)
+
+
+def _criar_vetorizador(configuracao: Tuple, stopwords: List[str] | None):
+    from sklearn.feature_extraction.text import CountVectorizer
+
+    opcoes = dict(configuracao)
+    return CountVectorizer(
+        strip_accents='unicode',
+        lowercase=True,
+        stop_words=stopwords if opcoes.get('stopwords', True) else None,
+        binary=opcoes.get('binary', False),
+        min_df=opcoes.get('min_df', 1)
+    )
+
+
+def vetorizar_dobras(
+        sentencas,
+        res,
+        configuracoes: Sequence[Tuple],
+        dobras: int,
+        diretorio: str,
+        semente: int = 123
+) -> Dict[Tuple, List[str]]:
+    """
+    Para cada configuração do vetorizador e cada dobra da validação cruzada (estratificada), treina o
+    vetorizador somente na parte de treino da dobra, e salva as matrizes em `diretorio`.
+
+    Assim, cada matriz é calculada uma única vez, e compartilhada por todos os candidatos com a mesma
+    configuração do vetorizador.
+
+    As matrizes (e o tempo de vetorização) vêm do `VetorizadorRapido`, que é o usado na classificação.
+    Os vocabulários das dobras não são guardados no cache de `artefatos.ajustar_vetorizador`, pois só
+    servem para esta busca.
+
+    :return: para cada configuração, o arquivo de cada dobra (com as matrizes, os resultados e o tempo
+        em ms para vetorizar 1000 textos)
+    """
+    from scipy import sparse
+    from sklearn.model_selection import StratifiedKFold
+    from .treino import _coletar_stopwords
+    from .vetorizador_rapido import VetorizadorRapido
+
+    sentencas = np.asarray(sentencas)
+    res = np.asarray(res)
+    stopwords = sorted(_coletar_stopwords()) if any(dict(c).get('stopwords', True) for c in configuracoes) else None
+    divisoes = list(StratifiedKFold(n_splits=dobras, shuffle=True, random_state=semente).split(sentencas, res))
+
+    arquivos = {}
+    for n, configuracao in enumerate(configuracoes):
+        arquivos[configuracao] = []
+        for d, (treino, validacao) in enumerate(divisoes):
+            vec = VetorizadorRapido.de_count_vectorizer(
+                _criar_vetorizador(configuracao, stopwords).fit(sentencas[treino])
+            )
+
+            inicio = perf_counter()
+            x_validacao = vec.transform(sentencas[validacao])
+            ms_por_mil = (perf_counter() - inicio) * 1000 * 1000 / max(len(validacao), 1)
+
+            arquivo = os.path.join(diretorio, f'vetorizador{n}-dobra{d}.npz')
+            np.savez(
+                arquivo,
+                res_treino=res[treino],
+                res_validacao=res[validacao],
+                vetorizar_ms=np.array(ms_por_mil)
+            )
+            sparse.save_npz(arquivo + '.treino.npz', vec.transform(sentencas[treino]))
+            sparse.save_npz(arquivo + '.validacao.npz', x_validacao)
+            arquivos[configuracao].append(arquivo)
+
+    return arquivos
+
+
+def _carregar_dobra(arquivo: str) -> Tuple:
+    if arquivo not in _matrizes_carregadas:
+        from scipy import sparse
+
+        with np.load(arquivo) as dados:
+            _matrizes_carregadas[arquivo] = (
+                sparse.load_npz(arquivo + '.treino.npz'),
+                sparse.load_npz(arquivo + '.validacao.npz'),
+                dados['res_treino'],
+                dados['res_validacao'],
+                float(dados['vetorizar_ms'])
+            )
+    return _matrizes_carregadas[arquivo]
+
+
+def _iniciar_processo(threads: int):
+    """Limita as threads do TensorFlow em cada processo, para que os processos não disputem os mesmos núcleos"""
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(threads)
+
+
+def _executar_tentativa(tarefa: Tuple[int, Dict, str]) -> Dict:
+    """Treina um candidato em uma dobra, e mede a acurácia e a latência de inferência na validação"""
+    from .exportacao import extrair_pesos
+    from .treino import _gerar_rede_neural
+
+    indice, candidato, arquivo = tarefa
+    x_treino, x_validacao, res_treino, res_validacao, vetorizar_ms = _carregar_dobra(arquivo)
+
+    inicio = perf_counter()
+    model = _gerar_rede_neural(
+        x_treino, x_validacao, res_treino, res_validacao,
+        camadas=candidato['camadas'],
+        epocas=candidato['epocas'],
+        batch_size=candidato['batch_size'],
+        relatorio=False
+    )
+    tempo_treino = perf_counter() - inicio
+
+    # a latência é medida no motor usado pelo servidor, o modelo exportado para NumPy
+    modelo_numpy = extrair_pesos(model)
+    resultados = np.ravel(modelo_numpy.predict(x_validacao))
+    medidas = []
+    for _ in range(5):
+        inicio = perf_counter()
+        modelo_numpy.predict(x_validacao)
+        medidas.append(perf_counter() - inicio)
+
+    return {
+        'indice': indice,
+        'acuracia': float(np.mean((resultados > 0.5) == np.asarray(res_validacao).astype(bool))),
+        'treino_s': tempo_treino,
+        'inferir_ms': median(medidas) * 1000 * 1000 / max(x_validacao.shape[0], 1),
+        'vetorizar_ms': vetorizar_ms,
+        'vocabulario': x_treino.shape[1],
+    }
+
+
+def buscar_hiperparametros(
+        sentencas,
+        res,
+        candidatos: List[Dict],
+        dobras: int = 5,
+        processos: int | None = None,
+        threads_por_processo: int = 1
+) -> List[Dict]:
+    """
+    Avalia cada candidato com validação cruzada em `dobras` dobras. Cada tentativa (candidato e dobra)
+    é treinada em um processo do pool, com as matrizes de `vetorizar_dobras`.
+
+    :return: uma linha por candidato, com a média e o desvio da acurácia, o tempo de treino, e as latências
+        (ms para 1000 textos) da vetorização e da inferência, ordenadas pela acurácia
+    """
+    configuracoes = list(dict.fromkeys(_configuracao_vetorizador(c) for c in candidatos))
+
+    with tempfile.TemporaryDirectory(prefix='busca-') as diretorio:
+        print(f"  Vetorizando {len(configuracoes)} configurações em {dobras} dobras")
+        arquivos = vetorizar_dobras(sentencas, res, configuracoes, dobras, diretorio)
+
+        tarefas = [
+            (i, candidato, arquivo)
+            for i, candidato in enumerate(candidatos)
+            for arquivo in arquivos[_configuracao_vetorizador(candidato)]
+        ]
+        print(f"  Executando {len(tarefas)} treinos ({len(candidatos)} candidatos x {dobras} dobras)")
+
+        # 'spawn': cada processo importa o TensorFlow do zero, em vez de herdar o estado do processo principal
+        tentativas: Dict[int, List[Dict]] = {i: [] for i in range(len(candidatos))}
+        with ProcessPoolExecutor(
+                max_workers=processos,
+                mp_context=get_context('spawn'),
+                initializer=_iniciar_processo,
+                initargs=(threads_por_processo,)
+        ) as pool:
+            for feitas, tentativa in enumerate(pool.map(_executar_tentativa, tarefas), start=1):
+                tentativas[tentativa['indice']].append(tentativa)
+                if feitas % dobras == 0:
+                    print(f"  {feitas}/{len(tarefas)}")
+
+    linhas = []
+    for i, candidato in enumerate(candidatos):
+        acuracias = [t['acuracia'] for t in tentativas[i]]
+        linhas.append({
+            **candidato,
+            'acuracia': mean(acuracias),
+            'acuracia_desvio': pstdev(acuracias),
+            'treino_s': mean(t['treino_s'] for t in tentativas[i]),
+            'vetorizar_ms': mean(t['vetorizar_ms'] for t in tentativas[i]),
+            'inferir_ms': mean(t['inferir_ms'] for t in tentativas[i]),
+            'vocabulario': round(mean(t['vocabulario'] for t in tentativas[i])),
+        })
+
+    linhas.sort(key=lambda linha: linha['acuracia'], reverse=True)
+    return linhas
+
+
+def salvar_resultados(linhas: List[Dict], filename: str):
+    """Grava a tabela de resultados em CSV"""
+    with open(filename, 'w', newline='', encoding='utf-8') as f:
+        escritor = csv.DictWriter(f, fieldnames=list(linhas[0]))
+        escritor.writeheader()
+        for linha in linhas:
+            escritor.writerow({
+                chave: ' '.join(map(str, valor)) if isinstance(valor, tuple) else valor
+                for chave, valor in linha.items()
+            })
+
+
+def mostrar_resultados(linhas: List[Dict], quantidade: int = 10):
+    print(f"{'camadas':<14} {'épocas':>6} {'lote':>5} {'vetorizador':<38} {'acurácia':>14} {'treino s':>9} "
+          f"{'vet. ms':>8} {'inf. ms':>8}")
+    for linha in linhas[:quantidade]:
+        vetorizador = ' '.join(f'{opcao}={linha[opcao]}' for opcao in OPCOES_VETORIZADOR if opcao in linha)
+        acuracia = f"{linha['acuracia']:.4f}±{linha['acuracia_desvio']:.4f}"
+        print(f"{str(linha['camadas']):<14} {linha['epocas']:>6} {linha['batch_size']:>5} {vetorizador:<38} "
+              f"{acuracia:>14} {linha['treino_s']:>9.1f} {linha['vetorizar_ms']:>8.2f} {linha['inferir_ms']:>8.2f}")
+
+
+def main():
+    from .treino import _ler_arquivo, _preprocessamento_dados_para_sentenca, _separar_treino_teste
+
+    try:
+        print("Lendo o dataFrame:")
+        fn = input("  Digite o nome de arquivo de dados: ")
+        dataframe = _ler_arquivo(fn)
+        _preprocessamento_dados_para_sentenca(dataframe)
+
+        # o conjunto de teste de `treino.main` fica de fora da busca
+        sentencas_treino, _, res_treino, _ = _separar_treino_teste(dataframe)
+
+        dobras = input("  Quantidade de dobras da validação cruzada, ou [ENTER] para 5: ")
+        dobras = int(dobras) if dobras != '' else 5
+
+        quantidade = input("  Quantidade de candidatos aleatórios, ou [ENTER] para a grade completa: ")
+        candidatos = gerar_candidatos(ESPACO_PADRAO, int(quantidade) if quantidade != '' else None)
+
+        processos = input(f"  Quantidade de processos, ou [ENTER] para {os.cpu_count()}: ")
+        processos = int(processos) if processos != '' else None
+
+        fn_out = input("  Digite o nome do arquivo de resultados (.csv): ")
+
+        print(f"Buscando entre {len(candidatos)} candidatos")
+        linhas = buscar_hiperparametros(sentencas_treino, res_treino, candidatos, dobras, processos)
+
+        salvar_resultados(linhas, fn_out)
+        mostrar_resultados(linhas)
+        print(f"Resultados em {fn_out}")
+
+    except FileNotFoundError:
+        print("Arquivo nao encontrado. Tente novamente")
+
+    except Exception as e:
+        print("Erro: ", e)
@@ -0,0 +1,88 @@
+import hashlib
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+from typing import List, Sequence, Tuple
+
+
+def normalizar(texto: str) -> str:
+    """Remove espaços repetidos e nas pontas, que não mudam os tokens gerados pelo vetorizador"""
+    return ' '.join(texto.split())
+
+
+class CachePredicoes:
+    """
+    Cache em memória dos resultados do modelo, com remoção do menos usado recentemente (LRU)
+    e validade opcional (`ttl`, em segundos).
+
+    A chave é um hash do texto normalizado junto com a versão do modelo, então mudar a versão
+    (com `invalidar`) descarta todos os resultados anteriores.
+    """
+
+    def __init__(self, tamanho_max: int = 100_000, ttl: float | None = None, versao: str = ''):
+        self.tamanho_max = tamanho_max
+        self.ttl = ttl
+        self.versao = versao
+
+        self._dados: OrderedDict[bytes, Tuple[float, float]] = OrderedDict()   # chave -> (resultado, validade)
+        self._lock = Lock()
+
+        self.acertos = 0
+        self.falhas = 0
+        self.remocoes = 0
+
+    def __len__(self) -> int:
+        return len(self._dados)
+
+    def _chave(self, texto: str) -> bytes:
+        return hashlib.blake2b(f'{self.versao}\0{normalizar(texto)}'.encode('utf-8'), digest_size=16).digest()
+
+    def obter(self, textos: Sequence[str]) -> List[float | None]:
+        """:return: o resultado de cada texto, ou None se não estiver no cache"""
+        chaves = [self._chave(texto) for texto in textos]
+        agora = monotonic()
+        resultados: List[float | None] = []
+
+        with self._lock:
+            for chave in chaves:
+                item = self._dados.get(chave)
+                if item is not None and item[1] < agora:    # expirado
+                    del self._dados[chave]
+                    self.remocoes += 1
+                    item = None
+
+                if item is None:
+                    self.falhas += 1
+                    resultados.append(None)
+                else:
+                    self._dados.move_to_end(chave)
+                    self.acertos += 1
+                    resultados.append(item[0])
+
+        return resultados
+
+    def guardar(self, textos: Sequence[str], resultados: Sequence[float], versao: str | None = None):
+        """
+        Guarda os resultados dos textos. Se `versao` for informada e o cache tiver sido invalidado para outra
+        versão enquanto eles eram calculados, os resultados (do modelo antigo) são descartados.
+        """
+        chaves = [self._chave(texto) for texto in textos]
+        validade = monotonic() + self.ttl if self.ttl is not None else float('inf')
+
+        with self._lock:
+            if versao is not None and versao != self.versao:
+                return
+            for chave, resultado in zip(chaves, resultados):
+                self._dados[chave] = (resultado, validade)
+                self._dados.move_to_end(chave)
+
+            while len(self._dados) > self.tamanho_max:
+                self._dados.popitem(last=False)
+                self.remocoes += 1
+
+    def invalidar(self, versao: str | None = None):
+        """Descarta todos os resultados. Deve ser chamado quando o modelo ou o vetorizador mudam"""
+        with self._lock:
+            self._dados.clear()
+            if versao is not None:
+                self.versao = versao
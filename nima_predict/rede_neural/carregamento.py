@@ -1,13 +1,52 @@
-from keras.models import Sequential
-from keras.models import load_model
-import joblib
-from sklearn.feature_extraction.text import CountVectorizer
+from typing import TYPE_CHECKING, Union
 
+import numpy as np
 
-def carregar_modelo(filename: str) -> Sequential:
+from .motor_numpy import ModeloNumpy
+from .vetorizador_rapido import VetorizadorHash, VetorizadorRapido
+
+# importados somente quando necessários, pois demoram alguns segundos
+if TYPE_CHECKING:
+    from keras.models import Sequential
+    from sklearn.feature_extraction.text import CountVectorizer, HashingVectorizer
+
+# modelo aceito por `classificar`: o modelo do Keras, ou o modelo exportado para NumPy
+Modelo = Union['Sequential', ModeloNumpy]
+
+# vetorizador aceito por `classificar`: o do sklearn, ou o exportado para `VetorizadorRapido`.
+# Os modelos do treino incremental (`treino_incremental`) podem usar o `HashingVectorizer` ou o `VetorizadorHash`
+Vetorizador = Union['CountVectorizer', VetorizadorRapido, 'HashingVectorizer', VetorizadorHash]
+
+
+def carregar_modelo(filename: str, mapear_memoria: bool = False) -> Modelo:
+    """
+    Carrega o modelo de rede neural.
+
+    Se for um arquivo `.npz` (gerado por `exportacao.exportar_numpy`), o modelo é executado somente com
+    NumPy, e o TensorFlow não é importado. Caso contrário, é carregado pelo Keras.
+
+    Com `mapear_memoria`, os pesos de um `.npz` são mapeados em memória, e compartilhados entre processos
+    (veja `ModeloNumpy.carregar_mapeado`).
+    """
+    if filename.endswith('.npz'):
+        return ModeloNumpy.carregar_mapeado(filename) if mapear_memoria else ModeloNumpy.carregar(filename)
+
+    from keras.models import load_model
     return load_model(filename)
 
 
-def carregar_vectorizer(filename: str) -> CountVectorizer:
-    return joblib.load(filename)
+def carregar_vectorizer(filename: str) -> Vetorizador:
+    """
+    Carrega o vetorizador.
 
+    Se for um arquivo `.npz` (gerado por `exportacao.exportar_vetorizador`), carrega um `VetorizadorRapido`,
+    ou um `VetorizadorHash` se o arquivo não tiver vocabulário.
+    Caso contrário, é o `CountVectorizer` (ou `HashingVectorizer`) armazenado pelo joblib.
+    """
+    if filename.endswith('.npz'):
+        with np.load(filename, allow_pickle=False) as arquivo:
+            sem_vocabulario = 'n_features' in arquivo.files
+        return VetorizadorHash.carregar(filename) if sem_vocabulario else VetorizadorRapido.carregar(filename)
+
+    import joblib
+    return joblib.load(filename)
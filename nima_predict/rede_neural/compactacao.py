@@ -0,0 +1,150 @@
+import os
+from statistics import median
+from time import perf_counter
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from .carregamento import Modelo, Vetorizador
+from .exportacao import PRECISOES, extrair_pesos, podar_vocabulario, quantizar
+from .motor_numpy import ModeloNumpy
+from .utilizacao import _predizer
+
+
+class Variante:
+    """Um par (modelo, vetorizador) comparado em `comparar_variantes`, com os arquivos em que está armazenado"""
+
+    def __init__(self, nome: str, model: Modelo, vec: Vetorizador, arquivos: Sequence[str] = ()):
+        self.nome = nome
+        self.model = model
+        self.vec = vec
+        self.arquivos = list(arquivos)
+
+
+def _tamanho_pesos(model: Modelo) -> int:
+    if isinstance(model, ModeloNumpy):
+        return model.tamanho_pesos
+    return sum(w.nbytes for w in model.get_weights())
+
+
+def _medir_latencia(model: Modelo, vec: Vetorizador, textos: List[str], repeticoes: int) -> float:
+    """Mediana (em segundos) de vetorizar e classificar `textos` de uma vez"""
+    _predizer(model, vec, textos[:1])      # aquecimento
+    medidas = []
+    for _ in range(repeticoes):
+        inicio = perf_counter()
+        _predizer(model, vec, textos)
+        medidas.append(perf_counter() - inicio)
+    return median(medidas)
+
+
+def comparar_variantes(
+        variantes: List[Variante],
+        sentencas_teste: Sequence[str],
+        res_teste: Sequence,
+        repeticoes: int = 5,
+        tamanho_lote: int = 1000
+) -> List[Dict]:
+    """
+    Compara as variantes no conjunto de teste (o mesmo de `treino._separar_treino_teste`), e mostra uma tabela.
+
+    Para cada variante são medidos a acurácia, a maior diferença para a primeira variante (a de referência),
+    a latência para classificar um lote de `tamanho_lote` textos, a memória dos pesos e o tamanho dos arquivos.
+
+    :return: uma linha (um dicionario) para cada variante
+    """
+    textos = [str(t) for t in sentencas_teste]
+    esperado = np.asarray(res_teste).astype(bool)
+    lote = (textos * (tamanho_lote // max(len(textos), 1) + 1))[:tamanho_lote]
+
+    linhas = []
+    referencia = None
+    for variante in variantes:
+        resultados = _predizer(variante.model, variante.vec, textos)
+        if referencia is None:
+            referencia = resultados
+
+        linhas.append({
+            'variante': variante.nome,
+            'vocabulario': len(variante.vec.vocabulary_),
+            'acuracia': float(np.mean((resultados > 0.5) == esperado)),
+            'diferenca': float(np.max(np.abs(resultados - referencia))) if len(textos) else 0.0,
+            'latencia_ms': _medir_latencia(variante.model, variante.vec, lote, repeticoes) * 1000,
+            'pesos_mb': _tamanho_pesos(variante.model) / 2 ** 20,
+            'arquivos_mb': sum(os.path.getsize(a) for a in variante.arquivos) / 2 ** 20,
+        })
+
+    print(f"{'variante':<20} {'vocabulário':>11} {'acurácia':>9} {'diferença':>10} "
+          f"{f'ms/{tamanho_lote}':>9} {'pesos MB':>9} {'arquivos MB':>11}")
+    for linha in linhas:
+        print(f"{linha['variante']:<20} {linha['vocabulario']:>11} {linha['acuracia']:>9.4f} "
+              f"{linha['diferenca']:>10.2e} {linha['latencia_ms']:>9.2f} {linha['pesos_mb']:>9.3f} "
+              f"{linha['arquivos_mb']:>11.3f}")
+    return linhas
+
+
+def gerar_variantes(
+        model: Modelo,
+        vec: Vetorizador,
+        prefixo: str,
+        precisoes: Sequence[str] = PRECISOES,
+        limiar: float = 0.05
+) -> Tuple[List[Variante], str]:
+    """
+    Gera as versões compactadas de um modelo do Keras (ou ja exportado): o vocabulário é podado com
+    `exportacao.podar_vocabulario`, e a primeira camada é quantizada em cada uma das `precisoes`.
+
+    Os arquivos são salvos como `PREFIXO-PRECISAO.npz`, e o vetorizador podado (comum a todas) como
+    `PREFIXO-vetorizador.npz`.
+
+    :return: as variantes geradas e o path do vetorizador podado
+    """
+    modelo_numpy = model if isinstance(model, ModeloNumpy) else extrair_pesos(model)
+    podado, vec_podado = podar_vocabulario(modelo_numpy, vec, limiar)
+    print(f"  Vocabulário: {modelo_numpy.input_dim} -> {podado.input_dim} palavras (limiar {limiar})")
+
+    path_vec = f'{prefixo}-vetorizador.npz'
+    vec_podado.salvar(path_vec)
+
+    variantes = []
+    for precisao in precisoes:
+        quantizado = quantizar(podado, precisao)
+        path_modelo = f'{prefixo}-{precisao}.npz'
+        quantizado.salvar(path_modelo)
+        variantes.append(Variante(f'{precisao} podado', quantizado, vec_podado, [path_modelo, path_vec]))
+
+    return variantes, path_vec
+
+
+def main():
+    from .carregamento import carregar_modelo, carregar_vectorizer
+    from .treino import _ler_arquivo, _preprocessamento_dados_para_sentenca, _separar_treino_teste
+
+    try:
+        fn_dados = input("Digite o nome de arquivo de dados (o mesmo do treino): ")
+        fn_modelo = input("Digite o nome do arquivo do modelo (.h): ")
+        fn_vec = input("Digite o nome do arquivo do vetorizador (.pkl): ")
+        prefixo = input("Digite o prefixo dos arquivos de saida (ex.: modelos/compacto): ")
+        limiar = input("Digite o limiar de poda do vocabulário, ou [ENTER] para 0.05: ")
+        limiar = float(limiar) if limiar != '' else 0.05
+
+        print("Separando o conjunto de teste")
+        dataframe = _ler_arquivo(fn_dados)
+        _preprocessamento_dados_para_sentenca(dataframe)
+        _, sentencas_teste, _, res_teste = _separar_treino_teste(dataframe)
+
+        model = carregar_modelo(fn_modelo)
+        vec = carregar_vectorizer(fn_vec)
+
+        print("Compactando")
+        variantes, _ = gerar_variantes(model, vec, prefixo, limiar=limiar)
+
+        print("Comparando com o original")
+        original = Variante('original (.h)', model, vec, [fn_modelo, fn_vec])
+        comparar_variantes([original] + variantes, sentencas_teste, res_teste)
+
+    except FileNotFoundError:
+        print("Arquivo nao encontrado. Tente novamente")
+
+    except Exception as e:
+        print("Erro: ", e)
@@ -0,0 +1,200 @@
+from typing import Tuple
+
+import numpy as np
+
+from .motor_numpy import ModeloNumpy
+from .vetorizador_rapido import VetorizadorHash, VetorizadorRapido
+
+
+def extrair_pesos(model) -> ModeloNumpy:
+    """
+    Extrai os pesos de um modelo `Sequential` do Keras, composto somente por camadas `Dense`.
+
+    Camadas sem pesos (como `Dropout`) são ignoradas, pois não fazem nada durante a predição.
+
+    :param model: O modelo treinado
+
+    :return: Um `ModeloNumpy` equivalente
+    """
+
+    pesos, vieses, ativacoes = [], [], []
+    for camada in model.layers:
+        parametros = camada.get_weights()
+        if not parametros:
+            continue
+
+        if len(parametros) != 2:
+            raise ValueError(f"Camada não suportada: {camada.name}")
+
+        configuracao = camada.get_config()
+        pesos.append(parametros[0])
+        vieses.append(parametros[1])
+        ativacoes.append(configuracao.get('activation', 'linear'))
+
+    return ModeloNumpy(pesos, vieses, ativacoes)
+
+
+def verificar_paridade(model, modelo_numpy: ModeloNumpy, quantidade: int = 256) -> float:
+    """
+    Compara a saída do Keras com a do `ModeloNumpy`, sobre entradas esparsas aleatórias
+    no formato gerado pelo `CountVectorizer`.
+
+    :return: A maior diferença absoluta entre as duas saídas
+    """
+    from scipy import sparse
+
+    x = sparse.random(
+        quantidade, modelo_numpy.input_dim,
+        density=min(1.0, 20 / modelo_numpy.input_dim),
+        format='csr',
+        random_state=123,
+        data_rvs=lambda n: np.random.default_rng(123).integers(1, 4, size=n)
+    )
+
+    esperado = model.predict(x.toarray(), verbose=False)
+    obtido = modelo_numpy.predict(x)
+
+    return float(np.max(np.abs(esperado - obtido)))
+
+
+def exportar_numpy(model, filename: str, tolerancia: float = 1e-4) -> ModeloNumpy:
+    """
+    Exporta o modelo para um arquivo `.npz`, que pode ser carregado sem TensorFlow
+    por `carregar_modelo`.
+
+    Antes de salvar, verifica se o modelo exportado produz os mesmos resultados que o original.
+    Caso a diferença seja maior que `tolerancia`, será levantada uma exceção `ValueError`.
+    """
+
+    modelo_numpy = extrair_pesos(model)
+
+    diferenca = verificar_paridade(model, modelo_numpy)
+    print(f"  Diferença máxima entre Keras e NumPy: {diferenca:.2e}")
+    if diferenca > tolerancia:
+        raise ValueError(f"Modelo exportado diverge do original (diferença {diferenca:.2e})")
+
+    modelo_numpy.salvar(filename)
+    return modelo_numpy
+
+
+def exportar_vetorizador(vec, filename: str, textos=None) -> VetorizadorRapido | VetorizadorHash:
+    """
+    Exporta um `CountVectorizer` ja treinado para um `VetorizadorRapido`, armazenado em um arquivo `.npz`,
+    que pode ser carregado por `carregar_vectorizer`. Um `HashingVectorizer` é exportado para um `VetorizadorHash`.
+
+    Se `textos` forem passados, verifica se os dois vetorizadores geram exatamente a mesma matriz para eles.
+    Caso contrário, será levantada uma exceção `ValueError`.
+    """
+
+    if hasattr(vec, 'n_features'):
+        rapido = VetorizadorHash.de_hashing_vectorizer(vec)
+    else:
+        rapido = VetorizadorRapido.de_count_vectorizer(vec)
+
+    if textos is not None:
+        textos = list(textos)
+        diferencas = (vec.transform(textos) != rapido.transform(textos)).nnz
+        print(f"  Diferenças entre os vetorizadores em {len(textos)} textos: {diferencas}")
+        if diferencas:
+            raise ValueError("Vetorizador exportado diverge do original")
+
+    rapido.salvar(filename)
+    return rapido
+
+
+PRECISOES = ('float32', 'float16', 'int8')
+
+
+def quantizar(modelo_numpy: ModeloNumpy, precisao: str) -> ModeloNumpy:
+    """
+    Converte os pesos da primeira camada (vocabulário x neurônios) para `precisao`.
+
+    Em 'int8', cada coluna (neurônio) é dividida pela sua própria escala, de forma que o maior peso
+    absoluto vire 127. As demais camadas são pequenas e continuam em float32.
+    """
+    if precisao not in PRECISOES:
+        raise ValueError(f"Precisão não suportada: {precisao}")
+
+    pesos = _pesos_primeira_camada(modelo_numpy)
+    escala = None
+    if precisao == 'int8':
+        escala = np.abs(pesos).max(axis=0) / 127
+        escala[escala == 0] = 1     # neurônio sem nenhum peso
+        primeira = np.round(pesos / escala).astype(np.int8)
+    else:
+        primeira = pesos.astype(precisao)
+
+    return ModeloNumpy([primeira] + modelo_numpy.pesos[1:], modelo_numpy.vieses, modelo_numpy.ativacoes, escala)
+
+
+def podar_vocabulario(modelo_numpy: ModeloNumpy, vec, limiar: float = 0.05) -> Tuple[ModeloNumpy, VetorizadorRapido]:
+    """
+    Remove do vocabulário as palavras cujos pesos na primeira camada são todos próximos de zero, isto é,
+    menores (em valor absoluto) que `limiar` vezes o maior peso da camada. As linhas correspondentes
+    da primeira camada também são removidas.
+
+    :param vec: o `CountVectorizer` ou `VetorizadorRapido` usado com o modelo
+
+    :return: o modelo e o vetorizador reduzidos, que devem ser usados juntos
+    """
+    if not isinstance(vec, VetorizadorRapido):
+        vec = VetorizadorRapido.de_count_vectorizer(vec)
+
+    if len(vec.vocabulario) != modelo_numpy.input_dim:
+        raise ValueError(f"Vocabulário com {len(vec.vocabulario)} palavras, mas o modelo espera "
+                         f"{modelo_numpy.input_dim}")
+
+    magnitudes = np.abs(_pesos_primeira_camada(modelo_numpy)).max(axis=1)
+    mantidas = np.flatnonzero(magnitudes >= limiar * magnitudes.max())
+
+    termos = np.empty(len(vec.vocabulario), dtype=object)
+    for termo, i in vec.vocabulario.items():
+        termos[i] = termo
+
+    reduzido = VetorizadorRapido(
+        vocabulario={termo: i for i, termo in enumerate(termos[mantidas])},
+        token_pattern=vec.token_pattern,
+        lowercase=vec.lowercase,
+        strip_accents=vec.strip_accents,
+        binary=vec.binary,
+        dtype=vec.dtype
+    )
+    primeira = np.asarray(modelo_numpy.pesos[0])[mantidas]
+    modelo = ModeloNumpy([primeira] + modelo_numpy.pesos[1:], modelo_numpy.vieses, modelo_numpy.ativacoes,
+                         modelo_numpy.escala)
+    return modelo, reduzido
+
+
+def _pesos_primeira_camada(modelo_numpy: ModeloNumpy) -> np.ndarray:
+    """Os pesos da primeira camada em float32, mesmo que estejam quantizados"""
+    pesos = np.asarray(modelo_numpy.pesos[0], dtype=np.float32)
+    if modelo_numpy.escala is not None:
+        pesos = pesos * modelo_numpy.escala
+    return pesos
+
+
+def main():
+    from .carregamento import carregar_modelo, carregar_vectorizer
+
+    try:
+        fn = input("Digite o nome do arquivo do modelo (.h), ou [ENTER] para pular: ")
+        if fn != '':
+            modelo = carregar_modelo(fn)
+
+            fn_out = input("Digite o nome de arquivo de saida (.npz): ")
+            exportar_numpy(modelo, fn_out)
+            print("Modelo exportado")
+
+        fn = input("Digite o nome do arquivo do vetorizador (.pkl), ou [ENTER] para pular: ")
+        if fn != '':
+            vec = carregar_vectorizer(fn)
+
+            fn_out = input("Digite o nome de arquivo de saida (.npz): ")
+            exportar_vetorizador(vec, fn_out)
+            print("Vetorizador exportado")
+
+    except FileNotFoundError:
+        print("Arquivo nao encontrado. Tente novamente")
+
+    except Exception as e:
+        print("Erro: ", e)
@@ -0,0 +1,273 @@
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from typing import List
+
+import numpy as np
+from scipy import sparse
+
+# somente em linux e mac; no windows, `carregar_mapeado` não é protegido contra outros processos
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+def _relu(x: np.ndarray) -> np.ndarray:
+    return np.maximum(x, 0, out=x)
+
+
+def _sigmoid(x: np.ndarray) -> np.ndarray:
+    # equivalente a 1 / (1 + exp(-x)), sem overflow para x muito negativo
+    return np.exp(-np.logaddexp(0, -x, out=x), out=x)
+
+
+def _linear(x: np.ndarray) -> np.ndarray:
+    return x
+
+
+def _tanh(x: np.ndarray) -> np.ndarray:
+    return np.tanh(x, out=x)
+
+
+def _softmax(x: np.ndarray) -> np.ndarray:
+    # subtraindo o maior valor de cada linha, sem overflow no exp
+    x -= x.max(axis=1, keepdims=True)
+    np.exp(x, out=x)
+    x /= x.sum(axis=1, keepdims=True)
+    return x
+
+
+ATIVACOES = {
+    'relu': _relu,
+    'sigmoid': _sigmoid,
+    'linear': _linear,
+    'tanh': _tanh,
+    'softmax': _softmax,
+}
+
+
+# arquivo, dentro do diretório de `ModeloNumpy.carregar_mapeado`, com a assinatura do `.npz` de origem
+_ASSINATURA_MMAP = 'origem.txt'
+
+
+def _ler_assinatura(diretorio: str) -> str | None:
+    try:
+        with open(os.path.join(diretorio, _ASSINATURA_MMAP)) as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _extrair(origem, assinatura: str, diretorio: str):
+    """
+    Extrai os arrays do `.npz` aberto em `origem` para `diretorio`, como arquivos `.npy`, junto com a
+    `assinatura`. Deve ser chamado com a trava de `_travar`
+    """
+    # extraindo em um diretório temporário, e trocando de uma vez
+    temporario = tempfile.mkdtemp(prefix='.mmap-', dir=os.path.dirname(os.path.abspath(diretorio)))
+    try:
+        with np.load(origem, allow_pickle=False) as arquivo:
+            for nome in arquivo.files:
+                np.save(os.path.join(temporario, f'{nome}.npy'), arquivo[nome], allow_pickle=False)
+        with open(os.path.join(temporario, _ASSINATURA_MMAP), 'w') as f:
+            f.write(assinatura)
+
+        # processos que ja mapearam os arquivos antigos continuam com eles, mesmo depois de removidos
+        shutil.rmtree(diretorio, ignore_errors=True)
+        os.replace(temporario, diretorio)
+    except BaseException:
+        shutil.rmtree(temporario, ignore_errors=True)
+        raise
+
+
+def _atualizar_mapeado(filename: str, diretorio: str):
+    """Extrai o `.npz` para `diretorio` se a assinatura mudou. Deve ser chamado com a trava de `_travar`"""
+    with open(filename, 'rb') as origem:
+        info = os.fstat(origem.fileno())
+        assinatura = f'{info.st_size} {info.st_mtime_ns} {info.st_ino}'
+        if _ler_assinatura(diretorio) != assinatura:
+            _extrair(origem, assinatura, diretorio)
+
+
+@contextmanager
+def _travar(filename: str):
+    """
+    Trava exclusiva entre processos, no arquivo `filename` (criado se não existir, e nunca removido, pois
+    outro processo pode estar esperando por ele)
+    """
+    if fcntl is None:
+        yield
+        return
+
+    with open(filename, 'a') as arquivo:
+        fcntl.flock(arquivo.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(arquivo.fileno(), fcntl.LOCK_UN)
+
+
+class ModeloNumpy:
+    """
+    Executa a rede neural (uma sequência de camadas `Dense`) somente com NumPy.
+
+    A primeira camada é multiplicada diretamente pela matriz esparsa gerada pelo vetorizador, sem
+    convertê-la para uma matriz densa. Possui um método `predict` compatível com o do Keras, então pode
+    ser usado no lugar do modelo em `classificar`.
+
+    Não depende de TensorFlow nem de Keras.
+
+    Os pesos da primeira camada, que liga todo o vocabulário à rede, podem estar em float16 ou em int8
+    (com uma `escala` por neurônio, veja `exportacao.quantizar`). Nesse caso, somente as linhas das palavras
+    presentes em cada lote são convertidas para float32. As demais camadas são sempre float32.
+    """
+
+    def __init__(
+            self,
+            pesos: List[np.ndarray],
+            vieses: List[np.ndarray],
+            ativacoes: List[str],
+            escala: np.ndarray | None = None
+    ):
+        if not (len(pesos) == len(vieses) == len(ativacoes)):
+            raise ValueError("Quantidade de pesos, vieses e ativações diferentes")
+
+        for ativacao in ativacoes:
+            if ativacao not in ATIVACOES:
+                raise ValueError(f"Ativação não suportada: {ativacao}")
+
+        primeira = np.asarray(pesos[0])
+        if primeira.dtype == np.int8:
+            if escala is None:
+                raise ValueError("Pesos int8 precisam de uma escala")
+        elif primeira.dtype != np.float16:
+            primeira = np.asarray(primeira, dtype=np.float32)
+
+        self.pesos = [primeira] + [np.asarray(p, dtype=np.float32) for p in pesos[1:]]
+        self.vieses = [np.asarray(b, dtype=np.float32) for b in vieses]
+        self.ativacoes = list(ativacoes)
+        self.escala = np.asarray(escala, dtype=np.float32) if escala is not None else None
+
+    @property
+    def input_dim(self) -> int:
+        return self.pesos[0].shape[0]
+
+    @property
+    def precisao(self) -> str:
+        """Tipo dos pesos da primeira camada: 'float32', 'float16' ou 'int8'"""
+        return self.pesos[0].dtype.name
+
+    @property
+    def tamanho_pesos(self) -> int:
+        """Memória ocupada pelos pesos e vieses, em bytes"""
+        escala = self.escala.nbytes if self.escala is not None else 0
+        return sum(p.nbytes for p in self.pesos) + sum(b.nbytes for b in self.vieses) + escala
+
+    def _primeira_camada_compacta(self, x) -> np.ndarray:
+        """
+        Produto `x @ W0` para os pesos em float16 ou int8: somente as linhas de `W0` das palavras presentes
+        em `x` são convertidas para float32, e multiplicadas por `x` restrita a essas colunas.
+        """
+        x = sparse.csr_matrix(x)
+        palavras, colunas = np.unique(x.indices, return_inverse=True)
+        linhas = self.pesos[0][palavras].astype(np.float32)
+        x_reduzida = sparse.csr_matrix(
+            (x.data.astype(np.float32, copy=False), colunas.ravel(), x.indptr),
+            shape=(x.shape[0], len(palavras))
+        )
+
+        h = np.asarray(x_reduzida @ linhas)
+        if self.escala is not None:
+            h *= self.escala
+        return h
+
+    def predict(self, x, **_kwargs) -> np.ndarray:
+        """
+        Executa a rede sobre `x`, que pode ser uma matriz esparsa (scipy) ou densa.
+
+        Os argumentos extras do `predict` do Keras (`use_multiprocessing`, `verbose`...) são ignorados.
+
+        :return: um array (quantidade, saídas) em float32, como o do Keras
+        """
+        if x.shape[0] == 0:
+            return np.zeros((0, self.pesos[-1].shape[1]), dtype=np.float32)
+
+        # produto esparso x denso na primeira camada
+        if self.pesos[0].dtype == np.float32:
+            h = np.asarray(x.astype(np.float32, copy=False) @ self.pesos[0])
+        else:
+            h = self._primeira_camada_compacta(x)
+        h += self.vieses[0]
+        h = ATIVACOES[self.ativacoes[0]](h)
+
+        for w, b, ativacao in zip(self.pesos[1:], self.vieses[1:], self.ativacoes[1:]):
+            h = h @ w
+            h += b
+            h = ATIVACOES[ativacao](h)
+
+        return h
+
+    def salvar(self, filename: str):
+        """Armazena os pesos em um arquivo `.npz` comprimido"""
+        arrays = {}
+        for i, (w, b) in enumerate(zip(self.pesos, self.vieses)):
+            arrays[f'W{i}'] = w
+            arrays[f'b{i}'] = b
+        if self.escala is not None:
+            arrays['escala'] = self.escala
+
+        np.savez_compressed(filename, ativacoes=np.array(self.ativacoes), **arrays)
+
+    @classmethod
+    def carregar(cls, filename: str) -> 'ModeloNumpy':
+        with np.load(filename, allow_pickle=False) as arquivo:
+            ativacoes = [str(a) for a in arquivo['ativacoes']]
+            pesos = [arquivo[f'W{i}'] for i in range(len(ativacoes))]
+            vieses = [arquivo[f'b{i}'] for i in range(len(ativacoes))]
+            escala = arquivo['escala'] if 'escala' in arquivo.files else None
+
+        return cls(pesos, vieses, ativacoes, escala)
+
+    @classmethod
+    def carregar_mapeado(cls, filename: str) -> 'ModeloNumpy':
+        """
+        Igual a `carregar`, porém os pesos são mapeados em memória (`mmap`) a partir de arquivos `.npy`,
+        extraídos do `.npz` para o diretório `filename + '.mmap'` (somente se estiverem desatualizados).
+
+        Assim, todos os processos que carregam o mesmo modelo compartilham as mesmas páginas de memória.
+
+        O diretório guarda a assinatura do `.npz` de onde foi extraído (tamanho, data de modificação e inode),
+        e é extraído de novo se ela mudar. Só a data não basta: um arquivo copiado com a data preservada
+        (`cp -p`, `rsync -t`) pode ter uma data mais antiga do que a da extração anterior.
+
+        Vários processos podem carregar o mesmo modelo ao mesmo tempo (o pool de `classificacao.arquivos`,
+        a troca dos processos de `server_prefork`, dois servidores): a verificação, a extração e a abertura
+        dos arquivos são feitas com uma trava no arquivo `filename + '.mmap.lock'`, então somente um deles
+        extrai, e os outros usam o diretório extraído.
+        """
+        diretorio = filename + '.mmap'
+        with _travar(diretorio + '.lock'):
+            _atualizar_mapeado(filename, diretorio)
+
+            def abrir(nome: str) -> np.ndarray:
+                return np.load(os.path.join(diretorio, f'{nome}.npy'), mmap_mode='r', allow_pickle=False)
+
+            ativacoes = [str(a) for a in abrir('ativacoes')]
+            pesos = [abrir(f'W{i}') for i in range(len(ativacoes))]
+            vieses = [abrir(f'b{i}') for i in range(len(ativacoes))]
+            escala = abrir('escala') if os.path.isfile(os.path.join(diretorio, 'escala.npy')) else None
+
+        return cls(pesos, vieses, ativacoes, escala)
+
+    @staticmethod
+    def preparar_mapeado(filename: str):
+        """
+        Somente extrai (se estiver desatualizado) o diretório usado por `carregar_mapeado`, sem carregar o
+        modelo. Feito uma vez antes de iniciar vários processos que vão carregar o mesmo modelo, para que
+        eles não esperem pela extração um do outro.
+        """
+        diretorio = filename + '.mmap'
+        with _travar(diretorio + '.lock'):
+            _atualizar_mapeado(filename, diretorio)
@@ -0,0 +1,39 @@
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from pandas import DataFrame, Series
+
+# tipo das disciplinas, as únicas produções cujo conteudo (a ementa) é usado na classificação
+TIPO_DISCIPLINA = "Course"
+
+
+def ementa_valida(conteudo: str) -> bool:
+    """A ementa só é usada se não for um texto genérico (contendo "ementa") e tiver mais de 10 caracteres"""
+    return "ementa" not in conteudo.lower() and len(conteudo) > 10
+
+
+def montar_sentenca(nome: str, conteudo: str, tipo: str) -> str:
+    """
+    Monta o texto usado para classificar uma produção: o nome, concatenado com o conteudo
+    se for uma disciplina com uma ementa válida.
+    """
+    if tipo == TIPO_DISCIPLINA and ementa_valida(conteudo):
+        return f'{nome} {conteudo}'
+    return nome
+
+
+def montar_sentencas(df: 'DataFrame') -> 'Series':
+    """
+    Igual a `montar_sentenca`, porém aplicado a todas as linhas do DataFrame de uma vez,
+    usando as colunas `nome`, `conteudo` e `tipo`.
+    """
+    nome = df['nome'].astype(str)
+    conteudo = df['conteudo'].fillna('').astype(str)
+
+    valida = (
+        (df['tipo'] == TIPO_DISCIPLINA)
+        & ~conteudo.str.lower().str.contains('ementa', regex=False)
+        & (conteudo.str.len() > 10)
+    )
+
+    return nome.where(~valida, nome + ' ' + conteudo)
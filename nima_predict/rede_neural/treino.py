@@ -1,11 +1,14 @@
-import pandas as pd
-from keras.models import Sequential
-from pandas import DataFrame
-import joblib
-from typing import Tuple, Set
+import sys
+from typing import TYPE_CHECKING, Tuple, Set
 
+from .sentenca import montar_sentencas
 
-def _ler_arquivo(filename: str) -> DataFrame:
+if TYPE_CHECKING:
+    from keras.models import Sequential
+    from pandas import DataFrame
+
+
+def _ler_arquivo(filename: str) -> 'DataFrame':
     """
     Le o arquivo, e converte para um DataFrame.
 
@@ -15,6 +18,7 @@ def _ler_arquivo(filename: str) -> DataFrame:
 
     :return: Um objeto `DataFrame`
     """
+    import pandas as pd
 
     df: DataFrame = pd.read_csv(
         filepath_or_buffer=filename,
@@ -30,48 +34,34 @@ def _coletar_stopwords() -> Set[str]:
     """
     Coleta stopwords tanto em ingles como em portugues
 
+    O conjunto é guardado em cache, e o nltk só acessa a rede se nem o corpus nem o cache existirem
+    (veja `artefatos.obter_stopwords`).
+
     :return: Um `Set` com as stopwords em string
     """
+    from .artefatos import obter_stopwords
 
-    import nltk
-    from unidecode import unidecode
-
-    # baixando as stopwords
-    nltk.download('stopwords')
-
-    palavras_ingles: set = set(nltk.corpus.stopwords.words('english'))
-    palavras_portugues: set = set(nltk.corpus.stopwords.words('portuguese'))
-
-    palavras_portugues_niveladas: set = {unidecode(x) for x in palavras_portugues}
-
-    palavras_juntas: set = palavras_ingles.union(palavras_portugues_niveladas)
-    return palavras_juntas
+    return obter_stopwords()
 
 
-def _preprocessamento_dados_para_sentenca(df: DataFrame):
+def _preprocessamento_dados_para_sentenca(df: 'DataFrame'):
     """
     Coloca na coluna "sentence" o nome com concatenado com o conteudo.
     Se for uma disciplina com uma ementa válida
 
+    A regra é a mesma usada na classificação completa (`sentenca.montar_sentenca`).
+
     :param df: objeto `DataFrame`
 
     :return: None
     """
-    def eh_valido(e: str) -> bool: return "ementa" not in e.lower() and len(e) > 10
-
-    for index in df.index:
-        nome = df.loc[index, 'nome']            # nome
-        conteudo = df.loc[index, 'conteudo']    # conteudo
-        tipo = df.loc[index, 'tipo']            # tipo
-        # concatena nome com conteudo,  se conteudo nao tiver a palavra "ementa" e for uma disciplina
-        # isso acontece quando uma producao
-        sentenca = f'{nome} {conteudo if (tipo == "Course" and eh_valido(conteudo)) else ""}'
-        df.loc[index, 'sentence'] = sentenca
+    # concatena nome com conteudo, se conteudo nao tiver a palavra "ementa" e for uma disciplina
+    df['sentence'] = montar_sentencas(df)
 
     return
 
 
-def _separar_treino_teste(df: DataFrame) -> Tuple:
+def _separar_treino_teste(df: 'DataFrame') -> Tuple:
     """
     Separa o dataframe em 4 conjuntos: duas contendo a parte de testes, e outras duas para os treinos
 
@@ -88,32 +78,42 @@ def _separar_treino_teste(df: DataFrame) -> Tuple:
     return train_test_split(sentencas, res, test_size=0.2, random_state=123)
 
 
-def _bag_of_words(sentencas_treino, sentencas_teste, filename: str) -> Tuple:
+def _bag_of_words(sentencas_treino, sentencas_teste, filename: str, filename_npz: str | None = None) -> Tuple:
     """
     Aplica o CountVector, que transforma o texto em uma matriz esparsa
 
     Retorna um novo `Dados`.
 
-    Também armazena o `Vectorizer` criado
+    Também armazena o `Vectorizer` criado. O vocabulário é reutilizado do cache de artefatos se as
+    sentenças de treino e a configuração não mudaram (veja `artefatos.ajustar_vetorizador`).
 
     :param sentencas_treino: lista de sentencas para treino
 
     :param sentencas_teste: lista de sentencas para teste
 
+    :param filename_npz: se definido, também exporta o vetorizador como `VetorizadorRapido`, copiando o
+        artefato do cache
+
     :return: as listas transformadas em matrizes esparsas
     """
 
+    import shutil
+    import joblib
     from sklearn.feature_extraction.text import CountVectorizer
+    from .artefatos import ajustar_vetorizador
 
     vectorizer = CountVectorizer(
-        strip_accents='unicode',                # normaliza
-        lowercase=True,                         # converte para minuscula
-        stop_words=list(_coletar_stopwords())    # retira as stopwords
+        strip_accents='unicode',                        # normaliza
+        lowercase=True,                                 # converte para minuscula
+        stop_words=sorted(_coletar_stopwords())         # retira as stopwords
     )
 
-    vectorizer.fit(sentencas_treino)            # inicia o dicionario interno para a matriz esparsa
+    # inicia o dicionario interno para a matriz esparsa
+    artefato = ajustar_vetorizador(vectorizer, sentencas_treino)
 
     joblib.dump(vectorizer, filename)
+    if filename_npz is not None:
+        shutil.copyfile(artefato, filename_npz)
 
     # transformando
     sentencas_treino_vec = vectorizer.transform(sentencas_treino)
@@ -122,22 +122,62 @@ def _bag_of_words(sentencas_treino, sentencas_teste, filename: str) -> Tuple:
     return sentencas_treino_vec, sentencas_teste_vec
 
 
-def _gerar_rede_neural(x_treino, x_teste, res_treino, res_teste) -> Sequential:
-    from keras import layers
-    from keras.backend import clear_session
-    from tensorflow import random
-    random.set_seed(123)
+def _memoria_pico_mb() -> float | None:
+    """Pico de memória (RSS) do processo até agora, em MB. Retorna None se não for possível medir"""
+    try:
+        import resource
+    except ImportError:     # windows
+        return None
 
-    clear_session()
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico / 1024 if sys.platform != 'darwin' else pico / (1024 * 1024)   # KB no linux, bytes no mac
+
+
+def _gerar_dataset(x, y, batch_size: int, embaralhar: bool, semente: int = 123):
+    """
+    Cria um `tf.data.Dataset` que percorre a matriz esparsa `x` em lotes de `batch_size` linhas.
+
+    Somente o lote atual é convertido para uma matriz densa, então a memória não depende da quantidade
+    de linhas de `x`. Se `embaralhar` for verdadeiro, a ordem das linhas muda a cada época.
+    """
+    import numpy as np
+    import tensorflow as tf
+
+    x = x.tocsr()
+    y = np.asarray(y, dtype=np.float32)
+    quantidade, input_dim = x.shape
+    gerador_aleatorio = np.random.default_rng(semente)
+
+    def lotes():
+        ordem = gerador_aleatorio.permutation(quantidade) if embaralhar else np.arange(quantidade)
+        for inicio in range(0, quantidade, batch_size):
+            indices = ordem[inicio:inicio + batch_size]
+            yield x[indices].toarray().astype(np.float32), y[indices]
+
+    dataset = tf.data.Dataset.from_generator(
+        lotes,
+        output_signature=(
+            tf.TensorSpec(shape=(None, input_dim), dtype=tf.float32),
+            tf.TensorSpec(shape=(None,), dtype=tf.float32)
+        )
+    )
+    return dataset.prefetch(tf.data.AUTOTUNE)
 
-    # numero de features
-    input_dim = x_treino.shape[1]       # exemplo: (quantidade: 944, bow: 4300)
+
+# arquitetura padrão: neurônios de cada camada oculta
+CAMADAS_PADRAO = (50, 70, 20)
+
+
+def _montar_rede_neural(input_dim: int, camadas=CAMADAS_PADRAO) -> 'Sequential':
+    """Cria (sem treinar) a rede com as `camadas` ocultas indicadas e uma saída sigmoide"""
+    from keras import layers
+    from keras.models import Sequential
 
     model = Sequential()
-    model.add(layers.Dense(50, input_dim=input_dim, activation='relu'))
-    model.add(layers.Dense(70, input_dim=input_dim, activation='relu'))
+    model.add(layers.Dense(camadas[0], input_dim=input_dim, activation='relu'))
+    for neuronios in camadas[1:]:
+        model.add(layers.Dense(neuronios, activation='relu'))
     # model.add(layers.Dropout(rate=.2, input_dim=input_dim))
-    model.add(layers.Dense(20, input_dim=input_dim, activation='relu'))
     model.add(layers.Dense(1, activation='sigmoid'))
 
     model.compile(
@@ -145,29 +185,71 @@ def _gerar_rede_neural(x_treino, x_teste, res_treino, res_teste) -> Sequential:
         optimizer='adam',
         metrics=['accuracy']
     )
+    return model
+
+
+def _gerar_rede_neural(
+        x_treino,
+        x_teste,
+        res_treino,
+        res_teste,
+        camadas=CAMADAS_PADRAO,
+        epocas: int = 30,
+        batch_size: int = 50,
+        relatorio: bool = True
+) -> 'Sequential':
+    """
+    Cria e treina a rede neural. Os valores padrão são os usados em `main`; a busca de hiperparâmetros
+    (`busca.py`) varia `camadas`, `epocas` e `batch_size`.
+
+    Com `relatorio`, mostra a acurácia no treino e no teste, e o pico de memória.
+    """
+    from keras.backend import clear_session
+    from tensorflow import random
+    random.set_seed(123)
+
+    clear_session()
+
+    # numero de features
+    input_dim = x_treino.shape[1]       # exemplo: (quantidade: 944, bow: 4300)
+
+    model = _montar_rede_neural(input_dim, camadas)
+
+    # as matrizes esparsas são percorridas em lotes, sem serem convertidas inteiras para matrizes densas
+    dataset_treino = _gerar_dataset(x_treino, res_treino, batch_size, embaralhar=True)
+    dataset_teste = _gerar_dataset(x_teste, res_teste, batch_size, embaralhar=False)
+
+    memoria_inicial = _memoria_pico_mb()
 
     # treino
     _history = model.fit(
-        x=x_treino,
-        y=res_treino,
-        epochs=30,
+        dataset_treino,
+        epochs=epocas,
         verbose=False,
-        validation_data=(x_teste, res_teste),
-        batch_size=50
+        validation_data=dataset_teste
     )
 
     # print(history.history.keys())
 
+    if not relatorio:
+        return model
+
+    dataset_treino_avaliacao = _gerar_dataset(x_treino, res_treino, batch_size, embaralhar=False)
+
     print("Neural network (sequential) usando keras")
-    _, accuracy = model.evaluate(x_treino, res_treino, verbose=False)
+    _, accuracy = model.evaluate(dataset_treino_avaliacao, verbose=False)
     print("Training accuracy: {:.4}".format(accuracy))
-    _, accuracy = model.evaluate(x_teste, res_teste, verbose=False)
+    _, accuracy = model.evaluate(dataset_teste, verbose=False)
     print("Training accuracy: {:.4}".format(accuracy))
 
+    memoria_final = _memoria_pico_mb()
+    if memoria_final is not None:
+        print("Peak memory: {:.1f} MB (before training: {:.1f} MB)".format(memoria_final, memoria_inicial))
+
     return model
 
 
-def _salva_rede_neural(model: Sequential, filename: str):
+def _salva_rede_neural(model: 'Sequential', filename: str):
     model.save(
         filepath=filename,
         overwrite=True,
@@ -192,7 +274,8 @@ def main():
         # transforma
         print("  Aplicando B. O. W.")
         fn = input("  Digite o nome do arquivo para armazenar o Vectorizer: ")
-        vecs = _bag_of_words(dados[0], dados[1], fn)
+        fn_vec_npz = input("  Digite o nome de arquivo para o vetorizador rápido (.npz), ou [ENTER] para pular: ")
+        vecs = _bag_of_words(dados[0], dados[1], fn, fn_vec_npz or None)
 
         # criando modelo
         print("Criando modelo")
@@ -208,6 +291,11 @@ def main():
         fn_out = input("  Digite o nome de arquivo de saida (.h): ")
         _salva_rede_neural(modelo, fn_out)
 
+        fn_npz = input("  Digite o nome de arquivo para o modelo NumPy (.npz), ou [ENTER] para pular: ")
+        if fn_npz != '':
+            from .exportacao import exportar_numpy
+            exportar_numpy(modelo, fn_npz)
+
     except FileNotFoundError:
         print("Arquivo nao encontrado. Tente novamente")
 
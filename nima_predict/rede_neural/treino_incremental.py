@@ -0,0 +1,209 @@
+from collections import Counter
+from typing import TYPE_CHECKING, Iterator, Tuple
+
+import numpy as np
+
+from .sentenca import montar_sentencas
+from .treino import CAMADAS_PADRAO, _coletar_stopwords, _memoria_pico_mb, _montar_rede_neural
+
+if TYPE_CHECKING:
+    from keras.models import Sequential
+    from pandas import DataFrame
+
+# linhas do CSV lidas de cada vez. A memória do treino depende disso, e não do tamanho do arquivo
+TAMANHO_BLOCO = 10000
+
+# colunas do vetorizador por hashing (a entrada da rede)
+N_FEATURES_PADRAO = 2 ** 16
+
+# fração das linhas separadas para teste, como em `treino._separar_treino_teste`
+PROPORCAO_TESTE = 0.2
+
+
+def _ler_blocos(filename: str, tamanho_bloco: int = TAMANHO_BLOCO) -> Iterator['DataFrame']:
+    """Lê o CSV em blocos de `tamanho_bloco` linhas, somente com as colunas usadas no treino"""
+    import pandas as pd
+
+    return pd.read_csv(
+        filepath_or_buffer=filename,
+        header=0,
+        sep=',',
+        usecols=['nome', 'tipo', 'conteudo', 'res'],
+        chunksize=tamanho_bloco
+    )
+
+
+def _separar_bloco(df: 'DataFrame', numero: int, semente: int = 123) -> Tuple:
+    """
+    Separa um bloco em treino e teste. A separação depende somente do número do bloco e da `semente`,
+    então cada linha fica sempre do mesmo lado, em todas as passadas pelo arquivo.
+
+    :return: sentencas_treino, sentencas_teste, res_treino, res_teste
+    """
+    sentencas = montar_sentencas(df).values
+    res = df['res'].values.astype(np.float32)
+    teste = np.random.default_rng([semente, numero]).random(len(df)) < PROPORCAO_TESTE
+    return sentencas[~teste], sentencas[teste], res[~teste], res[teste]
+
+
+def criar_vetorizador_hash(n_features: int = N_FEATURES_PADRAO):
+    """
+    `HashingVectorizer` com as mesmas opções de `treino._bag_of_words`. Não precisa ser treinado, então
+    não depende do tamanho dos dados; em troca, palavras diferentes podem cair na mesma coluna.
+    """
+    from sklearn.feature_extraction.text import HashingVectorizer
+
+    return HashingVectorizer(
+        n_features=n_features,
+        strip_accents='unicode',
+        lowercase=True,
+        stop_words=sorted(_coletar_stopwords()),
+        alternate_sign=False,
+        norm=None
+    )
+
+
+def contar_vocabulario(filename: str, tamanho_bloco: int = TAMANHO_BLOCO, min_df: int = 1):
+    """
+    Primeira passada pelo arquivo: monta o vocabulário de um `CountVectorizer` bloco a bloco, somente com as
+    sentenças de treino. Somente a contagem das palavras fica em memória, e não as sentenças.
+
+    :param min_df: quantidade mínima de sentenças em que uma palavra precisa aparecer
+
+    :return: o `CountVectorizer`, pronto para `transform`
+    """
+    from sklearn.feature_extraction.text import CountVectorizer
+
+    vectorizer = CountVectorizer(
+        strip_accents='unicode',
+        lowercase=True,
+        stop_words=sorted(_coletar_stopwords())
+    )
+    analisador = vectorizer.build_analyzer()
+
+    frequencias = Counter()
+    for numero, df in enumerate(_ler_blocos(filename, tamanho_bloco)):
+        sentencas_treino = _separar_bloco(df, numero)[0]
+        for sentenca in sentencas_treino:
+            frequencias.update(set(analisador(sentenca)))
+
+    termos = sorted(termo for termo, quantidade in frequencias.items() if quantidade >= min_df)
+    vectorizer.vocabulary_ = {termo: i for i, termo in enumerate(termos)}
+    vectorizer.fixed_vocabulary_ = False
+    return vectorizer
+
+
+def _colunas(vec) -> int:
+    return vec.n_features if hasattr(vec, 'n_features') else len(vec.vocabulary_)
+
+
+def avaliar_incremental(model: 'Sequential', vec, filename: str, tamanho_bloco: int = TAMANHO_BLOCO,
+                        batch_size: int = 500) -> Tuple[float, int]:
+    """:return: a acurácia nas linhas de teste do arquivo, e a quantidade dessas linhas"""
+    acertos = total = 0
+    for numero, df in enumerate(_ler_blocos(filename, tamanho_bloco)):
+        _, sentencas_teste, _, res_teste = _separar_bloco(df, numero)
+        x = vec.transform(sentencas_teste)
+        for inicio in range(0, x.shape[0], batch_size):
+            lote = x[inicio:inicio + batch_size].toarray().astype(np.float32)
+            resultados = np.ravel(model.predict(lote, verbose=False))
+            acertos += int(np.sum((resultados > 0.5) == (res_teste[inicio:inicio + batch_size] > 0.5)))
+            total += lote.shape[0]
+    return acertos / max(total, 1), total
+
+
+def treinar_incremental(
+        filename: str,
+        vec,
+        camadas=CAMADAS_PADRAO,
+        epocas: int = 30,
+        batch_size: int = 50,
+        tamanho_bloco: int = TAMANHO_BLOCO,
+        semente: int = 123
+) -> 'Sequential':
+    """
+    Treina a rede lendo o CSV em blocos, a cada época, com `train_on_batch`. Cada bloco é vetorizado por `vec`
+    (veja `criar_vetorizador_hash` e `contar_vocabulario`) e embaralhado; somente o lote atual é convertido
+    para uma matriz densa.
+
+    Ao final de cada época, mostra a perda e a acurácia do treino, e a acurácia nas linhas de teste.
+    """
+    from keras.backend import clear_session
+    from tensorflow import random
+    random.set_seed(semente)
+
+    clear_session()
+
+    model = _montar_rede_neural(_colunas(vec), camadas)
+    gerador_aleatorio = np.random.default_rng(semente)
+
+    for epoca in range(1, epocas + 1):
+        perdas, acuracias = [], []
+        for numero, df in enumerate(_ler_blocos(filename, tamanho_bloco)):
+            sentencas_treino, _, res_treino, _ = _separar_bloco(df, numero)
+            x = vec.transform(sentencas_treino).tocsr()
+
+            ordem = gerador_aleatorio.permutation(x.shape[0])
+            for inicio in range(0, len(ordem), batch_size):
+                indices = ordem[inicio:inicio + batch_size]
+                metricas = model.train_on_batch(
+                    x[indices].toarray().astype(np.float32),
+                    res_treino[indices],
+                    return_dict=True
+                )
+                perdas.append(float(metricas['loss']))
+                acuracias.append(float(metricas['accuracy']))
+
+        acuracia_teste, _ = avaliar_incremental(model, vec, filename, tamanho_bloco)
+        print(f"  Época {epoca}/{epocas}: perda {np.mean(perdas):.4f}  acurácia {np.mean(acuracias):.4f}  "
+              f"teste {acuracia_teste:.4f}")
+
+    memoria = _memoria_pico_mb()
+    if memoria is not None:
+        print("Peak memory: {:.1f} MB".format(memoria))
+
+    return model
+
+
+def main():
+    import joblib
+    from .exportacao import exportar_numpy, exportar_vetorizador
+    from .treino import _salva_rede_neural
+
+    try:
+        fn = input("Digite o nome de arquivo de dados: ")
+        tamanho_bloco = input(f"  Linhas lidas de cada vez, ou [ENTER] para {TAMANHO_BLOCO}: ")
+        tamanho_bloco = int(tamanho_bloco) if tamanho_bloco != '' else TAMANHO_BLOCO
+
+        modo = input("  Vetorizador: [h]ashing (uma passada) ou [v]ocabulário (duas passadas)? [h/v] ")
+        if modo.lower().startswith('v'):
+            print("  Contando o vocabulário")
+            vec = contar_vocabulario(fn, tamanho_bloco)
+        else:
+            n_features = input(f"  Quantidade de colunas, ou [ENTER] para {N_FEATURES_PADRAO}: ")
+            vec = criar_vetorizador_hash(int(n_features) if n_features != '' else N_FEATURES_PADRAO)
+        print(f"  {_colunas(vec)} colunas")
+
+        fn_vec = input("  Digite o nome do arquivo para armazenar o Vectorizer: ")
+        joblib.dump(vec, fn_vec)
+
+        print("Treinando")
+        modelo = treinar_incremental(fn, vec, tamanho_bloco=tamanho_bloco)
+
+        print("Salvando modelo: ")
+        fn_out = input("  Digite o nome de arquivo de saida (.h): ")
+        _salva_rede_neural(modelo, fn_out)
+
+        fn_npz = input("  Digite o nome de arquivo para o modelo NumPy (.npz), ou [ENTER] para pular: ")
+        if fn_npz != '':
+            exportar_numpy(modelo, fn_npz)
+
+        fn_vec_npz = input("  Digite o nome de arquivo para o vetorizador rápido (.npz), ou [ENTER] para pular: ")
+        if fn_vec_npz != '':
+            exportar_vetorizador(vec, fn_vec_npz)
+
+    except FileNotFoundError:
+        print("Arquivo nao encontrado. Tente novamente")
+
+    except Exception as e:
+        print("Erro: ", e)
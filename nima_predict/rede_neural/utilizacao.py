@@ -1,16 +1,35 @@
 from collections import OrderedDict
-from typing import Dict, List
+from time import perf_counter
+from typing import Dict, Iterable, List
 
 import numpy as np
-from keras.models import Sequential
-from sklearn.feature_extraction.text import CountVectorizer
 
+from .cache import CachePredicoes
+from .carregamento import Modelo, Vetorizador
 
-def _preparar_texto(lista_strings: List[str], vec: CountVectorizer):
+
+def _preparar_texto(lista_strings: List[str], vec: Vetorizador):
     """Faz o processamento de texto, preparando para fazer a predição do texto"""
     return vec.transform(lista_strings)
 
 
+def _converte_item(v) -> str:
+    """
+    Converte um único valor do dicionario (em uma das formas de `_converte_dicionario`) no texto a ser classificado
+
+    :raise ValueError, TypeError: como em `_converte_dicionario`
+    """
+    if isinstance(v, str):                      # caso 1
+        return v
+    if isinstance(v, list):                     # caso 2
+        return " ".join(v)
+    if isinstance(v, dict):                     # caso 3
+        if "nome" not in v or "conteudo" not in v:
+            raise ValueError("faltando 'nome' ou 'conteudo'")
+        return f"{v['nome']} {v['conteudo']}"
+    raise TypeError(f"formato não suportado: {type(v).__name__}")
+
+
 def _converte_dicionario(dados: dict) -> OrderedDict:
     """
     Converte o dicionario em um dicionario
@@ -29,33 +48,83 @@ def _converte_dicionario(dados: dict) -> OrderedDict:
     Caso não esteja em nenhuma das três formas, será levantada uma exceção `TypeError`
     """
 
-    # pegando um valor qualquer
-    dados_convertidos = OrderedDict()
-    for k, v in dados.items():
-        if isinstance(v, str):                      # caso 1
-            dados_convertidos[k] = v
-        elif isinstance(v, list):                   # caso 2
-            dados_convertidos[k] = " ".join(v)
-        elif isinstance(v, dict):                   # caso 3
-            if "nome" not in v or "conteudo" not in v:
-                raise ValueError
-            dados_convertidos[k] = f"{v['nome']} {v['conteudo']}"
-        else:
-            raise TypeError
+    return OrderedDict((k, _converte_item(v)) for k, v in dados.items())
+
+
+def _predizer(
+        model: Modelo,
+        vec: Vetorizador,
+        textos: List[str],
+        tempos: Dict[str, float] | None = None
+) -> np.ndarray:
+    """
+    Vetoriza os textos e executa o modelo sobre eles, em uma única chamada a `predict`
+
+    Se `tempos` for informado, o tempo (em segundos) da vetorização e da predição são guardados
+    em `tempos['vetorizar']` e `tempos['inferir']`.
+
+    :return: um array unidimensional com um resultado para cada texto, na mesma ordem
+    """
+    inicio = perf_counter()
+    sentencas = _preparar_texto(textos, vec)
+    vetorizado = perf_counter()
+    resultados = model.predict(
+        x=sentencas,
+        use_multiprocessing=True
+    )
+    if tempos is not None:
+        tempos['vetorizar'] = vetorizado - inicio
+        tempos['inferir'] = perf_counter() - vetorizado
+    return np.ravel(resultados)
+
+
+def _predizer_com_cache(
+        model: Modelo,
+        vec: Vetorizador,
+        textos: List[str],
+        cache: CachePredicoes,
+        tempos: Dict[str, float] | None = None
+) -> np.ndarray:
+    """
+    Igual a `_predizer`, porém somente os textos que não estão no `cache` são vetorizados e classificados.
+    Os resultados novos são guardados no cache.
+    """
+    resultados = cache.obter(textos)
+    faltando = [i for i, resultado in enumerate(resultados) if resultado is None]
+
+    if faltando:
+        textos_faltando = [textos[i] for i in faltando]
+        novos = _predizer(model, vec, textos_faltando, tempos).tolist()
+        cache.guardar(textos_faltando, novos)
+        for i, resultado in zip(faltando, novos):
+            resultados[i] = resultado
+
+    return np.array(resultados, dtype=np.float32)
+
 
-    return dados_convertidos
+def _montar_resultado(chaves: Iterable[str], resultados: np.ndarray) -> Dict[str, float]:
+    """Junta cada chave com o seu resultado, em um dicionario pronto para ser codificado em JSON"""
+    # `tolist` converte o array inteiro para floats do Python de uma vez, em vez de elemento por elemento
+    return dict(zip(chaves, np.ravel(resultados).tolist()))
 
 
-def classificar(model: Sequential, vec: CountVectorizer, dados: Dict[str, str]) -> Dict[str, float]:
+def classificar(
+        model: Modelo,
+        vec: Vetorizador,
+        dados: Dict[str, str],
+        cache: CachePredicoes | None = None
+) -> Dict[str, float]:
     """
     Faz uma predição usando o modelo treinado
 
-    :param model: O modelo treinado
+    :param model: O modelo treinado (do Keras, ou exportado para NumPy)
 
-    :param vec: Um `CountVectorizer` treino nas sentenças
+    :param vec: Um `CountVectorizer` treinado nas sentenças, ou um `VetorizadorRapido`
 
     :param dados: Um dicionario
 
+    :param cache: Um `CachePredicoes` opcional. Somente os textos que não estão nele são classificados
+
     :return: um dicionario na forma { 'ident': {'conteudo': 'xxx...x', 'resultado': 0.23}, ... }
     """
 
@@ -63,19 +132,12 @@ def classificar(model: Sequential, vec: CountVectorizer, dados: Dict[str, str])
     dados_convertidos = _converte_dicionario(dados)
 
     # faz a predição
-    sentencas = vec.transform(list(dados_convertidos.values()))
-    chaves = dados.keys()
-
-    resultados = model.predict(
-        x=sentencas,
-        use_multiprocessing=True
-    )
+    textos = list(dados_convertidos.values())
+    if cache is not None:
+        resultados = _predizer_com_cache(model, vec, textos, cache)
+    else:
+        resultados = _predizer(model, vec, textos)
 
     # converte de volta
-    dados_e_resultados = {
-        chave: resultado.item()
-        for chave, resultado in zip(chaves, np.nditer(resultados))
-    }
-
-    return dados_e_resultados
+    return _montar_resultado(dados.keys(), resultados)
 
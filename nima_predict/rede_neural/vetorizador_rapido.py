@@ -0,0 +1,350 @@
+import re
+import struct
+import unicodedata
+from functools import lru_cache
+from typing import Dict, Iterable
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+
+class _TabelaAcentos:
+    """
+    Remove os acentos de um texto usando uma tabela de tradução (`str.translate`) em cache.
+
+    A tabela é um dicionario simples, preenchido sob demanda: cada caractere só é normalizado na primeira
+    vez que aparece. Como a remoção dos acentos descarta todos os caracteres combinantes, normalizar
+    caractere por caractere dá o mesmo resultado que normalizar o texto inteiro.
+    """
+
+    def __init__(self, modo: str):
+        self.modo = modo
+        self.tabela: Dict[int, str] = {c: chr(c) for c in range(128)}
+
+    def _normalizar(self, caractere: str) -> str:
+        normalizado = unicodedata.normalize('NFKD', caractere)
+        if self.modo == 'ascii':
+            return normalizado.encode('ASCII', 'ignore').decode('ASCII')
+        return ''.join(c for c in normalizado if not unicodedata.combining(c))
+
+    def remover(self, texto: str) -> str:
+        texto = texto.translate(self.tabela)
+        if texto.isascii():
+            return texto
+
+        # algum caractere ainda não está na tabela (ou é mantido sem mudança, como 'ß')
+        novos = [c for c in set(texto) if ord(c) not in self.tabela]
+        if novos:
+            self.tabela.update({ord(c): self._normalizar(c) for c in novos})
+            texto = texto.translate(self.tabela)
+        return texto
+
+
+class VetorizadorRapido:
+    """
+    Substituto do `CountVectorizer` ja treinado, para ser usado somente na classificação.
+
+    Produz exatamente a mesma matriz que `CountVectorizer.transform`, porém:
+
+        * o vocabulário é um dicionario congelado, sem as stopwords (que nunca estão no vocabulário);
+        * a remoção de acentos usa uma tabela de tradução em cache, em vez de normalizar cada texto;
+        * cada texto é tokenizado em uma única passada, montando os arrays da matriz CSR diretamente.
+
+    Somente a configuração usada em `treino._bag_of_words` é suportada (analisador de palavras,
+    sem n-gramas, tokenizer e preprocessador padrões).
+    """
+
+    def __init__(
+            self,
+            vocabulario: Dict[str, int],
+            token_pattern: str = r"(?u)\b\w\w+\b",
+            lowercase: bool = True,
+            strip_accents: str | None = 'unicode',
+            binary: bool = False,
+            dtype=np.int64
+    ):
+        if strip_accents not in (None, 'unicode', 'ascii'):
+            raise ValueError(f"strip_accents não suportado: {strip_accents}")
+
+        self.vocabulario = dict(vocabulario)
+        self.token_pattern = token_pattern
+        self.lowercase = lowercase
+        self.strip_accents = strip_accents
+        self.binary = binary
+        self.dtype = np.dtype(dtype)
+
+        self._findall = re.compile(token_pattern).findall
+        self._tabela = _TabelaAcentos(strip_accents) if strip_accents is not None else None
+
+    @property
+    def vocabulary_(self) -> Dict[str, int]:
+        """Mesmo atributo do `CountVectorizer`"""
+        return self.vocabulario
+
+    @classmethod
+    def de_count_vectorizer(cls, vec) -> 'VetorizadorRapido':
+        """
+        Cria um `VetorizadorRapido` a partir de um `CountVectorizer` ja treinado.
+
+        Caso o vetorizador use alguma opção não suportada, será levantada uma exceção `ValueError`
+        """
+        if vec.analyzer != 'word' or tuple(vec.ngram_range) != (1, 1) \
+                or vec.tokenizer is not None or vec.preprocessor is not None or vec.input != 'content':
+            raise ValueError("Configuração do CountVectorizer não suportada")
+
+        if callable(vec.strip_accents):
+            raise ValueError("strip_accents não suportado")
+
+        return cls(
+            vocabulario={termo: int(i) for termo, i in vec.vocabulary_.items()},
+            token_pattern=vec.token_pattern,
+            lowercase=vec.lowercase,
+            strip_accents=vec.strip_accents,
+            binary=vec.binary,
+            dtype=vec.dtype
+        )
+
+    def _preprocessar(self, texto: str) -> str:
+        if self.lowercase:
+            texto = texto.lower()
+        if self._tabela is not None and not texto.isascii():
+            texto = self._tabela.remover(texto)
+        return texto
+
+    def transform(self, textos: Iterable[str]) -> csr_matrix:
+        """Igual a `CountVectorizer.transform`"""
+        if isinstance(textos, str):
+            raise ValueError("Esperado um iterável de textos, porém recebeu um único texto")
+
+        vocabulario = self.vocabulario
+        findall = self._findall
+        preprocessar = self._preprocessar
+
+        indices = []
+        valores = []
+        indptr = [0]
+
+        for texto in textos:
+            contagem: Dict[int, int] = {}
+            for token in findall(preprocessar(texto)):
+                j = vocabulario.get(token)
+                if j is not None:
+                    contagem[j] = contagem.get(j, 0) + 1
+
+            colunas = sorted(contagem)
+            indices.extend(colunas)
+            valores.extend([contagem[j] for j in colunas])
+            indptr.append(len(indices))
+
+        tipo_indice = np.int32 if indptr[-1] <= np.iinfo(np.int32).max else np.int64
+        x = csr_matrix(
+            (
+                np.array(valores, dtype=self.dtype),
+                np.array(indices, dtype=tipo_indice),
+                np.array(indptr, dtype=tipo_indice)
+            ),
+            shape=(len(indptr) - 1, len(vocabulario))
+        )
+        if self.binary:
+            x.data.fill(1)
+        return x
+
+    def salvar(self, filename: str):
+        """Armazena o vocabulário e a configuração em um arquivo `.npz` comprimido"""
+        termos = np.empty(len(self.vocabulario), dtype=object)
+        for termo, i in self.vocabulario.items():
+            termos[i] = termo
+
+        np.savez_compressed(
+            filename,
+            termos=termos.astype(str),
+            token_pattern=np.array(self.token_pattern),
+            lowercase=np.array(self.lowercase),
+            strip_accents=np.array(self.strip_accents or ''),
+            binary=np.array(self.binary),
+            dtype=np.array(self.dtype.str)
+        )
+
+    @classmethod
+    def carregar(cls, filename: str) -> 'VetorizadorRapido':
+        with np.load(filename, allow_pickle=False) as arquivo:
+            return cls(
+                vocabulario={str(termo): i for i, termo in enumerate(arquivo['termos'])},
+                token_pattern=str(arquivo['token_pattern']),
+                lowercase=bool(arquivo['lowercase']),
+                strip_accents=str(arquivo['strip_accents']) or None,
+                binary=bool(arquivo['binary']),
+                dtype=np.dtype(str(arquivo['dtype']))
+            )
+
+
+def _murmurhash3_32(dados: bytes, semente: int = 0) -> int:
+    """MurmurHash3 (x86, 32 bits) com sinal, o mesmo de `sklearn.utils.murmurhash3_32`"""
+    mascara = 0xffffffff
+    c1, c2 = 0xcc9e2d51, 0x1b873593
+    h = semente
+    blocos = len(dados) // 4
+
+    for (k,) in struct.iter_unpack('<I', dados[:blocos * 4]):
+        k = (k * c1) & mascara
+        k = ((k << 15) | (k >> 17)) & mascara
+        h ^= (k * c2) & mascara
+        h = ((h << 13) | (h >> 19)) & mascara
+        h = (h * 5 + 0xe6546b64) & mascara
+
+    cauda = dados[blocos * 4:]
+    if cauda:
+        k = int.from_bytes(cauda, 'little')
+        k = (k * c1) & mascara
+        k = ((k << 15) | (k >> 17)) & mascara
+        h ^= (k * c2) & mascara
+
+    h ^= len(dados)
+    h ^= h >> 16
+    h = (h * 0x85ebca6b) & mascara
+    h ^= h >> 13
+    h = (h * 0xc2b2ae35) & mascara
+    h ^= h >> 16
+    return h - (1 << 32) if h & 0x80000000 else h
+
+
+class VetorizadorHash:
+    """
+    Substituto do `HashingVectorizer` (usado no treino incremental), sem depender do sklearn.
+
+    Produz exatamente a mesma matriz que `HashingVectorizer.transform`, com `norm=None`, para a mesma
+    configuração suportada pelo `VetorizadorRapido`. Como não há vocabulário, as stopwords são guardadas
+    e removidas explicitamente. O hash de cada palavra é guardado em cache.
+    """
+
+    def __init__(
+            self,
+            n_features: int,
+            stopwords: Iterable[str] = (),
+            token_pattern: str = r"(?u)\b\w\w+\b",
+            lowercase: bool = True,
+            strip_accents: str | None = 'unicode',
+            binary: bool = False,
+            alternate_sign: bool = False,
+            dtype=np.float64
+    ):
+        if strip_accents not in (None, 'unicode', 'ascii'):
+            raise ValueError(f"strip_accents não suportado: {strip_accents}")
+
+        self.n_features = int(n_features)
+        self.stopwords = frozenset(stopwords)
+        self.token_pattern = token_pattern
+        self.lowercase = lowercase
+        self.strip_accents = strip_accents
+        self.binary = binary
+        self.alternate_sign = alternate_sign
+        self.dtype = np.dtype(dtype)
+
+        self._findall = re.compile(token_pattern).findall
+        self._tabela = _TabelaAcentos(strip_accents) if strip_accents is not None else None
+        self._coluna = lru_cache(maxsize=1 << 18)(self._calcular_coluna)
+
+    @classmethod
+    def de_hashing_vectorizer(cls, vec) -> 'VetorizadorHash':
+        """
+        Cria um `VetorizadorHash` a partir de um `HashingVectorizer`.
+
+        Caso o vetorizador use alguma opção não suportada, será levantada uma exceção `ValueError`
+        """
+        if vec.analyzer != 'word' or tuple(vec.ngram_range) != (1, 1) or vec.norm is not None \
+                or vec.tokenizer is not None or vec.preprocessor is not None or vec.input != 'content':
+            raise ValueError("Configuração do HashingVectorizer não suportada")
+
+        if callable(vec.strip_accents) or isinstance(vec.stop_words, str):
+            raise ValueError("strip_accents ou stop_words não suportados")
+
+        return cls(
+            n_features=vec.n_features,
+            stopwords=vec.stop_words or (),
+            token_pattern=vec.token_pattern,
+            lowercase=vec.lowercase,
+            strip_accents=vec.strip_accents,
+            binary=vec.binary,
+            alternate_sign=vec.alternate_sign,
+            dtype=vec.dtype
+        )
+
+    def _calcular_coluna(self, token: str):
+        h = _murmurhash3_32(token.encode('utf-8'))
+        coluna = (2147483647 - (self.n_features - 1)) % self.n_features if h == -2147483648 \
+            else abs(h) % self.n_features
+        sinal = -1 if self.alternate_sign and h < 0 else 1
+        return coluna, sinal
+
+    def _preprocessar(self, texto: str) -> str:
+        if self.lowercase:
+            texto = texto.lower()
+        if self._tabela is not None and not texto.isascii():
+            texto = self._tabela.remover(texto)
+        return texto
+
+    def transform(self, textos: Iterable[str]) -> csr_matrix:
+        """Igual a `HashingVectorizer.transform`"""
+        if isinstance(textos, str):
+            raise ValueError("Esperado um iterável de textos, porém recebeu um único texto")
+
+        stopwords = self.stopwords
+        coluna = self._coluna
+
+        indices = []
+        valores = []
+        indptr = [0]
+
+        for texto in textos:
+            contagem: Dict[int, int] = {}
+            for token in self._findall(self._preprocessar(texto)):
+                if token in stopwords:
+                    continue
+                j, sinal = coluna(token)
+                contagem[j] = contagem.get(j, 0) + sinal
+
+            colunas = sorted(j for j, v in contagem.items() if v != 0)
+            indices.extend(colunas)
+            valores.extend([contagem[j] for j in colunas])
+            indptr.append(len(indices))
+
+        tipo_indice = np.int32 if indptr[-1] <= np.iinfo(np.int32).max else np.int64
+        x = csr_matrix(
+            (
+                np.array(valores, dtype=self.dtype),
+                np.array(indices, dtype=tipo_indice),
+                np.array(indptr, dtype=tipo_indice)
+            ),
+            shape=(len(indptr) - 1, self.n_features)
+        )
+        if self.binary:
+            x.data.fill(1)
+        return x
+
+    def salvar(self, filename: str):
+        """Armazena a configuração e as stopwords em um arquivo `.npz` comprimido"""
+        np.savez_compressed(
+            filename,
+            n_features=np.array(self.n_features),
+            stopwords=np.array(sorted(self.stopwords), dtype=str),
+            token_pattern=np.array(self.token_pattern),
+            lowercase=np.array(self.lowercase),
+            strip_accents=np.array(self.strip_accents or ''),
+            binary=np.array(self.binary),
+            alternate_sign=np.array(self.alternate_sign),
+            dtype=np.array(self.dtype.str)
+        )
+
+    @classmethod
+    def carregar(cls, filename: str) -> 'VetorizadorHash':
+        with np.load(filename, allow_pickle=False) as arquivo:
+            return cls(
+                n_features=int(arquivo['n_features']),
+                stopwords=[str(p) for p in arquivo['stopwords']],
+                token_pattern=str(arquivo['token_pattern']),
+                lowercase=bool(arquivo['lowercase']),
+                strip_accents=str(arquivo['strip_accents']) or None,
+                binary=bool(arquivo['binary']),
+                alternate_sign=bool(arquivo['alternate_sign']),
+                dtype=np.dtype(str(arquivo['dtype']))
+            )
@@ -1,18 +1,44 @@
-import json
+import logging
 import socketserver
+from collections import OrderedDict
 from threading import Lock
 from time import perf_counter
 from termcolor import colored
-from keras.models import Sequential
-from sklearn.feature_extraction.text import CountVectorizer
 
-from rede_neural import classificar
+from rede_neural.cache import CachePredicoes
+from rede_neural.carregamento import Modelo, Vetorizador
+from rede_neural.utilizacao import _converte_dicionario, _montar_resultado, _predizer, _predizer_com_cache
+from admissao import ControleAdmissao, Rejeitada, calcular_prazo, expirado
+from agrupador import Agrupador
+from codificacao import JSON, Formato, obter_formato
+from instrumentacao import ERROS, LATENCIA, LOTE, PRODUCOES, REJEICOES, REQUISICOES, Indicador, cronometrar
 
 modelo = None
 vectorizer = None
 porta = None
+agrupador: Agrupador | None = None
+cache: CachePredicoes | None = None
+formato: Formato = JSON
+admissao: ControleAdmissao | None = None
+prazo_ms: float | None = None           # prazo padrão de cada requisição, contado desde a sua chegada
+tempo_limite: float | None = None       # tempo máximo (s) esperando o cliente, em cada leitura ou escrita no socket
 lock = Lock()
 
+# mensagens de cada requisição. As mensagens de início e fim do servidor continuam no console
+log = logging.getLogger('nima')
+
+Indicador('nima_cache_itens', 'Resultados guardados no cache', lambda: len(cache) if cache is not None else None)
+Indicador('nima_cache_acertos_total', 'Produções respondidas pelo cache',
+          lambda: cache.acertos if cache is not None else None, tipo='counter')
+Indicador('nima_cache_falhas_total', 'Produções que não estavam no cache',
+          lambda: cache.falhas if cache is not None else None, tipo='counter')
+Indicador('nima_cache_remocoes_total', 'Resultados removidos do cache, por falta de espaço ou validade vencida',
+          lambda: cache.remocoes if cache is not None else None, tipo='counter')
+Indicador('nima_admissao_producoes', 'Produções admitidas e ainda não respondidas',
+          lambda: admissao.em_andamento if admissao is not None else None)
+Indicador('nima_admissao_fila', 'Requisições esperando para serem admitidas',
+          lambda: admissao.na_fila if admissao is not None else None)
+
 
 def print_blue(*args): print(colored(' '.join([str(a) for a in args]), 'blue'))
 
@@ -23,52 +49,225 @@ def print_red(*args): print(colored(' '.join([str(a) for a in args]), 'red'))
 def print_green(*args): print(colored(' '.join([str(a) for a in args]), 'green'))
 
 
+def modelos_definidos() -> bool:
+    return hasattr(modelo, 'predict') and hasattr(vectorizer, 'transform')
+
+
+def processar(data_dict: dict, prazo: float | None = None) -> dict:
+    """
+    Classifica os dados de uma requisição ja decodificada.
+
+    Usa o `agrupador` se ele estiver configurado, ou então classifica diretamente, protegido por `lock`.
+    Se o controle de `admissao` estiver configurado, a requisição antes espera a sua vez (veja
+    `ControleAdmissao`). `prazo` é o instante (em `perf_counter`) a partir do qual ela não é mais classificada.
+
+    :raise ValueError, TypeError: se os dados não estiverem em algum dos formatos aceitos
+    :raise Rejeitada: se a requisição não for admitida, ou o prazo acabar antes da inferência
+    """
+    with cronometrar('converter'):
+        dados = _converte_dicionario(data_dict)
+    return classificar_convertidos(dados, prazo)
+
+
+def classificar_convertidos(dados: OrderedDict, prazo: float | None = None) -> dict:
+    """Igual a `processar`, para dados ja convertidos por `_converte_dicionario`"""
+    if admissao is None:
+        return _classificar(dados, prazo)
+
+    with admissao.admitir(len(dados), prazo):
+        return _classificar(dados, prazo)
+
+
+def _classificar(dados: OrderedDict, prazo: float | None) -> dict:
+    PRODUCOES.incrementar(len(dados))
+
+    if agrupador is not None:
+        pedido = agrupador.submeter(dados, prazo)
+        res = pedido.futuro.result()
+        log.debug("Fila: %.2f ms  Inferência: %.2f ms  Lote: %d",
+                  pedido.tempo_fila_ms, pedido.tempo_inferencia_ms, pedido.tamanho_lote)
+        return res
+
+    # sem o agrupador, a requisição espera o `lock` somente até o fim do prazo
+    if expirado(prazo) or not lock.acquire(timeout=-1 if prazo is None else max(prazo - perf_counter(), 0)):
+        raise Rejeitada('prazo')
+    try:
+        tempos = {}
+        textos = list(dados.values())
+        try:
+            if cache is not None:
+                resultados = _predizer_com_cache(modelo, vectorizer, textos, cache, tempos)
+            else:
+                resultados = _predizer(modelo, vectorizer, textos, tempos)
+        except Exception:
+            ERROS.incrementar(valor_rotulo='modelo')
+            raise
+    finally:
+        lock.release()
+
+    if tempos:
+        LOTE.observar(len(textos))
+    for etapa, segundos in tempos.items():
+        LATENCIA.observar(segundos, etapa)
+
+    return _montar_resultado(dados.keys(), resultados)
+
+
+def decodificar(data: bytes) -> dict | None:
+    """Decodifica uma requisição, no `formato` do servidor. :return: o dicionario, ou None se for inválido"""
+    try:
+        with cronometrar('decodificar'):
+            data_dict = formato.decodificar(data)
+    except ValueError:
+        ERROS.incrementar(valor_rotulo='json')
+        log.warning("Erro decodificando requisição (%d bytes, formato %s)", len(data), formato.nome)
+        return None
+
+    if not isinstance(data_dict, dict):
+        ERROS.incrementar(valor_rotulo='formato')
+        log.warning("Requisição não é um objeto")
+        return None
+
+    return data_dict
+
+
+def responder(data: bytes, prazo: float | None = None) -> bytes:
+    """
+    Decodifica, classifica e codifica a resposta de uma requisição. Uma requisição inválida, ou rejeitada
+    pelo controle de admissão, recebe a resposta de erro do formato (`Formato.erro`).
+
+    :param prazo: veja `processar`
+    """
+    REQUISICOES.incrementar()
+
+    data_dict = decodificar(data)
+    if data_dict is None:
+        return formato.erro
+
+    try:
+        res = processar(data_dict, prazo)
+    except Rejeitada as e:
+        REJEICOES.incrementar(valor_rotulo=e.motivo)
+        log.warning("Requisição com %d produções rejeitada (%s)", len(data_dict), e.motivo)
+        return formato.erro
+    except (ValueError, TypeError) as e:
+        ERROS.incrementar(valor_rotulo='formato')
+        log.warning("Dados em formato inválido: %r", e)
+        return formato.erro
+    except Exception as e:     # ja contado como erro do modelo
+        log.error("Erro classificando: %r", e)
+        return formato.erro
+
+    with cronometrar('codificar'):
+        return formato.codificar(res)
+
+
 class TCPHandler(socketserver.BaseRequestHandler):
 
     def handle(self):
-        if not (isinstance(modelo, Sequential) and isinstance(vectorizer, CountVectorizer)):
+        if not modelos_definidos():
             print_red("Abortando, pois modelo ou vectorizer não foram definidos")
             return
 
-        data = self.request.recv(4096).decode('utf-8')
-        print_blue(f"\n\nRecebi algum dado: ", data[:20])
         tempo_inicial = perf_counter()
-
+        prazo = calcular_prazo(prazo_ms, tempo_inicial)
+        self.request.settimeout(tempo_limite)
         try:
-            data_dict = json.loads(data)
-            print_blue("\tJSON decodificado com sucesso:")
-            print_green(f"\t\t{str(data_dict)[:40]}...")
-        except json.JSONDecodeError:
-            print_red("  Erro decodificando JSON")
-            data_dict = None
-
-        # processando
-        res: dict = {}
-        if data_dict is not None:
-            print_blue("Executando rede neural")
-            with lock:
-                res = classificar(
-                    model=modelo,
-                    vec=vectorizer,
-                    dados=data_dict
-                )
-
-        # enviando resposta de volta
-        res_em_string = json.dumps(res)
-        print_blue("Enviando resposta: ")
-        print_green(f"\t{res_em_string[:40]}...")
-
-        self.request.sendall(res_em_string.encode('utf-8'))
-        tempo_decorrido_ms = (perf_counter() - tempo_inicial) * 1000
-        print(colored("Tempo de execução: ", 'blue'), colored(f"{tempo_decorrido_ms} ms", 'yellow'))
-
-
-def configurar(m: Sequential, v: CountVectorizer, porta_server):
-    global modelo, vectorizer, porta
+            with cronometrar('receber'):
+                data = self.request.recv(4096)
+
+            res = responder(data, prazo)
+
+            with cronometrar('enviar'):
+                self.request.sendall(res)
+        except TimeoutError:
+            ERROS.incrementar(valor_rotulo='tempo_esgotado')
+            log.warning("Cliente parado por mais de %s s, fechando a conexão", tempo_limite)
+            return
+        except ConnectionError as e:
+            ERROS.incrementar(valor_rotulo='conexao')
+            log.warning("Conexão perdida: %r", e)
+            return
+
+        tempo_decorrido = perf_counter() - tempo_inicial
+        LATENCIA.observar(tempo_decorrido, 'total')
+        log.info("Requisição de %d bytes respondida em %.2f ms", len(data), tempo_decorrido * 1000)
+
+
+def configurar(
+        m: Modelo,
+        v: Vetorizador,
+        porta_server,
+        lote_max: int = 256,
+        espera_max_ms: float = 5.0,
+        tamanho_cache: int = 0,
+        ttl_cache: float | None = None,
+        versao: str = '',
+        nome_formato: str = 'json',
+        max_producoes: int = 0,
+        max_fila: int = 64,
+        prazo_requisicao_ms: float | None = None,
+        tempo_limite_socket: float | None = None
+):
+    """
+    Define o modelo, o vetorizador e a porta do servidor.
+
+    Se `lote_max` for maior que zero, as requisições são agrupadas por um `Agrupador`, que
+    junta até `lote_max` produções (ou espera até `espera_max_ms`) em uma única predição.
+    Caso contrário, cada requisição é classificada separadamente.
+
+    Se `tamanho_cache` for maior que zero, os resultados de até `tamanho_cache` textos são guardados
+    em um `CachePredicoes`, por no máximo `ttl_cache` segundos. O cache é invalidado sempre que o
+    servidor é configurado novamente; `versao` identifica o modelo e o vetorizador carregados.
+
+    `nome_formato` escolhe como as requisições e respostas são codificadas (veja `codificacao.FORMATOS`).
+
+    Se `max_producoes` for maior que zero, no máximo essa quantidade de produções é classificada ao mesmo
+    tempo, e até `max_fila` requisições esperam a sua vez; as demais são rejeitadas (veja `ControleAdmissao`).
+    Cada requisição tem `prazo_requisicao_ms` para ser classificada, desde a sua chegada, e cada leitura ou
+    escrita no socket espera o cliente por no máximo `tempo_limite_socket` segundos. None desativa os limites.
+
+    :raise ValueError: se o formato não estiver disponível
+    """
+    global modelo, vectorizer, porta, agrupador, cache, formato, admissao, prazo_ms, tempo_limite
+    formato = obter_formato(nome_formato)
+    admissao = ControleAdmissao(max_producoes, max_fila) if max_producoes > 0 else None
+    prazo_ms = prazo_requisicao_ms
+    tempo_limite = tempo_limite_socket
     modelo = m
     vectorizer = v
     porta = porta_server
 
+    if cache is not None:
+        cache.invalidar(versao)
+    if tamanho_cache > 0:
+        if cache is None:
+            cache = CachePredicoes(tamanho_cache, ttl_cache, versao)
+        else:
+            cache.tamanho_max, cache.ttl = tamanho_cache, ttl_cache
+    else:
+        cache = None
+
+    if agrupador is not None:
+        agrupador.fechar()
+    agrupador = Agrupador(m, v, lote_max, espera_max_ms, cache) if lote_max > 0 else None
+
+
+def trocar_modelos(m: Modelo, v: Vetorizador, versao: str = ''):
+    """
+    Troca o modelo e o vetorizador com o servidor em execução, mantendo o resto da configuração.
+
+    As requisições que ja estão sendo classificadas terminam com o par antigo. O cache é invalidado.
+    """
+    global modelo, vectorizer
+    with lock:     # espera a classificação direta em andamento
+        modelo, vectorizer = m, v
+        if agrupador is not None:
+            agrupador.trocar(m, v)
+        # somente depois de trocar o modelo (veja `Agrupador._executar`)
+        if cache is not None:
+            cache.invalidar(versao)
+
 
 def server_loop():
     if not isinstance(porta, int):
@@ -76,7 +275,7 @@ def server_loop():
         return
 
     CONNECTION = "", porta
-    with socketserver.TCPServer(CONNECTION, TCPHandler) as server:
+    with socketserver.ThreadingTCPServer(CONNECTION, TCPHandler) as server:
         print_blue(f"Servidor ouvindo em {server.server_address}")
         try:
             server.serve_forever()  # can only be stopped by CTRL+C
@@ -0,0 +1,136 @@
+import asyncio
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+import server
+from admissao import calcular_prazo
+from server import print_blue, print_red
+from instrumentacao import ERROS, LATENCIA, cronometrar
+
+ENQUADRAMENTOS = ('linha', 'tamanho')
+
+# prefixo de 4 bytes (big endian) com o tamanho do quadro, no enquadramento 'tamanho'
+_PREFIXO = struct.Struct('!I')
+
+
+async def _ler_quadro(reader: asyncio.StreamReader, enquadramento: str) -> bytes | None:
+    """
+    Lê um quadro (uma requisição) da conexão.
+
+    No enquadramento 'linha', cada requisição é um JSON terminado por '\\n'. No enquadramento
+    'tamanho', cada requisição é precedida por 4 bytes com o seu tamanho.
+
+    O quadro é lido incrementalmente, então não há limite de tamanho além da memória.
+
+    :return: os bytes do quadro, ou None se a conexão foi fechada
+    """
+
+    if enquadramento == 'tamanho':
+        try:
+            cabecalho = await reader.readexactly(_PREFIXO.size)
+            return await reader.readexactly(_PREFIXO.unpack(cabecalho)[0])
+        except asyncio.IncompleteReadError:
+            return None
+
+    partes = []
+    while True:
+        try:
+            partes.append(await reader.readuntil(b'\n'))
+            return b''.join(partes)
+        except asyncio.LimitOverrunError as e:     # linha maior que o buffer, consome o que ja chegou
+            partes.append(await reader.readexactly(e.consumed))
+        except asyncio.IncompleteReadError as e:   # conexão fechada, talvez sem o '\n' final
+            partes.append(e.partial)
+            quadro = b''.join(partes)
+            return quadro if quadro.strip() else None
+
+
+def _enquadrar(res: bytes, enquadramento: str) -> bytes:
+    if enquadramento == 'tamanho':
+        return _PREFIXO.pack(len(res)) + res
+    return res + b'\n'
+
+
+def _criar_atendimento(enquadramento: str, executor: ThreadPoolExecutor):
+
+    async def atender(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Atende uma conexão persistente, que pode enviar várias requisições em sequência.
+
+        A conexão é fechada se o cliente ficar mais de `server.tempo_limite` segundos sem enviar uma
+        requisição inteira, ou sem receber a resposta.
+        """
+        endereco = writer.get_extra_info('peername')
+        server.log.debug("Nova conexão: %s", endereco)
+        loop = asyncio.get_running_loop()
+
+        try:
+            while (quadro := await asyncio.wait_for(_ler_quadro(reader, enquadramento), server.tempo_limite)) \
+                    is not None:
+                if not quadro.strip():
+                    continue
+
+                # decodificação, classificação e codificação, fora do event loop. O prazo conta desde a chegada,
+                # inclusive o tempo esperando por uma thread livre
+                tempo_inicial = perf_counter()
+                prazo = calcular_prazo(server.prazo_ms, tempo_inicial)
+                res = await loop.run_in_executor(executor, server.responder, quadro, prazo)
+
+                with cronometrar('enviar'):
+                    writer.write(_enquadrar(res, enquadramento))
+                    await asyncio.wait_for(writer.drain(), server.tempo_limite)
+
+                tempo_decorrido = perf_counter() - tempo_inicial
+                LATENCIA.observar(tempo_decorrido, 'total')
+                server.log.info("Requisição de %d bytes respondida em %.2f ms", len(quadro), tempo_decorrido * 1000)
+        except asyncio.TimeoutError:
+            ERROS.incrementar(valor_rotulo='tempo_esgotado')
+            server.log.warning("Cliente parado por mais de %s s, fechando a conexão: %s",
+                               server.tempo_limite, endereco)
+        except ConnectionError as e:
+            ERROS.incrementar(valor_rotulo='conexao')
+            server.log.warning("Conexão perdida: %s (%r)", endereco, e)
+        finally:
+            writer.close()
+
+    return atender
+
+
+async def _servir(enquadramento: str, trabalhadores: int):
+    executor = ThreadPoolExecutor(max_workers=trabalhadores, thread_name_prefix='inferencia')
+    s = await asyncio.start_server(_criar_atendimento(enquadramento, executor), host="", port=server.porta)
+
+    print_blue(f"Servidor (asyncio, enquadramento '{enquadramento}') ouvindo em "
+               f"{[sock.getsockname() for sock in s.sockets]}")
+    try:
+        async with s:
+            await s.serve_forever()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def server_loop_async(enquadramento: str = 'linha', trabalhadores: int = 8):
+    """
+    Igual a `server.server_loop`, porém usando asyncio.
+
+    As conexões são persistentes, e cada uma pode carregar várias requisições, separadas pelo
+    `enquadramento` escolhido ('linha' ou 'tamanho'). A classificação é executada em um pool de
+    `trabalhadores` threads, então o servidor continua aceitando conexões enquanto o modelo trabalha.
+    """
+    if not isinstance(server.porta, int):
+        print_red("Abortando, porta do servidor não foi definida")
+        return
+
+    if not server.modelos_definidos():
+        print_red("Abortando, pois modelo ou vectorizer não foram definidos")
+        return
+
+    if enquadramento not in ENQUADRAMENTOS:
+        print_red(f"Abortando, enquadramento desconhecido: {enquadramento}")
+        return
+
+    try:
+        asyncio.run(_servir(enquadramento, trabalhadores))
+    except KeyboardInterrupt:
+        print_blue("Fechando servidor")
@@ -0,0 +1,250 @@
+import gzip
+import zlib
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from time import perf_counter
+
+import server
+from admissao import Rejeitada, calcular_prazo, ler_prazo_ms
+from codificacao import JSON
+from instrumentacao import ERROS, LATENCIA, REJEICOES, REQUISICOES, cronometrar
+from rede_neural.utilizacao import _converte_item
+
+# respostas menores que isso (em bytes) não são comprimidas
+TAMANHO_MIN_GZIP = 1024
+
+# tamanho máximo do corpo de uma requisição, em bytes, depois de descomprimido
+TAMANHO_MAX_CORPO = 64 * 1024 * 1024
+
+
+def descomprimir_gzip(dados: bytes, limite: int) -> bytes | None:
+    """
+    Descomprime `dados` (um ou mais membros gzip, como `gzip.decompress`), parando assim que passar de
+    `limite` bytes, para que um corpo pequeno não ocupe uma quantidade de memória arbitrária.
+
+    :return: os dados descomprimidos, ou None se passarem de `limite` bytes
+    :raise zlib.error: se os dados não forem gzip válido
+    :raise EOFError: se os dados estiverem truncados
+    """
+    partes = []
+    total = 0
+    while dados:
+        descompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        parte = descompressor.decompress(dados, limite - total + 1)
+        total += len(parte)
+        if total > limite:
+            return None
+        if not descompressor.eof:
+            raise EOFError('corpo gzip truncado')
+        partes.append(parte)
+        dados = descompressor.unused_data
+    return b''.join(partes)
+
+
+def classificar_itens(data_dict: dict, prazo: float | None = None) -> dict:
+    """
+    Classifica cada produção da requisição, separando as que não estão em nenhuma das três formas aceitas.
+
+    :param prazo: veja `server.processar`
+    :raise Rejeitada: se a requisição não for admitida, ou o prazo acabar antes da inferência
+
+    :return: um dicionario na forma { 'resultados': { 'ident': 0.23, ... }, 'erros': { 'ident': 'mensagem', ... } }
+    """
+    dados = OrderedDict()
+    erros = {}
+    with cronometrar('converter'):
+        for chave, valor in data_dict.items():
+            try:
+                dados[chave] = _converte_item(valor)
+            except (ValueError, TypeError) as e:
+                erros[chave] = str(e) or type(e).__name__
+
+    if erros:
+        ERROS.incrementar(len(erros), 'formato')
+
+    return {
+        'resultados': server.classificar_convertidos(dados, prazo) if dados else {},
+        'erros': erros
+    }
+
+
+class TratadorHTTP(BaseHTTPRequestHandler):
+    """
+    Interface HTTP/1.1 do servidor, com conexões persistentes (keep-alive):
+
+        POST /classificar   corpo: o mesmo JSON aceito pelo servidor TCP
+        GET  /saude         verifica se o modelo está carregado
+
+    Corpos comprimidos com gzip são aceitos (`Content-Encoding: gzip`), e as respostas são comprimidas
+    se o cliente aceitar (`Accept-Encoding: gzip`).
+
+    Respostas de erro enviadas antes de ler o corpo fecham a conexão (`Connection: close`), pois o corpo não
+    lido ficaria no lugar da próxima requisição. Corpos com mais de `TAMANHO_MAX_CORPO` bytes (depois de
+    descomprimidos) recebem `413`.
+
+    O cabeçalho `X-Prazo-Ms` define o prazo da requisição, em vez do prazo padrão do servidor. Requisições
+    rejeitadas pelo controle de admissão recebem `503` (com `Retry-After`), ou `413` se forem grandes demais.
+    """
+
+    protocol_version = 'HTTP/1.1'
+    server_version = 'NimaPredict'
+
+    @property
+    def timeout(self) -> float:
+        """Fecha conexões paradas há mais de `server.tempo_limite` segundos (ou um minuto, se não definido)"""
+        return server.tempo_limite if server.tempo_limite is not None else 60
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/saude':
+            self._responder(404, {'erro': 'caminho não encontrado'})
+            return
+
+        definidos = server.modelos_definidos()
+        self._responder(200 if definidos else 503, {'modelo_carregado': definidos})
+
+    def do_POST(self):
+        if self.path.split('?')[0] != '/classificar':
+            self._responder(404, {'erro': 'caminho não encontrado'})
+            return
+
+        tempo_inicial = perf_counter()
+        REQUISICOES.incrementar()
+
+        if not server.modelos_definidos():
+            self._recusar(503, {'erro': 'modelo ou vetorizador não definidos'})
+            return
+
+        prazo_ms = self.headers.get('X-Prazo-Ms')
+        try:
+            prazo = calcular_prazo(ler_prazo_ms(prazo_ms) if prazo_ms is not None else server.prazo_ms, tempo_inicial)
+        except ValueError:
+            self._recusar(400, {'erro': 'X-Prazo-Ms inválido, deve ser um número (ms) finito e não negativo'})
+            return
+
+        corpo = self._ler_corpo()
+        if corpo is None:
+            return
+
+        try:
+            with cronometrar('decodificar'):
+                data_dict = JSON.decodificar(corpo)
+        except ValueError:
+            ERROS.incrementar(valor_rotulo='json')
+            self._responder(400, {'erro': 'JSON inválido'})
+            return
+
+        if not isinstance(data_dict, dict):
+            ERROS.incrementar(valor_rotulo='formato')
+            self._responder(400, {'erro': 'o JSON deve ser um objeto'})
+            return
+
+        try:
+            res = classificar_itens(data_dict, prazo)
+        except Rejeitada as e:
+            REJEICOES.incrementar(valor_rotulo=e.motivo)
+            server.log.warning("Requisição HTTP com %d produções rejeitada (%s)", len(data_dict), e.motivo)
+            if e.motivo == 'tamanho':
+                self._responder(413, {'erro': 'produções demais em uma requisição', 'motivo': e.motivo})
+            else:
+                self._responder(503, {'erro': 'servidor sobrecarregado', 'motivo': e.motivo}, {'Retry-After': '1'})
+            return
+        except Exception as e:     # ja contado como erro do modelo
+            server.log.error("Erro classificando: %r", e)
+            self._responder(500, {'erro': 'erro classificando'})
+            return
+
+        self._responder(200, res)
+
+        tempo_decorrido = perf_counter() - tempo_inicial
+        LATENCIA.observar(tempo_decorrido, 'total')
+        server.log.info("Requisição HTTP com %d produções respondida em %.2f ms",
+                        len(data_dict), tempo_decorrido * 1000)
+
+    def _ler_corpo(self) -> bytes | None:
+        """Lê o corpo da requisição, descomprimindo se necessário. Em caso de erro, responde e retorna None"""
+        tamanho = self.headers.get('Content-Length')
+        if tamanho is None or not tamanho.isdigit():
+            self._recusar(411, {'erro': 'Content-Length obrigatório'})
+            return None
+
+        if int(tamanho) > TAMANHO_MAX_CORPO:
+            self._corpo_grande_demais()
+            return None
+
+        try:
+            with cronometrar('receber'):
+                corpo = self.rfile.read(int(tamanho))
+        except TimeoutError:
+            ERROS.incrementar(valor_rotulo='tempo_esgotado')
+            server.log.warning("Cliente parado por mais de %s s, fechando a conexão", self.timeout)
+            self.close_connection = True
+            return None
+
+        codificacao = self.headers.get('Content-Encoding', 'identity').lower()
+        if codificacao == 'gzip':
+            try:
+                corpo = descomprimir_gzip(corpo, TAMANHO_MAX_CORPO)
+            except (zlib.error, EOFError):
+                ERROS.incrementar(valor_rotulo='gzip')
+                self._responder(400, {'erro': 'corpo gzip inválido'})
+                return None
+            if corpo is None:
+                self._corpo_grande_demais()
+                return None
+        elif codificacao != 'identity':
+            self._responder(415, {'erro': f'Content-Encoding não suportado: {codificacao}'})
+            return None
+
+        return corpo
+
+    def _corpo_grande_demais(self):
+        ERROS.incrementar(valor_rotulo='tamanho')
+        self._recusar(413, {'erro': f'corpo maior que {TAMANHO_MAX_CORPO} bytes'})
+
+    def _recusar(self, status: int, res: dict, cabecalhos: dict | None = None):
+        """Responde e fecha a conexão, pois o corpo da requisição pode não ter sido lido"""
+        self._responder(status, res, {**(cabecalhos or {}), 'Connection': 'close'})
+
+    def _responder(self, status: int, res: dict, cabecalhos: dict | None = None):
+        with cronometrar('codificar'):
+            corpo = JSON.codificar(res)
+            comprimir = len(corpo) >= TAMANHO_MIN_GZIP and 'gzip' in self.headers.get('Accept-Encoding', '')
+            if comprimir:
+                corpo = gzip.compress(corpo, compresslevel=5)
+
+        try:
+            with cronometrar('enviar'):
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(corpo)))
+                if comprimir:
+                    self.send_header('Content-Encoding', 'gzip')
+                for nome, valor in (cabecalhos or {}).items():
+                    self.send_header(nome, valor)
+                self.end_headers()
+                self.wfile.write(corpo)
+        except TimeoutError:
+            ERROS.incrementar(valor_rotulo='tempo_esgotado')
+            server.log.warning("Cliente parado por mais de %s s, fechando a conexão", self.timeout)
+            self.close_connection = True
+        except ConnectionError as e:
+            ERROS.incrementar(valor_rotulo='conexao')
+            server.log.warning("Conexão perdida: %r", e)
+            self.close_connection = True
+
+    def log_message(self, formato, *args):
+        server.log.debug("HTTP %s: " + formato, self.address_string(), *args)
+
+
+def criar_servidor_http(porta: int, host: str = "") -> ThreadingHTTPServer:
+    """Cria (sem iniciar) o servidor HTTP, que usa o mesmo modelo, cache e agrupador do servidor TCP"""
+    servidor = ThreadingHTTPServer((host, porta), TratadorHTTP)
+    servidor.daemon_threads = True
+    return servidor
+
+
+def iniciar_em_segundo_plano(servidor: ThreadingHTTPServer):
+    """Atende o servidor HTTP em uma thread, enquanto o servidor TCP ocupa a thread principal"""
+    Thread(target=servidor.serve_forever, name='http', daemon=True).start()
+    server.print_blue(f"Servidor HTTP ouvindo em {servidor.server_address}")
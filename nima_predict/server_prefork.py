@@ -0,0 +1,151 @@
+import gc
+import os
+import signal
+import socketserver
+from http.server import ThreadingHTTPServer
+from threading import Thread
+from time import sleep
+
+import server
+from server import print_blue, print_red, TCPHandler
+from rede_neural import ModeloNumpy
+from recarga import Recarregador
+
+
+class _ServidorCompartilhado(socketserver.ThreadingTCPServer):
+    # varios processos aceitam conexões da mesma fila, que precisa ser maior que a padrão (5)
+    request_queue_size = 128
+
+
+def _trabalhador(s: socketserver.ThreadingTCPServer, http: ThreadingHTTPServer | None):
+    """Executado em cada processo filho: atende as conexões dos sockets compartilhados"""
+    signal.signal(signal.SIGTERM, signal.default_int_handler)   # SIGTERM vira KeyboardInterrupt
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)            # a recarga é feita pelo processo pai
+
+    # as threads do processo pai não existem aqui
+    if server.agrupador is not None:
+        server.agrupador.reiniciar()
+
+    if http is not None:
+        Thread(target=http.serve_forever, name='http', daemon=True).start()
+
+    try:
+        s.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        try:
+            s.server_close()    # espera as requisições em andamento
+        finally:
+            os._exit(0)
+
+
+def _filho_terminado() -> int:
+    """:return: o pid de um filho que terminou, ou 0 se nenhum terminou (ou não há mais filhos)"""
+    try:
+        return os.waitpid(-1, os.WNOHANG)[0]
+    except ChildProcessError:
+        return 0
+
+
+def _iniciar_trabalhador(s: socketserver.ThreadingTCPServer, http: ThreadingHTTPServer | None) -> int:
+    pid = os.fork()
+    if pid == 0:
+        _trabalhador(s, http)
+    return pid
+
+
+def server_loop_prefork(
+        processos: int,
+        recarregador: Recarregador | None = None,
+        http: ThreadingHTTPServer | None = None
+):
+    """
+    Igual a `server.server_loop`, porém com `processos` processos atendendo o mesmo socket.
+
+    O socket, o modelo e o vetorizador são criados uma única vez, antes de criar os processos. Os pesos
+    do modelo devem estar mapeados em memória (`carregar_modelo(..., mapear_memoria=True)`), e o restante
+    é compartilhado com os filhos (copy-on-write), então cada processo extra usa pouca memória.
+
+    Se `http` for definido (veja `server_http.criar_servidor_http`), cada processo também atende o servidor HTTP.
+
+    Com um `recarregador`, o novo modelo é carregado no processo pai, e os filhos são substituídos um a um:
+    cada filho antigo termina as requisições em andamento antes de sair.
+
+    O processo pai não tem nenhuma thread além da principal (a recarga é verificada no próprio laço, com
+    `Recarregador.verificar`), pois um `fork` com outras threads em andamento copia as travas que elas
+    estiverem segurando (da fila do agrupador, do stdout, do logging), e os filhos podem travar. As threads
+    (agrupador e HTTP) são criadas em cada filho.
+
+    Somente modelos exportados para NumPy (`.npz`) são suportados, pois o TensorFlow não funciona
+    depois de um `fork`. Somente em sistemas com `os.fork` (linux, mac).
+    """
+    if not hasattr(os, 'fork'):
+        print_red("Abortando, o modo com vários processos precisa de os.fork")
+        return
+
+    if not isinstance(server.porta, int):
+        print_red("Abortando, porta do servidor não foi definida")
+        return
+
+    if not isinstance(server.modelo, ModeloNumpy):
+        print_red("Abortando, o modo com vários processos precisa de um modelo exportado para NumPy (.npz)")
+        return
+
+    # o processo pai não classifica, então a thread do agrupador só existe nos filhos (veja `_trabalhador`)
+    if server.agrupador is not None:
+        server.agrupador.fechar()
+
+    if recarregador is not None:
+        recarregador.ao_carregar = server.trocar_modelos
+        recarregador.instalar_sinal()
+
+    CONNECTION = "", server.porta
+    with _ServidorCompartilhado(CONNECTION, TCPHandler) as s:
+        print_blue(f"Servidor ouvindo em {s.server_address}, com {processos} processos")
+
+        # move os objetos ja carregados para fora do coletor de lixo, para que ele
+        # não escreva nas páginas compartilhadas com os filhos
+        gc.freeze()
+
+        filhos = {_iniciar_trabalhador(s, http) for _ in range(processos)}
+        encerrando = set()      # filhos antigos, terminando depois de uma recarga
+
+        try:
+            while True:
+                if recarregador is not None:
+                    renovado = recarregador.verificar(espera=0.5)
+                else:
+                    sleep(0.5)
+                    renovado = False
+
+                if renovado:
+                    gc.freeze()
+                    print_blue(f"Substituindo {len(filhos)} processos pelo novo modelo")
+                    for pid in list(filhos):
+                        filhos.add(_iniciar_trabalhador(s, http))
+                        filhos.discard(pid)
+                        encerrando.add(pid)
+                        os.kill(pid, signal.SIGTERM)
+
+                while (pid := _filho_terminado()) != 0:
+                    if pid in encerrando:
+                        encerrando.discard(pid)
+                        continue
+                    filhos.discard(pid)
+                    print_red(f"Processo {pid} terminou, iniciando outro")
+                    filhos.add(_iniciar_trabalhador(s, http))
+
+        except KeyboardInterrupt:
+            print_blue("Fechando servidor")
+            for pid in filhos | encerrando:
+                try:
+                    os.kill(pid, signal.SIGTERM)
+                except ProcessLookupError:
+                    pass
+            for pid in filhos | encerrando:
+                try:
+                    os.waitpid(pid, 0)
+                except ChildProcessError:
+                    pass
@@ -0,0 +1,111 @@
+"""
+Controle de admissão do servidor (`admissao.ControleAdmissao`): limites, fila e ordem de chegada.
+
+    $ python -m pytest tests
+"""
+import sys
+import threading
+from contextlib import ExitStack
+from os import path
+from time import perf_counter, sleep
+
+import pytest
+
+sys.path.insert(0, path.join(path.dirname(path.abspath(__file__)), '..', 'nima_predict'))
+
+from admissao import ControleAdmissao, Rejeitada, ler_prazo_ms  # noqa: E402
+
+
+def _esperar_fila(controle: ControleAdmissao, quantidade: int):
+    limite = perf_counter() + 5
+    while controle.na_fila != quantidade:
+        assert perf_counter() < limite, f'{controle.na_fila} na fila, esperadas {quantidade}'
+        sleep(0.001)
+
+
+def _em_thread(controle: ControleAdmissao, nome: str, quantidade: int, ordem: list, liberar: threading.Event,
+               prazo: float | None = None) -> threading.Thread:
+    """Admite `quantidade` produções em outra thread, anota `nome` em `ordem` e segura até `liberar`"""
+    def executar():
+        try:
+            with controle.admitir(quantidade, prazo):
+                ordem.append(nome)
+                liberar.wait(5)
+        except Rejeitada as e:
+            ordem.append(f'{nome}:{e.motivo}')
+
+    thread = threading.Thread(target=executar)
+    thread.start()
+    return thread
+
+
+def test_admissao_na_ordem_de_chegada():
+    controle = ControleAdmissao(max_producoes=10)
+    ordem = []
+    liberar = threading.Event()
+
+    with ExitStack() as em_andamento:
+        em_andamento.enter_context(controle.admitir(9))
+        pequena = em_andamento.enter_context(ExitStack())
+        pequena.enter_context(controle.admitir(1))
+
+        grande = _em_thread(controle, 'grande', 10, ordem, liberar)
+        _esperar_fila(controle, 1)
+        seguinte = _em_thread(controle, 'seguinte', 1, ordem, liberar)
+        _esperar_fila(controle, 2)
+
+        # sobra espaço para a seguinte, mas a grande chegou antes
+        pequena.close()
+        sleep(0.05)
+        assert ordem == []
+        assert controle.em_andamento == 9
+
+    liberar.set()
+    grande.join()
+    seguinte.join()
+    assert ordem == ['grande', 'seguinte']
+    assert controle.em_andamento == 0 and controle.na_fila == 0
+
+
+def test_prazo_esgotado_na_fila_libera_a_proxima():
+    controle = ControleAdmissao(max_producoes=10)
+    ordem = []
+    liberar = threading.Event()
+
+    with controle.admitir(5):
+        apressada = _em_thread(controle, 'apressada', 10, ordem, liberar, prazo=perf_counter() + 0.05)
+        _esperar_fila(controle, 1)
+        seguinte = _em_thread(controle, 'seguinte', 5, ordem, liberar)
+        apressada.join()
+        seguinte.join(1)
+
+        assert ordem == ['apressada:prazo', 'seguinte']
+        liberar.set()
+        seguinte.join()
+
+    assert controle.em_andamento == 0 and controle.na_fila == 0
+
+
+def test_rejeicoes_por_tamanho_e_fila():
+    controle = ControleAdmissao(max_producoes=10, max_fila=1)
+    ordem = []
+    liberar = threading.Event()
+
+    with pytest.raises(Rejeitada, match='tamanho'):
+        controle._entrar(11, None)
+
+    with controle.admitir(10):
+        esperando = _em_thread(controle, 'esperando', 1, ordem, liberar)
+        _esperar_fila(controle, 1)
+        with pytest.raises(Rejeitada, match='fila'):
+            controle._entrar(1, None)
+
+    liberar.set()
+    esperando.join()
+    assert ordem == ['esperando']
+
+
+@pytest.mark.parametrize('texto', ['nan', 'inf', '-1', 'abc'])
+def test_prazo_invalido(texto):
+    with pytest.raises(ValueError):
+        ler_prazo_ms(texto)
@@ -0,0 +1,76 @@
+"""
+Cache de resultados do servidor (`rede_neural.cache.CachePredicoes`): validade, remoção LRU e versão.
+
+    $ python -m pytest tests
+"""
+import sys
+from os import path
+
+sys.path.insert(0, path.join(path.dirname(path.abspath(__file__)), '..', 'nima_predict'))
+
+from rede_neural import cache as modulo_cache  # noqa: E402
+from rede_neural.cache import CachePredicoes  # noqa: E402
+
+
+class _Relogio:
+    def __init__(self):
+        self.agora = 1000.0
+
+    def __call__(self) -> float:
+        return self.agora
+
+
+def test_validade_vencida(monkeypatch):
+    relogio = _Relogio()
+    monkeypatch.setattr(modulo_cache, 'monotonic', relogio)
+    cache = CachePredicoes(ttl=10)
+
+    cache.guardar(['texto'], [0.5])
+    relogio.agora += 9
+    assert cache.obter(['texto']) == [0.5]
+
+    relogio.agora += 2
+    assert cache.obter(['texto']) == [None]
+    assert len(cache) == 0
+    assert (cache.acertos, cache.falhas, cache.remocoes) == (1, 1, 1)
+
+
+def test_remocao_do_menos_usado():
+    cache = CachePredicoes(tamanho_max=2)
+    cache.guardar(['a', 'b'], [0.1, 0.2])
+    assert cache.obter(['a']) == [0.1]     # 'b' passa a ser o menos usado
+
+    cache.guardar(['c'], [0.3])
+    assert len(cache) == 2
+    assert cache.remocoes == 1
+    assert cache.obter(['a', 'b', 'c']) == [0.1, None, 0.3]
+
+
+def test_texto_normalizado():
+    cache = CachePredicoes()
+    cache.guardar(['  dois   espaços '], [0.7])
+    assert cache.obter(['dois espaços']) == [0.7]
+
+
+def test_nova_versao_descarta_resultados():
+    cache = CachePredicoes(versao='v1')
+    cache.guardar(['a'], [0.1])
+
+    cache.invalidar('v2')
+    assert cache.obter(['a']) == [None]
+
+    # calculado com o modelo antigo, terminando depois da troca
+    cache.guardar(['a'], [0.1], versao='v1')
+    assert cache.obter(['a']) == [None]
+
+    cache.guardar(['a'], [0.2], versao='v2')
+    assert cache.obter(['a']) == [0.2]
+
+
+def test_versao_faz_parte_da_chave():
+    antigo = CachePredicoes(versao='v1')
+    antigo.guardar(['a'], [0.1])
+
+    # sem `invalidar`, somente trocando a versão, os resultados antigos também não são encontrados
+    antigo.versao = 'v2'
+    assert antigo.obter(['a']) == [None]
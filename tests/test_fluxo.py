@@ -0,0 +1,67 @@
+"""
+Classificação em fluxo (`classificacao.fluxo`): a thread que coleta os lotes e a contagem do que foi armazenado.
+
+    $ python -m pytest tests
+"""
+import sys
+import threading
+from os import path
+from time import perf_counter, sleep
+
+import pytest
+
+sys.path.insert(0, path.join(path.dirname(path.abspath(__file__)), '..', 'nima_predict'))
+
+from classificacao.fluxo import classificar_lotes_em_fluxo, em_segundo_plano  # noqa: E402
+
+
+def _esperar(condicao, segundos: float = 5):
+    limite = perf_counter() + segundos
+    while not condicao():
+        assert perf_counter() < limite
+        sleep(0.01)
+
+
+def test_produtor_termina_quando_o_consumidor_para():
+    produzidos = []
+
+    def infinito():
+        i = 0
+        while True:
+            produzidos.append(i)
+            yield i
+            i += 1
+
+    with pytest.raises(RuntimeError):
+        for item in em_segundo_plano(infinito()):
+            if item == 3:
+                raise RuntimeError('consumidor falhou')
+
+    _esperar(lambda: not any(t.name == 'produtor' for t in threading.enumerate()))
+    quantidade = len(produzidos)
+    sleep(0.3)
+    assert len(produzidos) == quantidade
+
+
+def test_erro_do_produtor_repassado():
+    def com_erro():
+        yield 1
+        raise ValueError('coleta falhou')
+
+    with pytest.raises(ValueError, match='coleta falhou'):
+        list(em_segundo_plano(com_erro()))
+
+
+def test_quantidade_somente_dos_lotes_completos():
+    lotes = [(n, [(f'<p{n}-{i}>', 'texto') for i in range(10)]) for n in range(4)]
+    marcas = []
+
+    quantidade = classificar_lotes_em_fluxo(
+        lotes,
+        classificar_lote=lambda dados: {ident: 0.5 for ident in dados},
+        guardar=lambda resultados: not any(ident.startswith('<p1-') for ident in resultados),
+        ao_guardar=marcas.append
+    )
+
+    assert quantidade == 30
+    assert marcas == [0]
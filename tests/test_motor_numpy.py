@@ -0,0 +1,109 @@
+"""
+Paridade do motor NumPy (`rede_neural.motor_numpy.ModeloNumpy`) com o Keras, e a carga dos pesos exportados,
+inclusive mapeados em memória. Precisa do TensorFlow; sem ele, os testes são ignorados.
+
+    $ python -m pytest tests
+"""
+import os
+import sys
+from os import path
+
+import numpy as np
+import pytest
+from scipy import sparse
+
+sys.path.insert(0, path.join(path.dirname(path.abspath(__file__)), '..', 'nima_predict'))
+
+keras = pytest.importorskip('keras')
+
+from rede_neural.exportacao import exportar_numpy  # noqa: E402
+from rede_neural.motor_numpy import ModeloNumpy  # noqa: E402
+
+ENTRADAS = 200
+
+
+def _criar_modelo(saidas: int, ativacao: str):
+    keras.utils.set_random_seed(123)
+    return keras.Sequential([
+        keras.Input(shape=(ENTRADAS,)),
+        keras.layers.Dense(32, activation='relu'),
+        keras.layers.Dropout(0.5),
+        keras.layers.Dense(16, activation='relu'),
+        keras.layers.Dense(saidas, activation=ativacao),
+    ])
+
+
+def _entrada_esparsa(quantidade: int = 64) -> sparse.csr_matrix:
+    """Contagens de palavras, como as geradas pelo `CountVectorizer`, com algumas linhas vazias"""
+    rng = np.random.default_rng(7)
+    x = sparse.random(quantidade - 3, ENTRADAS, density=0.05, format='csr', random_state=7,
+                      data_rvs=lambda n: rng.integers(1, 4, size=n)).astype(np.int64)
+    return sparse.vstack([sparse.csr_matrix((3, ENTRADAS), dtype=np.int64), x], format='csr')
+
+
+def _mapeado_em_memoria(array: np.ndarray) -> bool:
+    while array is not None:
+        if isinstance(array, np.memmap):
+            return True
+        array = array.base
+    return False
+
+
+@pytest.fixture(params=[(3, 'softmax'), (1, 'sigmoid')], ids=['softmax', 'sigmoid'])
+def exportado(request, tmp_path):
+    saidas, ativacao = request.param
+    model = _criar_modelo(saidas, ativacao)
+    filename = str(tmp_path / 'modelo.npz')
+    return model, exportar_numpy(model, filename), filename
+
+
+def test_paridade_com_keras(exportado):
+    model, modelo_numpy, _ = exportado
+    x = _entrada_esparsa()
+
+    esperado = model.predict(x.toarray(), verbose=False)
+    obtido = modelo_numpy.predict(x)
+
+    assert obtido.shape == esperado.shape
+    assert obtido.dtype == np.float32
+    np.testing.assert_allclose(obtido, esperado, atol=1e-5)
+
+
+def test_entrada_vazia(exportado):
+    model, modelo_numpy, _ = exportado
+    assert modelo_numpy.predict(sparse.csr_matrix((0, ENTRADAS))).shape == (0, model.output_shape[-1])
+
+
+def test_carga_do_arquivo(exportado):
+    _, modelo_numpy, filename = exportado
+    x = _entrada_esparsa()
+    esperado = modelo_numpy.predict(x)
+
+    carregado = ModeloNumpy.carregar(filename)
+    assert carregado.ativacoes == modelo_numpy.ativacoes
+    np.testing.assert_array_equal(carregado.predict(x), esperado)
+
+    mapeado = ModeloNumpy.carregar_mapeado(filename)
+    assert all(_mapeado_em_memoria(w) for w in mapeado.pesos)
+    np.testing.assert_array_equal(mapeado.predict(x), esperado)
+
+    # a segunda carga reutiliza o diretório extraído
+    extraido = os.path.join(filename + '.mmap', 'W0.npy')
+    modificado = os.stat(extraido).st_mtime_ns
+    np.testing.assert_array_equal(ModeloNumpy.carregar_mapeado(filename).predict(x), esperado)
+    assert os.stat(extraido).st_mtime_ns == modificado
+
+
+def test_mapeado_extraido_de_novo_quando_o_arquivo_muda(exportado, tmp_path):
+    _, modelo_numpy, filename = exportado
+    x = _entrada_esparsa()
+    ModeloNumpy.carregar_mapeado(filename)
+
+    # outro modelo no lugar, com a data de modificação antiga (como `cp -p`)
+    anterior = os.stat(filename)
+    outro = ModeloNumpy([w * 2 for w in modelo_numpy.pesos], modelo_numpy.vieses, modelo_numpy.ativacoes)
+    outro.salvar(str(tmp_path / 'outro.npz'))
+    os.utime(tmp_path / 'outro.npz', ns=(anterior.st_atime_ns, anterior.st_mtime_ns))
+    os.replace(tmp_path / 'outro.npz', filename)
+
+    np.testing.assert_array_equal(ModeloNumpy.carregar_mapeado(filename).predict(x), outro.predict(x))
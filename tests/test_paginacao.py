@@ -0,0 +1,146 @@
+"""
+Paginação e retomada da coleta (`classificacao.paginacao` e `conexao.iterar_producoes_paginado`), com um
+repositório falso em memória no lugar do AllegroGraph.
+
+    $ python -m pytest tests
+"""
+import random
+import re
+import sys
+from os import path
+
+sys.path.insert(0, path.join(path.dirname(path.abspath(__file__)), '..', 'nima_predict'))
+
+from classificacao import conexao  # noqa: E402
+from classificacao.fluxo import classificar_lotes_em_fluxo  # noqa: E402
+from classificacao.paginacao import Retomada, iterar_paginas, paginar  # noqa: E402
+
+
+class _Valor:
+    def __init__(self, valor: str):
+        self.valor = valor
+
+    def toNTriples(self):
+        return self.valor
+
+    def toPython(self):
+        return self.valor
+
+
+class _Linha(dict):
+    def getValue(self, nome: str):
+        return _Valor(self[nome])
+
+
+class _Resultado(list):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+class RepositorioFalso:
+    """
+    Responde as queries de `conexao.CONSULTAS` a partir de listas de linhas, aplicando ORDER BY, LIMIT e OFFSET.
+
+    As linhas empatadas no ORDER BY são embaralhadas a cada requisição, como um servidor que não garante a
+    ordem entre elas.
+    """
+
+    def __init__(self, producoes, disciplinas, semente: int = 0):
+        self.linhas = {'producoes': producoes, 'disciplinas': disciplinas}
+        self.aleatorio = random.Random(semente)
+        self.queries = []
+
+    def executeTupleQuery(self, query: str):
+        self.queries.append(query)
+        linhas = list(self.linhas['disciplinas' if '?ementa' in query else 'producoes'])
+        self.aleatorio.shuffle(linhas)
+
+        if (ordem := re.search(r'ORDER BY ([^\n]+)', query)) is not None:
+            variaveis = [v.lstrip('?') for v in ordem.group(1).split()]
+            linhas.sort(key=lambda linha: [linha[v] for v in variaveis])
+        if (limite := re.search(r'LIMIT (\d+)', query)) is not None:
+            inicio = int(re.search(r'OFFSET (\d+)', query).group(1))
+            linhas = linhas[inicio:inicio + int(limite.group(1))]
+
+        return _Resultado(_Linha(linha) for linha in linhas)
+
+
+def _producoes(quantidade: int):
+    """Cada produção aparece com dois títulos, como uma produção com várias linhas na query"""
+    return [
+        {'ident': f'<p{i:03}>', 'nome': f'{titulo} {i}'}
+        for i in range(quantidade)
+        for titulo in ('titulo', 'outro titulo')
+    ]
+
+
+def _disciplinas(quantidade: int):
+    return [
+        {'ident': f'<c{i:03}>', 'nome': f'disciplina {i}', 'ementa': f'conteudo da disciplina numero {i}'}
+        for i in range(quantidade)
+    ]
+
+
+def test_paginar_ordena_por_todas_as_variaveis():
+    query = paginar(conexao.QUERY_DISCIPLINAS, 10, 3)
+    assert 'ORDER BY ?ident ?nome ?ementa' in query
+    assert query.rstrip().endswith('LIMIT 10\nOFFSET 30')
+
+
+def test_paginas_cobrem_todas_as_linhas_uma_vez():
+    linhas = _producoes(50)
+    repo = RepositorioFalso(linhas, [])
+
+    for paralelo in (1, 3):
+        paginas = list(iterar_paginas(repo, conexao.QUERY_PRODUCOES, conexao._par_producao,
+                                      tamanho_pagina=7, paralelo=paralelo))
+        assert [pagina for pagina, _ in paginas] == list(range(len(paginas)))
+        coletadas = [par for _, pares in paginas for par in pares]
+        assert sorted(coletadas) == sorted((linha['ident'], linha['nome']) for linha in linhas)
+
+
+def test_producoes_repetidas_aparecem_uma_vez():
+    repo = RepositorioFalso(_producoes(20), _disciplinas(5))
+    pares = [par for _, pares in conexao.iterar_producoes_paginado(repo, tamanho_pagina=6) for par in pares]
+
+    idents = [ident for ident, _ in pares]
+    assert len(idents) == len(set(idents)) == 25
+
+
+def test_retomada_continua_do_primeiro_lote_nao_armazenado(tmp_path):
+    arquivo = str(tmp_path / 'retomada.json')
+    repo = RepositorioFalso(_producoes(20), _disciplinas(5))
+    armazenados = {}
+
+    def guardar_falhando_na_terceira_pagina(resultados):
+        guardar_falhando_na_terceira_pagina.chamadas += 1
+        if guardar_falhando_na_terceira_pagina.chamadas == 3:
+            return False
+        armazenados.update(resultados)
+        return True
+    guardar_falhando_na_terceira_pagina.chamadas = 0
+
+    retomada = Retomada(arquivo)
+    classificar_lotes_em_fluxo(
+        lotes=conexao.iterar_producoes_paginado(repo, tamanho_pagina=4, retomada=retomada),
+        classificar_lote=lambda dados: {ident: 0.5 for ident in dados},
+        guardar=guardar_falhando_na_terceira_pagina,
+        ao_guardar=lambda marca: retomada.marcar(*marca)
+    )
+
+    # as duas páginas de disciplinas foram armazenadas; a primeira de produções falhou, e não foi marcada
+    assert Retomada(arquivo).proximas == {'disciplinas': 2}
+
+    retomada = Retomada(arquivo)
+    classificar_lotes_em_fluxo(
+        lotes=conexao.iterar_producoes_paginado(repo, tamanho_pagina=4, retomada=retomada),
+        classificar_lote=lambda dados: {ident: 0.5 for ident in dados},
+        guardar=lambda resultados: armazenados.update(resultados) or True,
+        ao_guardar=lambda marca: retomada.marcar(*marca)
+    )
+
+    assert len(armazenados) == 25
+    assert 'LIMIT 4\nOFFSET 8' in [q for q in repo.queries if '?ementa' in q][-1]
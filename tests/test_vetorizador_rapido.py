@@ -0,0 +1,106 @@
+"""
+Identidade dos vetorizadores de classificação (`rede_neural.vetorizador_rapido`) com os do sklearn: a mesma
+matriz de `CountVectorizer.transform` e de `HashingVectorizer.transform`, inclusive depois de salvos.
+
+    $ python -m pytest tests
+"""
+import sys
+from os import path
+
+import numpy as np
+import pytest
+from sklearn.feature_extraction.text import CountVectorizer, HashingVectorizer
+from sklearn.utils import murmurhash3_32
+
+sys.path.insert(0, path.join(path.dirname(path.abspath(__file__)), '..', 'nima_predict'))
+
+from rede_neural.vetorizador_rapido import VetorizadorHash, VetorizadorRapido, _murmurhash3_32  # noqa: E402
+
+# com acentos de propósito: o sklearn compara as stopwords com os tokens ja sem acentos, então 'não' não remove
+# 'nao' (e o sklearn avisa); os vetorizadores precisam fazer o mesmo
+STOPWORDS = ['de', 'da', 'do', 'em', 'the', 'of', 'and', 'é', 'não']
+
+pytestmark = pytest.mark.filterwarnings('ignore:Your stop_words may be inconsistent')
+
+TREINO = [
+    "Impactos ambientais do desmatamento na bacia amazônica",
+    "Análise de algoritmos de ordenação em memória externa",
+    "Environmental assessment of water quality in urban rivers",
+    "Poluição da água e saúde pública em São Paulo",
+    "Ecologia de manguezais: conservação e manejo",
+]
+
+TEXTOS = TREINO + [
+    "",
+    "   ",
+    "a e o",                                        # somente tokens de uma letra
+    "AÇÃO ação Acao acão",                          # maiúsculas e acentos
+    "naïve café façade Straße Ærø øre",             # letras sem decomposição (ß, æ, ø)
+    "ﬁnanças ﬂorestais ² ½ №",                      # compatibilidade (NFKD)
+    "Ελληνικά кириллица 中文字符 العربية",           # outros alfabetos
+    "emoji 🌱🌳 e_sublinhado x2 42 3.14",
+    "da de do não é DE Da",                         # somente stopwords
+    "água " * 30,                                    # contagens grandes
+]
+
+
+@pytest.mark.parametrize('strip_accents', ['unicode', 'ascii', None])
+@pytest.mark.parametrize('binary', [False, True])
+@pytest.mark.parametrize('stop_words', [STOPWORDS, None], ids=['stopwords', 'sem_stopwords'])
+def test_igual_ao_count_vectorizer(strip_accents, binary, stop_words, tmp_path):
+    vec = CountVectorizer(strip_accents=strip_accents, lowercase=True, binary=binary, stop_words=stop_words)
+    vec.fit(TREINO + TEXTOS[5:])
+    rapido = VetorizadorRapido.de_count_vectorizer(vec)
+
+    esperado = vec.transform(TEXTOS)
+    obtido = rapido.transform(TEXTOS)
+    assert obtido.shape == esperado.shape
+    assert obtido.dtype == esperado.dtype
+    assert (obtido != esperado).nnz == 0
+
+    rapido.salvar(str(tmp_path / 'vetorizador.npz'))
+    carregado = VetorizadorRapido.carregar(str(tmp_path / 'vetorizador.npz'))
+    assert (carregado.transform(TEXTOS) != esperado).nnz == 0
+
+
+@pytest.mark.parametrize('alternate_sign', [False, True])
+@pytest.mark.parametrize('strip_accents', ['unicode', 'ascii', None])
+@pytest.mark.parametrize('stop_words', [STOPWORDS, None], ids=['stopwords', 'sem_stopwords'])
+@pytest.mark.parametrize('n_features', [2 ** 20, 16])     # com poucas colunas, os tokens colidem
+def test_igual_ao_hashing_vectorizer(alternate_sign, strip_accents, stop_words, n_features, tmp_path):
+    vec = HashingVectorizer(n_features=n_features, norm=None, alternate_sign=alternate_sign,
+                            strip_accents=strip_accents, stop_words=stop_words)
+    rapido = VetorizadorHash.de_hashing_vectorizer(vec)
+
+    esperado = vec.transform(TEXTOS)
+    obtido = rapido.transform(TEXTOS)
+    assert obtido.shape == esperado.shape
+    assert (obtido != esperado).nnz == 0
+
+    rapido.salvar(str(tmp_path / 'vetorizador.npz'))
+    carregado = VetorizadorHash.carregar(str(tmp_path / 'vetorizador.npz'))
+    assert (carregado.transform(TEXTOS) != esperado).nnz == 0
+
+
+def test_hashing_binario():
+    vec = HashingVectorizer(n_features=2 ** 10, norm=None, binary=True, alternate_sign=False)
+    esperado = vec.transform(TEXTOS)
+    assert (VetorizadorHash.de_hashing_vectorizer(vec).transform(TEXTOS) != esperado).nnz == 0
+
+
+def test_murmurhash3_igual_ao_sklearn():
+    rng = np.random.default_rng(5)
+    # todos os tamanhos de resto (0 a 3 bytes) depois dos blocos de 4 bytes
+    chaves = [rng.bytes(int(n)) for n in rng.integers(0, 40, size=500)]
+    chaves += [t.encode('utf-8') for texto in TEXTOS for t in texto.split()]
+
+    for chave in chaves:
+        for semente in (0, 1, 2 ** 31):
+            assert _murmurhash3_32(chave, semente) == murmurhash3_32(chave, seed=semente), (chave, semente)
+
+
+def test_um_unico_texto():
+    with pytest.raises(ValueError):
+        VetorizadorRapido({'agua': 0}).transform("agua")
+    with pytest.raises(ValueError):
+        VetorizadorHash(16).transform("agua")